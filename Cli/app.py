@@ -1,6 +1,18 @@
+import os
+import sys
+
+# Cli 与 Server 共用的 common 包（日志、追踪、剖析）位于仓库根目录
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
 from flask import Flask
 from flask_cors import CORS
 
+from config import LOG_CONFIG, TRACE_FILE, DATA_DIR, PROFILE_ADMIN_TOKEN, PROFILE_DIR
+from common.log import init_logging
+from models.database import init_db
+from common.profiling import init_profiling
+from common.tracing import init_tracing
+
 from routes.auth import init_auth
 from routes.chat import init_chat
 from routes.contacts import init_contacts
@@ -8,23 +20,31 @@ from routes.utils import init_utils
 
 
 def create_app():
+    init_logging(LOG_CONFIG['level'], LOG_CONFIG['sample_rates'])
+    init_db(DATA_DIR)
     ret = Flask(__name__)
+    init_tracing(ret, 'cli', TRACE_FILE)
     init_auth(ret)
     init_contacts(ret)
     init_utils(ret)
     init_chat(ret)
+    init_profiling(ret, PROFILE_ADMIN_TOKEN, PROFILE_DIR)
     return ret
 
 def create_app_debug():
+    init_logging(LOG_CONFIG['level'], LOG_CONFIG['sample_rates'])
+    init_db(DATA_DIR)
     ret = Flask(__name__)
+    init_tracing(ret, 'cli', TRACE_FILE)
     init_auth(ret)
     init_contacts(ret)
     init_utils(ret)
     init_chat(ret)
+    init_profiling(ret, PROFILE_ADMIN_TOKEN, PROFILE_DIR)
     cors = CORS(ret, resources=r"/*")
     return ret
 
-app = create_app_debug()
-
 if __name__ == "__main__":
+    # 导入本模块不创建应用，也不打开本地数据文件
+    app = create_app_debug()
     app.run(port=50000,debug=True)
\ No newline at end of file
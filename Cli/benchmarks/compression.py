@@ -0,0 +1,73 @@
+"""
+压缩阶段基准测试：对比不同大小的真实消息在“仅加密”与“压缩后加密”两种路径下的
+线上字节数与 CPU 耗时。
+
+运行：
+    python benchmarks/compression.py [--rounds 200]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from cryptography.fernet import Fernet
+
+from services.clientAPI import ClientAPI
+
+
+def build_corpus():
+    random.seed(0)
+    words = ["hello", "ok", "meeting", "tomorrow", "server", "deploy", "lunch", "好的", "收到", "明天见"]
+    log_line = "2025-07-03 12:00:{:02d},123 INFO [werkzeug] 127.0.0.1 - - \"POST /contacts HTTP/1.1\" 200 -\n"
+    record = {"user_id": "user_{}", "flag": 1, "ip": "192.168.1.{}", "port": 6000, "last_seen_time": "2025-07-03T12:00:00"}
+    return {
+        "short text (~20B)": "明天下午三点开会，收到请回复",
+        "paragraph (~600B)": " ".join(random.choice(words) for _ in range(120)),
+        "pasted log (~8KB)": "".join(log_line.format(i % 60) for i in range(100)),
+        "json snippet (~30KB)": json.dumps([
+            {k: (v.format(i) if isinstance(v, str) else v) for k, v in record.items()} for i in range(300)
+        ], indent=2),
+        "picture base64 (~64KB)": base64.b64encode(os.urandom(48 * 1024)).decode('ascii'),
+    }
+
+
+def encrypt_only(message, key):
+    return Fernet(key).encrypt(message.encode('utf-8'))
+
+
+def compress_then_encrypt(message, key):
+    data, _ = ClientAPI.compress_message(message)
+    return Fernet(key).encrypt(data)
+
+
+def measure(func, message, key, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        token = func(message, key)
+    elapsed = (time.perf_counter() - start) / rounds
+    return len(base64.b64encode(token)), elapsed * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    key = Fernet.generate_key()
+    print(f"{'corpus':<24}{'plain':>9}{'wire':>9}{'wire+z':>9}{'saved':>8}{'us':>9}{'us+z':>9}")
+    for name, message in build_corpus().items():
+        plain = len(message.encode('utf-8'))
+        wire, cost = measure(encrypt_only, message, key, args.rounds)
+        wire_z, cost_z = measure(compress_then_encrypt, message, key, args.rounds)
+        saved = 1 - wire_z / wire
+        print(f"{name:<24}{plain:>9}{wire:>9}{wire_z:>9}{saved:>8.1%}{cost:>9.1f}{cost_z:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
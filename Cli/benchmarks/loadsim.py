@@ -0,0 +1,264 @@
+"""
+多客户端负载模拟：在一个进程里用 asyncio 模拟 N 个客户端，按真实客户端的调用方式访问服务端
+（注册、登录、每 5 秒心跳、定时拉取通讯录、查询在线状态与公钥），并通过 ClientAPI 的 P2P 协议
+在回环地址上按好友关系互发消息。结束后按接口报告吞吐、延迟分位数与错误率。
+
+ServerAPI 与 ClientAPI 都是同步实现，阻塞调用放在线程池中执行，asyncio 只负责调度各客户端的节奏。
+
+先在本地启动服务端（SQLite 或本地 MySQL），并关闭限流，否则所有模拟客户端共用 127.0.0.1 会被按 IP 限流：
+    cd Server && RATE_LIMIT=0 python app.py
+
+运行：
+    python benchmarks/loadsim.py [--clients 50] [--duration 60] [--friends 5] [--message-rate 0.2]
+        [--size-mix 64:0.8,1024:0.15,16384:0.05] [--server localhost:5000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+HEARTBEAT_INTERVAL = 5
+# 对 /online 而言 199 表示对方离线，也是正常响应
+OK_STATUSES = {200, 199}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, elapsed, ok, status=None):
+        if ok:
+            self.latencies[name].append(elapsed)
+        else:
+            self.errors[name] += 1
+        self.statuses[name][status] += 1
+
+    def report(self, duration):
+        print(f"{'endpoint':<16}{'count':>8}{'req/s':>9}{'errors':>8}{'err %':>7}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies[name])
+            total = len(latencies) + self.errors[name]
+
+            def percentile(fraction):
+                if not latencies:
+                    return float('nan')
+                return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+            print(f"{name:<16}{total:>8}{total / duration:>9.1f}{self.errors[name]:>8}"
+                  f"{self.errors[name] / total * 100:>7.1f}{percentile(0.5):>9.1f}"
+                  f"{percentile(0.95):>9.1f}{percentile(0.99):>9.1f}")
+        rejected = sum(self.statuses[name].get(429, 0) for name in self.statuses)
+        if rejected:
+            print(f"{rejected} requests were rate limited (429), start the server with RATE_LIMIT=0")
+
+
+def parse_size_mix(text):
+    sizes, weights = list(), list()
+    for item in text.split(','):
+        size, weight = item.split(':')
+        sizes.append(int(size))
+        weights.append(float(weight))
+    return sizes, weights
+
+
+class SimulatedClient:
+    def __init__(self, sim, index):
+        from services.serverAPI import ServerAPI
+        self.sim = sim
+        self.user_id = f"{sim.args.prefix}{index}"
+        self.port = sim.args.p2p_base_port + index
+        self.api = ServerAPI()
+        self.client_api = None
+        self.cursor = None
+        self.friends = list()
+        self.rng = random.Random(index)
+
+    async def call(self, name, func, *args):
+        """
+        在线程池中执行一次阻塞调用并记录耗时，返回响应（失败时为 None）
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            response = await loop.run_in_executor(self.sim.executor, func, *args)
+        except Exception:
+            self.sim.stats.record(name, time.perf_counter() - start, False, 'exception')
+            return None
+        # ServerAPI 返回数字状态码，ClientAPI.send_message 返回 "success"/"error"
+        status = response.get('status')
+        ok = status in OK_STATUSES or status == 'success'
+        self.sim.stats.record(name, time.perf_counter() - start, ok, status)
+        return response if ok else None
+
+    async def start(self):
+        from services.clientAPI import ClientAPI
+        private_keys, public_key = ClientAPI.generate_key_pair(self.sim.suites)
+        await self.call("register", self.api.register, self.user_id, "password", f"{self.user_id}@example.com")
+        response = await self.call("login", self.api.login, self.user_id, "password", public_key, "127.0.0.1", self.port)
+        if response is None:
+            return False
+        # 每个模拟客户端只用一个解密线程，避免 N 个进程池
+        self.client_api = ClientAPI(
+            host="127.0.0.1", port=self.port, user_id=self.user_id, public_key=public_key,
+            private_key=private_keys, decrypt_workers=1, decrypt_use_processes=False
+        )
+        self.cursor = self.client_api.inbox.cursor(0)
+        return True
+
+    async def befriend(self, other):
+        await self.call("add_friend", self.api.add_friend, other.user_id)
+        await other.call("add_friend", other.api.add_friend, self.user_id)
+        self.friends.append(other.user_id)
+        other.friends.append(self.user_id)
+
+    async def heartbeat_loop(self):
+        await asyncio.sleep(self.rng.uniform(0, HEARTBEAT_INTERVAL))
+        while self.sim.running():
+            await self.call("heartbeat", self.api.heartbeat)
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    async def poll_loop(self):
+        interval = self.sim.args.poll_interval
+        await asyncio.sleep(self.rng.uniform(0, interval))
+        while self.sim.running():
+            await self.call("get_contacts", self.api.get_contacts)
+            if self.friends:
+                await self.call("online", self.api.get_online_status, self.rng.choice(self.friends))
+            await asyncio.sleep(interval)
+
+    async def message_loop(self):
+        rate = self.sim.args.message_rate
+        if rate <= 0 or not self.friends:
+            return
+        while True:
+            # 泊松过程：指数分布的发送间隔
+            await asyncio.sleep(self.rng.expovariate(rate))
+            if not self.sim.running():
+                return
+            friend_id = self.rng.choice(self.friends)
+            # 与 chat_service 相同：先查公钥与地址，再直连对方发送
+            response = await self.call("public_key", self.api._post, "/public_key", {"friend_id": friend_id})
+            if response is None or response.get('status') != 200:
+                continue
+            size = self.rng.choices(*self.sim.size_mix)[0]
+            message = json.dumps({
+                "type": "text",
+                "content": json.dumps({"sent_at": time.time(), "padding": "x" * size}),
+            })
+            data = response['data']
+            await self.call("p2p_send", self.client_api.send_message, message, data['public_key'], data['ip'], data['port'])
+
+    def drain(self):
+        """
+        取出已解密的消息，按消息内的发送时间记录端到端送达延迟
+        """
+        items, self.cursor, _ = self.client_api.inbox.read(self.cursor)
+        for item in items:
+            try:
+                sent_at = json.loads(item['message']['content'])['sent_at']
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.sim.stats.record("p2p_deliver", time.time() - sent_at, True, 200)
+
+    async def drain_loop(self):
+        while self.sim.running() or self.sim.grace():
+            self.drain()
+            # 轮询间隔计入送达延迟，保持在毫秒级
+            await asyncio.sleep(0.01)
+        self.drain()
+
+    async def stop(self):
+        await self.call("logout", self.api.logout)
+
+
+class Simulation:
+    def __init__(self, args):
+        self.args = args
+        self.stats = Stats()
+        self.executor = ThreadPoolExecutor(max_workers=args.threads)
+        self.size_mix = parse_size_mix(args.size_mix)
+        self.suites = args.suites.split(',') if args.suites else None
+        self.deadline = None
+
+    def running(self):
+        return time.time() < self.deadline
+
+    def grace(self):
+        # 停止发送后再等 2 秒，让最后一批消息送达
+        return time.time() < self.deadline + 2
+
+    async def run(self):
+        args = self.args
+        clients = [SimulatedClient(self, i) for i in range(args.clients)]
+        print(f"starting {len(clients)} clients")
+        start = time.time()
+        started = await asyncio.gather(*(client.start() for client in clients))
+        clients = [client for client, ok in zip(clients, started) if ok]
+        if len(clients) < 2:
+            print("fewer than two clients logged in, is the server running?")
+            self.stats.report(1)
+            return
+
+        rng = random.Random(0)
+        pairs = set()
+        for client in clients:
+            others = [other for other in clients if other is not client]
+            for other in rng.sample(others, min(args.friends, len(others))):
+                pairs.add(tuple(sorted((client.user_id, other.user_id))))
+        by_id = {client.user_id: client for client in clients}
+        await asyncio.gather(*(by_id[a].befriend(by_id[b]) for a, b in pairs))
+        print(f"setup: {len(clients)} clients online, {len(pairs)} friendships")
+        self.stats.report(time.time() - start)
+
+        # 稳态阶段单独统计
+        print(f"running for {args.duration}s")
+        self.stats = Stats()
+        self.deadline = time.time() + args.duration
+        start = time.time()
+        await asyncio.gather(*(
+            task
+            for client in clients
+            for task in (client.heartbeat_loop(), client.poll_loop(), client.message_loop(), client.drain_loop())
+        ))
+        duration = time.time() - start
+        self.stats.report(duration)
+        await asyncio.gather(*(client.stop() for client in clients))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--friends", type=int, default=5, help="每个客户端随机添加的好友数")
+    parser.add_argument("--message-rate", type=float, default=0.2, help="每个客户端每秒发送的消息数（泊松）")
+    parser.add_argument("--size-mix", default="64:0.8,1024:0.15,16384:0.05", help="消息大小(字节):权重")
+    parser.add_argument("--poll-interval", type=float, default=10, help="拉取通讯录与在线状态的间隔（秒）")
+    parser.add_argument("--suites", help="只生成这些加密套件的密钥，逗号分隔，默认全部")
+    parser.add_argument("--server", default="localhost:5000")
+    parser.add_argument("--p2p-base-port", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=64, help="执行阻塞调用的线程数")
+    parser.add_argument("--prefix", default=f"sim{os.getpid()}_", help="模拟用户名前缀")
+    args = parser.parse_args()
+
+    # 客户端本地库（TinyDB）写到临时目录，不影响真实客户端的数据
+    os.chdir(tempfile.mkdtemp(prefix="loadsim-"))
+    import config
+    config.SERVER_CONFIG['host'] = args.server
+
+    asyncio.run(Simulation(args).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+启动耗时基准测试：在新的解释器中用 python -X importtime 导入 app 并执行 create_app，
+报告总耗时、create_app 耗时与累计导入耗时最多的模块。
+
+同时通过审计钩子检查导入与装配阶段没有网络访问（socket.connect、DNS 解析）和本地数据文件的打开，
+超过预算或出现这些副作用时以非零状态退出。
+
+运行：
+    python benchmarks/startup.py [--budget 1.0] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+CLI_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+
+# 子进程中执行：记录副作用，导入 app 并装配，最后输出两行结果
+CHILD = r'''
+import sys, time
+side_effects = []
+def audit(event, args):
+    if event in ("socket.connect", "socket.getaddrinfo", "socket.gethostbyname"):
+        side_effects.append(f"{event} {args[1:] if event == 'socket.connect' else args}")
+    elif event == "open" and isinstance(args[0], str) and args[0].endswith(".db"):
+        side_effects.append(f"open {args[0]}")
+sys.addaudithook(audit)
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(f"RESULT {imported - start} {created - imported}")
+for item in side_effects:
+    print(f"SIDE_EFFECT {item}")
+'''
+
+
+def parse_importtime(stderr):
+    """
+    返回 [(累计微秒, 模块名)]，按累计耗时降序
+    """
+    modules = list()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=float, default=1.0, help="导入加 create_app 的耗时上限（秒）")
+    parser.add_argument("--top", type=int, default=15, help="列出累计导入耗时最多的模块数")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=CLI_DIR)
+    env.pop("TRACE_FILE", None)
+    # 在空的临时目录中运行，便于发现导入时创建的文件
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(proc.stderr)
+        sys.exit(proc.returncode)
+
+    side_effects = list()
+    import_seconds = create_seconds = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            import_seconds, create_seconds = map(float, line.split()[1:])
+        elif line.startswith("SIDE_EFFECT "):
+            side_effects.append(line[len("SIDE_EFFECT "):])
+
+    total = import_seconds + create_seconds
+    print(f"import app   {import_seconds * 1000:>8.1f} ms")
+    print(f"create_app   {create_seconds * 1000:>8.1f} ms")
+    print(f"total        {total * 1000:>8.1f} ms (budget {args.budget * 1000:.0f} ms)")
+    print()
+    print(f"{'cumulative ms':>14}  module")
+    for cumulative, name in parse_importtime(proc.stderr)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f}  {name}")
+
+    created_files = os.listdir(workdir)
+    failures = [f"side effect: {item}" for item in side_effects]
+    failures += [f"file created at startup: {name}" for name in created_files]
+    if total > args.budget:
+        failures.append(f"startup took {total:.2f}s, budget {args.budget:.2f}s")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
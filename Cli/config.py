@@ -1,20 +1,55 @@
+import os
 import socket
+
+from common.log import get_logger
+
+logger = get_logger(__name__)
+
 def get_local_ip():
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
             s.connect(('8.8.8.8', 80)) # 连接到Google DNS
-            print(f"Local IP: {s.getsockname()[0]}")
-            return s.getsockname()[0] # 获取本地IP
+            ip = s.getsockname()[0] # 获取本地IP
+            logger.info("local_ip", ip=ip)
+            return ip
     except Exception:
-        return socket.gethostbyname(socket.gethostname())
+        try:
+            return socket.gethostbyname(socket.gethostname())
+        except OSError:
+            return "127.0.0.1"
 
 CLIENT_CONFIG = {
-    "host": get_local_ip(),
+    # 为 None 时在首次使用时由 get_local_ip 探测，导入配置不访问网络；可用 CLIENT_HOST 指定
+    "host": os.environ.get('CLIENT_HOST'),
     "port": 6000
 }
 
+def get_client_host():
+    if CLIENT_CONFIG['host'] is None:
+        CLIENT_CONFIG['host'] = get_local_ip()
+    return CLIENT_CONFIG['host']
+
+# 本地数据（friends.db、messages.db）所在目录，create_app 时传给 init_db，首次访问时才打开文件
+DATA_DIR = os.environ.get('DATA_DIR', '.')
+
 SERVER_CONFIG = {
     "host": "localhost:5000",
     "api_base": "",
     "timeout": 10
-}
\ No newline at end of file
+}
+
+LOG_CONFIG = {
+    "level": "INFO",
+    # 高频事件的抽样比例（事件名 -> 保留比例），WARNING 及以上总是记录
+    "sample_rates": {
+        "p2p_send": 0.1,
+        "server_api": 0.1
+    }
+}
+
+# 请求追踪：设置后 span 写入该 JSONL 文件，用 python tracing.py <文件> 查看每一跳耗时
+TRACE_FILE = os.environ.get('TRACE_FILE')
+
+# 按路由的性能剖析：设置管理 token 后注册 /admin/profile，结果写入 PROFILE_DIR，用 python profiling.py <目录> 合并
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
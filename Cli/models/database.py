@@ -1,5 +1,36 @@
+import os
+import threading
+
 from tinydb import TinyDB, Query
 
-friends_db = TinyDB('friends.db')
-messages_db = TinyDB('messages.db')
-query = Query()
\ No newline at end of file
+# 文件名 -> TinyDB，首次访问时打开
+_databases = dict()
+# 文件名 -> 锁；TinyDB 不是线程安全的，同一文件的读写由各 store 在锁内进行
+_locks = dict()
+_lock = threading.Lock()
+_data_dir = '.'
+query = Query()
+
+def init_db(data_dir='.'):
+    """
+    指定数据文件所在目录，由 create_app 调用；已打开的文件不受影响
+    """
+    global _data_dir
+    _data_dir = data_dir
+
+def get_db(name):
+    db = _databases.get(name)
+    if db is None:
+        with _lock:
+            db = _databases.get(name)
+            if db is None:
+                os.makedirs(_data_dir, exist_ok=True)
+                db = _databases[name] = TinyDB(os.path.join(_data_dir, name))
+    return db
+
+def get_lock(name):
+    lock = _locks.get(name)
+    if lock is None:
+        with _lock:
+            lock = _locks.setdefault(name, threading.RLock())
+    return lock
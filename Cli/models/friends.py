@@ -1,38 +1,57 @@
-from database import friends_db, query
+from models.database import get_db, get_lock, query
 
 class Friends():
 
-    def __init__(self):
-        self.db = friends_db
-        self.table = friends_db.table('friends')
+    @property
+    def lock(self):
+        return get_lock('friends.db')
 
+    @property
+    def db(self):
+        return get_db('friends.db')
+
+    @property
+    def table(self):
+        return self.db.table('friends')
 
     def create_friend(self, friend_id, public_key, ip, port):
-        self.table.insert({
-            friend_id: friend_id,
-            public_key: public_key,
-            ip: ip,
-            port: port
-        })
+        with self.lock:
+            self.table.upsert({
+                'friend_id': friend_id,
+                'public_key': public_key,
+                'ip': ip,
+                'port': port
+            }, query.friend_id == friend_id)
+
+    def replace_friends(self, entries):
+        """
+        用登录快照一次性替换全部好友信息，entries 为 {friend_id, public_key, ip, port} 列表
+        """
+        with self.lock:
+            self.table.truncate()
+            self.table.insert_multiple(entries)
 
     def get_friend(self, friend_id):
-        result = self.table.search(
-            query.friend_id == friend_id
-        )
-        return result
+        with self.lock:
+            result = self.table.search(
+                query.friend_id == friend_id
+            )
+            return result
 
     def check_friend(self, friend_id):
-        result = self.table.search(
-            query.friend_id == friend_id
-        )
-        if result:
-            return True
-        else:
-            return False
+        with self.lock:
+            result = self.table.search(
+                query.friend_id == friend_id
+            )
+            if result:
+                return True
+            else:
+                return False
 
     def delete_friend(self, friend_id):
-        self.db.remove(
-            query.friend_id == friend_id
-        )
+        with self.lock:
+            self.table.remove(
+                query.friend_id == friend_id
+            )
 
 friends = Friends()
\ No newline at end of file
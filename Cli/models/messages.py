@@ -1,30 +1,72 @@
-from database import messages_db, query
+from models.database import get_db, get_lock, query
 
 class Messages():
 
-    def __init__(self):
-        self.db = messages_db
-        self.table = messages_db.table('messages')
+    @property
+    def lock(self):
+        return get_lock('messages.db')
+
+    @property
+    def db(self):
+        return get_db('messages.db')
+
+    @property
+    def table(self):
+        return self.db.table('messages')
+
+    @property
+    def profiles(self):
+        return self.db.table('profiles')
 
     def insert_message(self, message):
-        self.db.insert(**message)
+        with self.lock:
+            self.table.insert(message)
 
     def get_message_by_sender_id(self, sender_id):
-        result = self.table.search(
-            query.sender_id == sender_id
-        )
-        return result
+        with self.lock:
+            result = self.table.search(
+                query.sender_id == sender_id
+            )
+            return result
 
     def get_messages_by_receiver_id(self, receiver_id):
-        result = self.table.search(
-            query.receiver_id == receiver_id
-        )
-        return result
+        with self.lock:
+            result = self.table.search(
+                query.receiver_id == receiver_id
+            )
+            return result
 
     def get_message_by_timestamp(self, timestamp):
-        result = self.table.search(
-            query.timestamp == timestamp
-        )
-        return result
+        with self.lock:
+            result = self.table.search(
+                query.timestamp == timestamp
+            )
+            return result
+
+    def get_messages_by_timestamps(self, timestamps):
+        with self.lock:
+            result = self.table.search(
+                query.timestamp.one_of(list(timestamps))
+            )
+            return result
+
+    def get_conversation(self, user_id, friend_id):
+        with self.lock:
+            result = self.table.search(
+                ((query.sender_id == user_id) & (query.receiver_id == friend_id)) |
+                ((query.sender_id == friend_id) & (query.receiver_id == user_id))
+            )
+            return sorted(result, key=lambda message: message['timestamp'])
+
+    def get_salt(self, user_id):
+        with self.lock:
+            result = self.profiles.get(query.user_id == user_id)
+            if result is None:
+                return None
+            return result['salt']
+
+    def set_salt(self, user_id, salt):
+        with self.lock:
+            self.profiles.upsert({'user_id': user_id, 'salt': salt}, query.user_id == user_id)
 
-messages = Messages()
\ No newline at end of file
+messages = Messages()
@@ -1,8 +1,9 @@
-from flask import Flask, request
+from flask import Flask, Response, request
 from pydantic import ValidationError
 
-from schemas.chat import UserChatRequest, UserHistoryRequest, UserDecipherRequest
-from services.chat import chat_service, history_service, decipher_service
+from schemas.chat import UserChatRequest, UserHistoryRequest, UserDecipherRequest, GroupChatRequest, GroupDeliveryRequest, InboxQuery
+from services.chat import chat_service, history_service, decipher_service, group_chat_service, group_delivery_service, \
+    inbox_service, stream_service
 
 
 def init_chat(app: Flask):
@@ -17,10 +18,71 @@ def init_chat(app: Flask):
 
         result, code = chat_service(
             friend_id=chat_data.data.friend_id,
-            message=chat_data.data.message
+            message=chat_data.data.message.model_dump()
         )
         return result, code
 
+    @app.route("/group/chat", methods=["POST"])
+    def group_chat():
+        request_data = request.get_json()
+        try:
+            group_data = GroupChatRequest(**request_data)
+        except ValidationError as e:
+            return {"error": str(e)}, 400
+
+        result, code = group_chat_service(
+            group_id=group_data.data.group_id,
+            members=group_data.data.members,
+            message=group_data.data.message.model_dump()
+        )
+        return result, code
+
+    @app.route("/group/delivery", methods=["POST"])
+    def group_delivery():
+        request_data = request.get_json()
+        try:
+            delivery_data = GroupDeliveryRequest(**request_data)
+        except ValidationError as e:
+            return {"error": str(e)}, 400
+
+        result, code = group_delivery_service(
+            delivery_id=delivery_data.data.delivery_id
+        )
+        return result, code
+
+    @app.route("/messages", methods=["GET"])
+    def messages():
+        try:
+            query = InboxQuery(**request.args.to_dict())
+        except ValidationError as e:
+            return {"error": str(e)}, 400
+
+        result, code = inbox_service(
+            cursor=query.cursor,
+            limit=query.limit,
+            timeout=query.timeout
+        )
+        return result, code
+
+    @app.route("/messages/stream", methods=["GET"])
+    def messages_stream():
+        try:
+            query = InboxQuery(**request.args.to_dict())
+        except ValidationError as e:
+            return {"error": str(e)}, 400
+
+        # EventSource sends the id of the last event it received when reconnecting
+        events, error = stream_service(
+            cursor=request.headers.get("Last-Event-ID") or query.cursor,
+            limit=query.limit
+        )
+        if error is not None:
+            return error
+        return Response(events, mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
+
     @app.route("/history", methods=["POST"])
     def history():
         request_data = request.get_json()
@@ -43,6 +105,7 @@ def init_chat(app: Flask):
             return {"error": str(e)}, 400
 
         result, code = decipher_service(
-            timestamp=decipher_data.data.timestamp
+            timestamp=decipher_data.data.timestamp,
+            timestamps=decipher_data.data.timestamps
         )
         return result, code
\ No newline at end of file
@@ -2,7 +2,7 @@ from flask import Flask, jsonify
 from flask import request
 from pydantic import ValidationError
 
-from schemas.contacts import AddFriendRequest, DeleteFriendRequest
+from schemas.contacts import AddFriendRequest, AgreeRequest, DeleteFriendRequest
 from services.contacts import get_contacts_service, add_friend_service, delete_friend_service, agree_service
 
 
@@ -26,12 +26,18 @@ def init_contacts(app: Flask):
         )
         return result, code
 
-    # @app.route("/agree", methods=["POST"])
-    # def agree():
-    #     result, code = agree_service(
-    #
-    #     )
-    #     return result, code
+    @app.route("/agree", methods=["POST"])
+    def agree():
+        request_data = request.get_json()
+        try:
+            agree_data = AgreeRequest(**request_data)
+        except ValidationError as e:
+            return {"error": str(e)}, 400
+
+        result, code = agree_service(
+            friend_id=agree_data.data.friend_id
+        )
+        return result, code
 
     @app.route("/contacts", methods=["DELETE"])
     def remove_friend():
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, ValidationError, model_validator
 import re
@@ -28,8 +28,14 @@ class UserLogin(BaseModel):
 class UserLoginRequest(BaseModel):
     data: UserLogin
 
+class SnapshotContact(BaseModel):
+    user_id: str
+    flag: int
+    online: bool
+
 class Token(BaseModel):
     token: str
+    contacts: Optional[List[SnapshotContact]] = None
 
 class BaseResponse(BaseModel):
     status: int
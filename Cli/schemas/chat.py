@@ -1,6 +1,6 @@
 from typing import Optional, List, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 class Message(BaseModel):
     type : str
@@ -13,6 +13,27 @@ class UserChat(BaseModel):
 class UserChatRequest(BaseModel):
     data: UserChat
 
+class GroupChat(BaseModel):
+    group_id: str
+    members: List[str] = Field(..., min_length=1, max_length=500)
+    message: Message
+
+class GroupChatRequest(BaseModel):
+    data: GroupChat
+
+class GroupDeliveryQuery(BaseModel):
+    delivery_id: str
+
+class GroupDeliveryRequest(BaseModel):
+    data: GroupDeliveryQuery
+
+class InboxQuery(BaseModel):
+    # 上次收到的最后一条消息的游标，缺省时只返回之后到达的消息
+    cursor: Optional[str] = None
+    limit: int = Field(500, ge=1, le=500)
+    # 长轮询等待秒数，0 为立即返回
+    timeout: float = Field(25, ge=0, le=60)
+
 class UserHistory(BaseModel):
     friend_id: str
 
@@ -20,7 +41,15 @@ class UserHistoryRequest(BaseModel):
     data: UserHistory
 
 class UserDecipher(BaseModel):
-    timestamp: int
+    timestamp: Optional[int] = None
+    # 批量解密一页消息
+    timestamps: Optional[List[int]] = Field(None, max_length=200)
+
+    @model_validator(mode='after')
+    def validate_timestamps(self):
+        if self.timestamp is None and self.timestamps is None:
+            raise ValueError('timestamp 与 timestamps 至少提供一个')
+        return self
 
 class UserDecipherRequest(BaseModel):
     data: UserDecipher
@@ -38,7 +67,31 @@ class History(BaseModel):
 class PlainText(BaseModel):
     plain_text: str
 
+class DecipheredMessage(BaseModel):
+    timestamp: int
+    plain_text: str
+
+class PlainTexts(BaseModel):
+    plain_texts: List[DecipheredMessage]
+
+class RecipientResult(BaseModel):
+    friend_id: str
+    # pending / success / error
+    status: str
+    message: str
+
+class GroupDelivery(BaseModel):
+    delivery_id: str
+    done: bool
+    results: List[RecipientResult]
+
+class InboxMessages(BaseModel):
+    messages: List[FullMessage]
+    cursor: str
+    # 游标已失效（落后超过收件箱容量或来自上次运行），需从 /history 重新加载
+    reset: bool
+
 class BaseResponse(BaseModel):
     status: int
     message: str
-    data: Optional[Union[History, PlainText]] = None
\ No newline at end of file
+    data: Optional[Union[History, PlainText, PlainTexts, GroupDelivery, InboxMessages]] = None
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict
+from typing import List, Optional
 from pydantic import BaseModel
 
 class AddFriend(BaseModel):
@@ -7,6 +7,12 @@ class AddFriend(BaseModel):
 class AddFriendRequest(BaseModel):
     data: AddFriend
 
+class Agree(BaseModel):
+    friend_id: str
+
+class AgreeRequest(BaseModel):
+    data: Agree
+
 class DeleteFriend(BaseModel):
     friend_id: str
 
@@ -17,7 +23,11 @@ class Contact(BaseModel):
     user_id: str
     flag: int
 
+class ContactsPage(BaseModel):
+    contacts: List[Contact]
+    next: Optional[str] = None
+
 class BaseResponse(BaseModel):
     status: int
     message: str
-    data: Optional[Dict[str,List[Contact]]] = None
\ No newline at end of file
+    data: Optional[ContactsPage] = None
\ No newline at end of file
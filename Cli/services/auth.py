@@ -1,27 +1,44 @@
-from config import CLIENT_CONFIG
+from config import CLIENT_CONFIG, get_client_host
+from models.friends import friends
 from schemas.auth import BaseResponse
 from services.online import Heartbeat
-from services.serverAPI import serverAPI
+from services.serverAPI import get_server_api
 from services.clientAPI import get_client_api, ClientAPI
+from services.history import init_history
 
 
 def register_service(user_id, password, email):
-    response = serverAPI.register(user_id, password, email)
+    response = get_server_api().register(user_id, password, email)
     return BaseResponse(**response).model_dump(), response['status']
 
 def login_service(user_id, password):
     private_key, public_key = ClientAPI.generate_key_pair()
-    response = serverAPI.login(user_id, password, public_key, CLIENT_CONFIG['ip'], CLIENT_CONFIG['port'])
+    response = get_server_api().login(user_id, password, public_key, get_client_host(), CLIENT_CONFIG['port'], snapshot=True)
     if response['status'] == 200:
+        contacts = response['data'].get('contacts')
+        if contacts is not None:
+            # Online friends' keys and endpoints arrive with the login, store them in one write
+            friends.replace_friends([
+                {
+                    'friend_id': contact['user_id'],
+                    'public_key': contact['public_key'],
+                    'ip': contact['ip'],
+                    'port': contact['port']
+                }
+                for contact in contacts if contact['online']
+            ])
+        history = init_history(user_id, password)
         p2p_client = get_client_api(
-            host=CLIENT_CONFIG['ip'],
+            host=get_client_host(),
             port=CLIENT_CONFIG['port'],
             user_id=user_id,
             public_key=public_key,
-            private_key=private_key
+            private_key=private_key,
+            history=history
         )
-        heartbeat = Heartbeat()
+        heartbeat = Heartbeat(response['data'].get('heartbeat'))
     return BaseResponse(**response).model_dump(), response['status']
 
 def logout_service():
-    return {},200
\ No newline at end of file
+    response = get_server_api().logout()
+    return BaseResponse(**response).model_dump(), response['status']
@@ -1,29 +1,223 @@
-from schemas.chat import BaseResponse
-from services.clientAPI import _client_api
+import json
+import uuid
+from collections import OrderedDict
+
+from models.friends import friends
+from schemas.chat import BaseResponse, InboxMessages
+from services.clientAPI import current_client_api
+from services.history import get_history
+from services.serverAPI import get_server_api
 
 def chat_service(friend_id, message):
     result = dict()
-    if _client_api is None:
+    client_api = current_client_api()
+    if client_api is None:
         result['status'] = 409
         result['message'] = 'not logged in'
+    else:
+        response = get_server_api().get_public_key(friend_id)
+        if response['status'] == 200:
+            response = client_api.send_message(
+                json.dumps(message),
+                response['data']['public_key'],
+                response['data']['ip'],
+                response['data']['port']
+            )
+            if response['status'] == 'success':
+                get_history().store(client_api.user_id, friend_id, message)
+                result['status'] = 200
+                result['message'] = 'success'
+            else:
+                result['status'] = 404
+                result['message'] = response['message']
+        else:
+            result['status'] = response['status']
+            result['message'] = response['message']
+    return BaseResponse(**result).model_dump(), result['status']
 
-    response = _client_api.send_message(
+# Group sends whose per-member results can still be queried, oldest dropped first
+MAX_TRACKED_DELIVERIES = 100
+_deliveries = OrderedDict()
 
-    )
-    return BaseResponse(**result).model_dump(), result['status']
+def resolve_endpoint(friend_id):
+    """
+    (public key, ip, port) of a friend, from the local store filled at login and by presence sync,
+    falling back to /public_key.
+    """
+    entry = friends.get_friend(friend_id)
+    if entry:
+        return (entry[0]['public_key'], entry[0]['ip'], entry[0]['port']), None
+    response = get_server_api().get_public_key(friend_id)
+    if response['status'] == 200:
+        return (response['data']['public_key'], response['data']['ip'], response['data']['port']), None
+    return None, response['message']
 
-def history_service(friend_id):
+def evict_on_failure(friend_id, future):
+    """
+    Drops the cached endpoint of a member whose delivery failed, the next send fetches it again.
+    """
+    if future.result()['status'] == 'error':
+        friends.delete_friend(friend_id)
+
+def delivery_data(delivery_id, delivery):
+    return {
+        'delivery_id': delivery_id,
+        'done': delivery.done(),
+        'results': [
+            {'friend_id': member, 'status': item['status'], 'message': item['message']}
+            for member, item in delivery.results().items()
+        ]
+    }
+
+def group_chat_service(group_id, members, message):
+    """
+    Encrypts the message once for the group and returns right away, delivery goes on in the background.
+    The response carries a delivery_id for /group/delivery.
+    """
     result = dict()
-    if _client_api is None:
+    client_api = current_client_api()
+    if client_api is None:
         result['status'] = 409
         result['message'] = 'not logged in'
+        return BaseResponse(**result).model_dump(), result['status']
+
+    # Picks up friends that logged in again since the last send, their old keys would be rejected
+    get_server_api().sync_presence()
+    recipients = dict()
+    unresolved = dict()
+    for member in dict.fromkeys(members):
+        endpoint, error = resolve_endpoint(member)
+        if endpoint is None:
+            unresolved[member] = error
+        else:
+            recipients[member] = endpoint
+    delivery = client_api.send_group_message(group_id, json.dumps({**message, 'group_id': group_id}), recipients)
+    for member, error in unresolved.items():
+        delivery.fail(member, error)
+    for member, future in delivery.futures.items():
+        future.add_done_callback(lambda future, member=member: evict_on_failure(member, future))
+    get_history().store(client_api.user_id, group_id, message)
 
+    delivery_id = uuid.uuid4().hex
+    _deliveries[delivery_id] = delivery
+    while len(_deliveries) > MAX_TRACKED_DELIVERIES:
+        _deliveries.popitem(last=False)
+    result['status'] = 200
+    result['message'] = 'success'
+    result['data'] = delivery_data(delivery_id, delivery)
     return BaseResponse(**result).model_dump(), result['status']
 
-def decipher_service(timestamp):
+def group_delivery_service(delivery_id):
     result = dict()
-    if _client_api is None:
+    delivery = _deliveries.get(delivery_id)
+    if delivery is None:
+        result['status'] = 404
+        result['message'] = 'delivery does not exist'
+    else:
+        result['status'] = 200
+        result['message'] = 'success'
+        result['data'] = delivery_data(delivery_id, delivery)
+    return BaseResponse(**result).model_dump(), result['status']
+
+# Seconds between SSE keepalive comments while no message arrives
+STREAM_KEEPALIVE = 15
+
+def inbox_service(cursor, limit, timeout):
+    """
+    Long-poll for incoming messages: returns as soon as there are messages after the cursor,
+    or an empty batch after `timeout` seconds.
+    """
+    result = dict()
+    client_api = current_client_api()
+    if client_api is None:
         result['status'] = 409
         result['message'] = 'not logged in'
+        return BaseResponse(**result).model_dump(), result['status']
+    try:
+        messages, cursor, reset = client_api.inbox.read(cursor, limit, timeout)
+    except ValueError:
+        result['status'] = 400
+        result['message'] = 'invalid cursor'
+        return BaseResponse(**result).model_dump(), result['status']
+    result['status'] = 200
+    result['message'] = 'success'
+    result['data'] = {'messages': messages, 'cursor': cursor, 'reset': reset}
+    return BaseResponse(**result).model_dump(), result['status']
+
+def stream_service(cursor, limit):
+    """
+    Server-sent events for incoming messages. Each event carries one batch, its id is the cursor
+    after the batch, so a reconnecting EventSource resumes through Last-Event-ID.
+    Returns (event generator, None) or (None, (error response, status)).
+    """
+    client_api = current_client_api()
+    if client_api is None:
+        result = {'status': 409, 'message': 'not logged in'}
+        return None, (BaseResponse(**result).model_dump(), result['status'])
+    inbox = client_api.inbox
+    try:
+        if cursor is not None:
+            inbox.parse_cursor(cursor)
+    except ValueError:
+        result = {'status': 400, 'message': 'invalid cursor'}
+        return None, (BaseResponse(**result).model_dump(), result['status'])
 
-    return BaseResponse(**result).model_dump(), result['status']
\ No newline at end of file
+    def events():
+        position = cursor
+        # Tells EventSource to reconnect after 1s, and opens the stream right away
+        yield "retry: 1000\n\n"
+        while True:
+            # The next batch is read only after the previous one was written to the socket,
+            # a slow front end holds at most one batch here
+            messages, position, reset = inbox.read(position, limit, STREAM_KEEPALIVE)
+            if not messages and not reset:
+                yield ": keepalive\n\n"
+                continue
+            data = InboxMessages(messages=messages, cursor=position, reset=reset).model_dump_json()
+            yield f"id: {position}\nevent: messages\ndata: {data}\n\n"
+
+    return events(), None
+
+def history_service(friend_id):
+    result = dict()
+    history = get_history()
+    if history is None:
+        result['status'] = 409
+        result['message'] = 'not logged in'
+    else:
+        # Contents stay encrypted, the front end deciphers the visible page via /decipher
+        messages = history.conversation(friend_id)
+        result['status'] = 200
+        result['message'] = 'success'
+        result['data'] = {
+            'length': len(messages),
+            'messages': messages
+        }
+    return BaseResponse(**result).model_dump(), result['status']
+
+def decipher_service(timestamp=None, timestamps=None):
+    result = dict()
+    history = get_history()
+    if history is None:
+        result['status'] = 409
+        result['message'] = 'not logged in'
+    elif timestamps is not None:
+        plain_texts = history.decipher_many(timestamps)
+        result['status'] = 200
+        result['message'] = 'success'
+        result['data'] = {
+            'plain_texts': [
+                {'timestamp': timestamp, 'plain_text': plain_texts[timestamp]}
+                for timestamp in timestamps if timestamp in plain_texts
+            ]
+        }
+    else:
+        plain_text = history.decipher(timestamp)
+        if plain_text is not None:
+            result['status'] = 200
+            result['message'] = 'success'
+            result['data'] = {'plain_text': plain_text}
+        else:
+            result['status'] = 404
+            result['message'] = 'message does not exist'
+    return BaseResponse(**result).model_dump(), result['status']
@@ -3,8 +3,10 @@
 import json
 import socket
 import threading
+import time
 import base64
-from queue import Queue, Empty
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 
 # Assuming you have a config file like this
 # config.py
@@ -14,26 +16,156 @@ from queue import Queue, Empty
 # }
 # from config import CLIENT_CONFIG
 
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.fernet import Fernet
 
+from services.crypto import RSASuite, generate_key_pairs, get_suite, negotiate_suite, parse_public_keys, peer_protocol
+from services.peer import PeerStreams, DedupTable, AckWriter
+from services.inbox import Inbox
+from services.pipeline import DecryptionPipeline
+from common.log import get_logger
+from common.tracing import span
+
+logger = get_logger(__name__)
+
+# Plaintexts at least this large (in bytes) are zlib-compressed before encryption
+COMPRESSION_THRESHOLD = 1024
+COMPRESSION_LEVEL = 6
+# Upper bound for a decompressed message, protects the receiver from zip bombs
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+
+
+# Group fan-out: concurrent deliveries per client, and messages sealed with one group content key before rotation
+GROUP_SEND_WORKERS = 8
+GROUP_KEY_MAX_MESSAGES = 10000
+# Seconds a stream message may wait for the peer's ack before the send is reported as failed
+ACK_TIMEOUT = 10
+
+
+class GroupSession:
+    """
+    Encryption state of one group: a content key per negotiated suite, wrapped once per member and
+    reused for later messages. A member whose advertised key changes is rewrapped; the keys are
+    rotated when a member leaves (so they cannot read later messages) and after GROUP_KEY_MAX_MESSAGES.
+    """
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.lock = threading.Lock()
+        # {suite name: content key}
+        self.content_keys = dict()
+        # {member: (public key payload, suite name, base64 wrapped key)}
+        self.wrapped = dict()
+        self.sent = 0
+
+    def wrap_keys(self, public_keys: dict):
+        """
+        public_keys maps member -> advertised public key payload.
+        Returns ({member: (suite name, wrapped key)}, {suite name: content key}, {member: error}).
+        """
+        wrapped_keys = dict()
+        errors = dict()
+        with self.lock:
+            if self.sent >= GROUP_KEY_MAX_MESSAGES or not self.wrapped.keys() <= public_keys.keys():
+                self.content_keys.clear()
+                self.wrapped.clear()
+                self.sent = 0
+            self.sent += 1
+            for member, payload in public_keys.items():
+                cached = self.wrapped.get(member)
+                if cached is None or cached[0] != payload:
+                    try:
+                        peer_public_keys = parse_public_keys(payload)
+                        suite = negotiate_suite(peer_public_keys)
+                    except Exception as e:
+                        errors[member] = str(e)
+                        continue
+                    content_key = self.content_keys.get(suite.name)
+                    if content_key is None:
+                        content_key = self.content_keys[suite.name] = suite.generate_content_key()
+                    wrapped_key = suite.wrap(content_key, peer_public_keys[suite.name])
+                    cached = self.wrapped[member] = (payload, suite.name, base64.b64encode(wrapped_key).decode('ascii'))
+                wrapped_keys[member] = cached[1:]
+            used = {suite_name for suite_name, _ in wrapped_keys.values()}
+            content_keys = {name: key for name, key in self.content_keys.items() if name in used}
+        return wrapped_keys, content_keys, errors
+
+
+class GroupDelivery:
+    """
+    Handle for a group send in progress, per-member results fill in as the deliveries finish.
+    """
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.futures = dict()
+        self.failed = dict()
+
+    def add(self, member, future):
+        self.futures[member] = future
+
+    def fail(self, member, message):
+        self.failed[member] = {"status": "error", "message": message}
+
+    def done(self):
+        return all(future.done() for future in self.futures.values())
+
+    def results(self):
+        """
+        Non-blocking snapshot: {member: {"status": "pending" | "success" | "error", "message": ...}}.
+        """
+        results = dict(self.failed)
+        for member, future in self.futures.items():
+            if future.done():
+                results[member] = future.result()
+            else:
+                results[member] = {"status": "pending", "message": "Delivery in progress."}
+        return results
+
+    def wait(self, timeout=None):
+        wait(list(self.futures.values()), timeout=timeout)
+        return self.results()
+
 
 class ClientAPI:
-    def __init__(self, host, port, user_id, public_key, private_key):
+    def __init__(self, host, port, user_id, public_key, private_key,
+                 decrypt_workers=None, decrypt_max_in_flight=None, decrypt_use_processes=True, history=None):
         self.host = host
         self.port = port
         self.user_id = user_id
-        self.private_key = private_key
+        # {suite name: private key}, a bare RSA key is accepted for compatibility
+        if not isinstance(private_key, dict):
+            private_key = {RSASuite.name: private_key}
+        self.private_keys = private_key
+        self.private_key = private_key.get(RSASuite.name)
         self.public_key_pem = public_key
-
-        # A thread-safe queue for incoming messages
-        self.incoming_messages = Queue()
+        # Encrypted-at-rest store for received messages, optional
+        self.history = history
+
+        # Incoming messages for the front end, read by cursor (/messages, /messages/stream)
+        self.inbox = Inbox()
+        # Cursor of get_latest_message
+        self.poll_cursor = self.inbox.cursor(0)
+
+        # Group fan-out state, the delivery pool is created on the first group message
+        self.group_sessions = dict()
+        self.group_lock = threading.Lock()
+        self.group_executor = None
+
+        # Outgoing persistent streams, and the dedup windows of incoming ones
+        self.peer_streams = PeerStreams()
+        self.dedup = DedupTable()
+
+        # Incoming payloads are decrypted on a worker pool and released in per-sender order
+        self.decryption_pipeline = DecryptionPipeline(
+            self.private_keys,
+            self.deliver_message,
+            workers=decrypt_workers,
+            max_in_flight=decrypt_max_in_flight,
+            use_processes=decrypt_use_processes
+        )
 
         # Start listening for messages in a background thread
         self.listener_thread = threading.Thread(target=self.start_listening, daemon=True)
         self.listener_thread.start()
-        print(f"[*] P2P listener started on {host}:{port}")
+        logger.info("p2p_listener_started", host=host, port=port)
 
     def start_listening(self):
         """
@@ -47,127 +179,223 @@ class ClientAPI:
 
         while True:
             try:
-                # Accept a new connection
+                # Accept a new connection, streams stay open so each one gets its own reader
                 conn, addr = server_socket.accept()
-                with conn:
-                    # print(f"[*] Accepted connection from {addr}")
-                    full_message = b""
-                    while True:
-                        data = conn.recv(4096)
-                        if not data:
-                            break
-                        full_message += data
-
-                    if full_message:
-                        decrypted_message = self.decipher_message(full_message.decode('utf-8'))
-                        # Put the decrypted message into the thread-safe queue
-                        self.incoming_messages.put(decrypted_message)
-
+                threading.Thread(target=self.handle_connection, args=(conn,), daemon=True).start()
             except Exception as e:
-                print(f"[!] Error in listener thread: {e}")
+                logger.exception("p2p_listener_error")
 
-    @classmethod
-    def generate_key_pair(cls):
+    def handle_connection(self, conn):
         """
-        Generates an RSA private and public key pair.
+        Reads newline-delimited frames until the peer closes the connection. Stream frames are acked
+        by the connection's AckWriter once delivered. A one-shot payload without a newline is handled at EOF.
         """
-        private_key = rsa.generate_private_key(
-            public_exponent=65537,
-            key_size=2048,
-        )
-        public_key = private_key.public_key()
-
-        # Serialize public key to PEM format to make it shareable
-        public_key_pem = public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-        return private_key, public_key_pem
+        with conn:
+            acks = AckWriter(conn)
+            buffer = b""
+            try:
+                while True:
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+                    buffer += data
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            self.receive_frame(line, acks)
+                if buffer.strip():
+                    self.receive_frame(buffer, acks)
+            except Exception as e:
+                logger.exception("p2p_listener_error")
+            finally:
+                acks.close()
 
-    def generate_symmetric_key(self):
+    def receive_frame(self, frame: bytes, acks: AckWriter):
         """
-        Generates a Fernet (AES-based) symmetric key.
+        Hands one payload to the decryption pipeline, dropping stream frames already received.
+        A stream frame is acked after deliver_message and nacked when it cannot be decrypted,
+        a duplicate re-acks what was delivered so far.
         """
-        return Fernet.generate_key()
+        message_data = json.loads(frame.decode('utf-8'))
+        sender = message_data.get("user_id")
+        message_id = message_data.get("id")
+        on_delivered = None
+        if message_id is not None:
+            stream = (sender, message_data.get("epoch"))
+            is_new, delivered, error = self.dedup.accept(stream, message_id, acks)
+            if not is_new:
+                logger.info("p2p_duplicate", sender=sender, id=message_id)
+                if error is not None:
+                    acks.nack(stream, message_id, error)
+                acks.update(stream, delivered)
+                return
+            on_delivered = lambda error: self.dedup.delivered(stream, message_id, error)
+        # Decrypted off the listener thread, the pipeline puts it into the inbox
+        self.decryption_pipeline.submit(sender, message_data, on_delivered)
 
-    def cipher_by_public_key(self, message: bytes, public_key_pem: bytes) -> bytes:
+    @classmethod
+    def generate_key_pair(cls, suites=None):
         """
-        Encrypts a message using a recipient's public key (PEM format).
+        Generates a key pair for every supported crypto suite.
+        Returns ({suite: private key}, public key payload to advertise at login).
         """
-        public_key = serialization.load_pem_public_key(public_key_pem)
-        ciphertext = public_key.encrypt(
-            message,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        return ciphertext
+        return generate_key_pairs(suites)
 
-    def decipher_by_private_key(self, ciphertext: bytes) -> bytes:
+    def generate_symmetric_key(self):
         """
-        Decrypts a message using the instance's own private key.
+        Generates a Fernet (AES-based) symmetric key.
         """
-        plaintext = self.private_key.decrypt(
-            ciphertext,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
-        return plaintext
+        return Fernet.generate_key()
 
-    def cipher_by_symmetric_key(self, message: str, symmetric_key: bytes) -> bytes:
+    @staticmethod
+    def compress_message(message: str):
         """
-        Encrypts a string message using a symmetric key.
+        Compresses a plaintext before encryption when it is large enough to benefit.
+        Returns (data, compression), compression is None if the plaintext was left as is.
         """
-        f = Fernet(symmetric_key)
-        # Message must be in bytes
-        return f.encrypt(message.encode('utf-8'))
-
-    def decipher_by_symmetric_key(self, token: bytes, symmetric_key: bytes) -> str:
+        data = message.encode('utf-8')
+        if len(data) < COMPRESSION_THRESHOLD:
+            return data, None
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        # Already compressed content (pictures, base64 blobs) does not shrink
+        if len(compressed) >= len(data):
+            return data, None
+        return compressed, "zlib"
+
+    @staticmethod
+    def decompress_message(data: bytes, compression: str) -> bytes:
         """
-        Decrypts a token using a symmetric key and returns a string.
+        Reverses compress_message, refusing output larger than MAX_DECOMPRESSED_SIZE.
         """
-        f = Fernet(symmetric_key)
-        decrypted_message_bytes = f.decrypt(token)
-        return decrypted_message_bytes.decode('utf-8')
+        if compression != "zlib":
+            raise ValueError(f"Unsupported compression: {compression}")
+        decompressor = zlib.decompressobj()
+        result = decompressor.decompress(data, MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise ValueError("Decompressed message exceeds size limit")
+        if not decompressor.eof:
+            raise ValueError("Truncated compressed message")
+        return result
 
-    def send_message(self, message: str, target_public_key_pem: bytes, target_host: str, target_port: int):
+    def send_message(self, message: str, target_public_key_pem, target_host: str, target_port: int):
         """
         Sends a fully encrypted message to a target host/port.
+        target_public_key_pem is the recipient's advertised public key payload (or a bare RSA PEM).
         """
         try:
-            # 1. Generate a one-time symmetric key
-            symmetric_key = self.generate_symmetric_key()
+            # 1. Pick the fastest suite the recipient supports
+            peer_public_keys = parse_public_keys(target_public_key_pem)
+            suite = negotiate_suite(peer_public_keys)
 
-            # 2. Encrypt the symmetric key with the recipient's public key
-            encrypted_symmetric_key = self.cipher_by_public_key(symmetric_key, target_public_key_pem)
+            with span("crypto_encrypt", suite=suite.name):
+                # 2. Generate a one-time content key wrapped with the recipient's public key
+                symmetric_key, encrypted_symmetric_key = suite.wrap_key(peer_public_keys[suite.name])
 
-            # 3. Encrypt the actual message with the symmetric key
-            encrypted_message = self.cipher_by_symmetric_key(message, symmetric_key)
+                # 3. Compress large plaintexts, then encrypt with the content key
+                data, compression = self.compress_message(message)
+                encrypted_message = suite.seal(data, symmetric_key)
 
             # 4. Prepare payload. Use base64 encoding for binary data in JSON.
             payload = {
                 "user_id": self.user_id,
+                "suite": suite.name,
                 "symmetric_key": base64.b64encode(encrypted_symmetric_key).decode('ascii'),
                 "message": base64.b64encode(encrypted_message).decode('ascii')
             }
-            payload_json = json.dumps(payload)
+            if compression is not None:
+                payload["compression"] = compression
 
-            # 5. Send the payload using a standard socket
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((target_host, target_port))
-                s.sendall(payload_json.encode('utf-8'))
+        except Exception as e:
+            logger.warning("p2p_send_failed", host=target_host, port=target_port, error=str(e))
+            return {"status": "error", "message": str(e)}
 
-            print(f"[*] Message sent to {target_host}:{target_port}")
-            return {"status": "success", "message": "Message sent successfully."}
+        # 5. Send the payload on the peer's stream, or on its own connection for older peers
+        delivery = self.send_payload(payload, suite.name, target_host, target_port, peer_protocol(target_public_key_pem))
+        try:
+            return delivery.result(ACK_TIMEOUT)
+        except FutureTimeoutError:
+            logger.warning("p2p_send_failed", host=target_host, port=target_port, error="ack timeout")
+            return {"status": "error", "message": "Message was not acknowledged in time."}
 
+    def send_payload(self, payload: dict, suite_name: str, target_host: str, target_port: int, protocol=1) -> Future:
+        """
+        Delivers an already encrypted payload, returns a Future of the {"status", "message"} result.
+        Protocol 2 peers get it on the persistent stream and it counts as sent once acked, no thread
+        waits for the ack; older peers get one TCP connection per message, written before returning.
+        """
+        result = Future()
+
+        def finish(error=None, size=None):
+            if error is None:
+                logger.info("p2p_send", host=target_host, port=target_port, suite=suite_name, protocol=protocol, size=size)
+                result.set_result({"status": "success", "message": "Message sent successfully."})
+            else:
+                logger.warning("p2p_send_failed", host=target_host, port=target_port, error=str(error))
+                result.set_result({"status": "error", "message": str(error)})
+
+        try:
+            with span("p2p_send", host=target_host, port=target_port):
+                if protocol >= 2:
+                    sent = self.peer_streams.get(target_host, target_port).send(payload, ACK_TIMEOUT)
+                    sent.add_done_callback(lambda sent: finish(sent.exception()))
+                    return result
+                payload_json = json.dumps(payload)
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                    s.connect((target_host, target_port))
+                    s.sendall(payload_json.encode('utf-8'))
         except Exception as e:
-            print(f"[!] Failed to send message: {e}")
-            return {"status": "error", "message": str(e)}
+            finish(e)
+            return result
+        finish(size=len(payload_json))
+        return result
+
+    def send_group_message(self, group_id, message: str, recipients: dict):
+        """
+        Sends one message to every member of a group without blocking.
+        recipients maps member id -> (public key payload, host, port).
+        The plaintext is compressed and sealed once per negotiated suite with the group's content key,
+        each member only gets its own wrapped copy of that key. Deliveries run on a bounded thread pool,
+        the returned GroupDelivery collects per-member results as they finish.
+        """
+        delivery = GroupDelivery(group_id)
+        with self.group_lock:
+            session = self.group_sessions.get(group_id)
+            if session is None:
+                session = self.group_sessions[group_id] = GroupSession(group_id)
+            if self.group_executor is None:
+                self.group_executor = ThreadPoolExecutor(max_workers=GROUP_SEND_WORKERS, thread_name_prefix="group-send")
+
+        with span("crypto_encrypt_group", members=len(recipients)):
+            wrapped_keys, content_keys, errors = session.wrap_keys(
+                {member: recipient[0] for member, recipient in recipients.items()}
+            )
+            data, compression = self.compress_message(message)
+            sealed = {
+                name: base64.b64encode(get_suite(name).seal(data, content_key)).decode('ascii')
+                for name, content_key in content_keys.items()
+            }
+
+        for member, error in errors.items():
+            delivery.fail(member, error)
+        for member, (suite_name, wrapped_key) in wrapped_keys.items():
+            payload = {
+                "user_id": self.user_id,
+                "suite": suite_name,
+                "symmetric_key": wrapped_key,
+                "message": sealed[suite_name]
+            }
+            if compression is not None:
+                payload["compression"] = compression
+            public_key, host, port = recipients[member]
+            protocol = peer_protocol(public_key)
+            if protocol >= 2:
+                # Resolved by the ack, no pool thread waits on it
+                delivery.add(member, self.send_payload(payload, suite_name, host, port, protocol))
+            else:
+                delivery.add(member, self.group_executor.submit(
+                    lambda *args: self.send_payload(*args).result(), payload, suite_name, host, port, protocol
+                ))
+        return delivery
 
     def decipher_message(self, received_json: str) -> str:
         """
@@ -175,25 +403,64 @@ class ClientAPI:
         """
         # 1. Load the JSON payload
         message_data = json.loads(received_json)
+        return self.decipher_payload(message_data, self.private_keys)
 
-        # 2. Decode base64 and decrypt the symmetric key
-        encrypted_symmetric_key = base64.b64decode(message_data["symmetric_key"])
-        symmetric_key = self.decipher_by_private_key(encrypted_symmetric_key)
-
-        # 3. Decode base64 and decrypt the message
-        encrypted_message = base64.b64decode(message_data["message"])
-        result = self.decipher_by_symmetric_key(encrypted_message, symmetric_key)
-
-        return result
+    @classmethod
+    def decipher_payload(cls, message_data: dict, private_keys: dict) -> str:
+        """
+        Deciphers an already parsed payload, also used by the decryption pipeline workers.
+        """
+        # 2. Decode base64 and unwrap the content key with our key for the sender's suite
+        suite = get_suite(message_data.get("suite"))
+        if suite.name not in private_keys:
+            raise ValueError(f"No private key for crypto suite: {suite.name}")
+        with span("crypto_decrypt", suite=suite.name):
+            encrypted_symmetric_key = base64.b64decode(message_data["symmetric_key"])
+            symmetric_key = suite.unwrap_key(encrypted_symmetric_key, private_keys[suite.name])
+
+            # 3. Decode base64, decrypt the message and decompress it if flagged
+            data = suite.open(base64.b64decode(message_data["message"]), symmetric_key)
+            compression = message_data.get("compression")
+            if compression is not None:
+                data = cls.decompress_message(data, compression)
+
+        return data.decode('utf-8')
+
+    @staticmethod
+    def parse_plain_text(plain_text: str) -> dict:
+        """
+        Chat messages are sent as {"type", "content"} JSON, anything else is plain text.
+        """
+        try:
+            message = json.loads(plain_text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or not {"type", "content"} <= message.keys():
+            message = {"type": "text", "content": plain_text}
+        return message
+
+    def deliver_message(self, sender_id, plain_text: str):
+        """
+        Stores a decrypted message at rest and puts it in the inbox for the front end.
+        """
+        message = self.parse_plain_text(plain_text)
+        if self.history is not None:
+            timestamp = self.history.store(sender_id, self.user_id, message)
+        else:
+            timestamp = int(time.time() * 1000)
+        self.inbox.put({
+            "timestamp": timestamp,
+            "sender": sender_id,
+            "receiver": self.user_id,
+            "message": message
+        })
 
     def get_latest_message(self):
         """
-        A non-blocking method for the Flask app to retrieve received messages.
+        A non-blocking method for the Flask app to retrieve received messages one at a time.
         """
-        try:
-            return self.incoming_messages.get_nowait()
-        except Empty:
-            return None
+        messages, self.poll_cursor, _ = self.inbox.read(self.poll_cursor, limit=1)
+        return messages[0] if messages else None
 
 
 # --- Singleton Pattern Implementation ---
@@ -208,4 +475,11 @@ def get_client_api(**kwargs):  # Provide default/config values
         # from config import CLIENT_CONFIG
         # _client_api = ClientAPI(host=CLIENT_CONFIG['host'], port=CLIENT_CONFIG['port'])
         _client_api = ClientAPI(**kwargs)
+    return _client_api
+
+
+def current_client_api():
+    """
+    The running client, None before login.
+    """
     return _client_api
\ No newline at end of file
@@ -1,18 +1,24 @@
 from schemas.contacts import BaseResponse
-from services.serverAPI import serverAPI
+from services.serverAPI import get_server_api
 
 def get_contacts_service():
-    response = serverAPI.get_contacts()
+    response = get_server_api().get_contacts()
     return BaseResponse(**response).model_dump(), response['status']
 
 def add_friend_service(friend_id):
-    response = serverAPI.add_friend(friend_id)
+    response = get_server_api().add_friend(friend_id)
     return BaseResponse(**response).model_dump(), response['status']
 
-def agree_service(user_id):
-    """未实现"""
-    pass
+def agree_service(friend_id):
+    """
+    Accepts a pending friend request through the bulk endpoint, the item's result becomes the response.
+    """
+    response = get_server_api().bulk_contacts([friend_id], action="accept")
+    if response['status'] == 200:
+        item = response['data']['results'][0]
+        response = {'status': item['status'], 'message': item['message']}
+    return BaseResponse(**response).model_dump(), response['status']
 
 def delete_friend_service(friend_id):
-    response = serverAPI.delete_friend(friend_id)
+    response = get_server_api().delete_friend(friend_id)
     return BaseResponse(**response).model_dump(), response['status']
\ No newline at end of file
@@ -0,0 +1,221 @@
+# crypto.py
+"""
+Crypto suites for P2P messaging.
+
+Every suite splits a message into the same three steps:
+    1. wrap_key:   generate a content key and wrap it for the recipient's public key
+                   (generate_content_key + wrap, a group message wraps one key per member)
+    2. seal:       encrypt the (optionally compressed) plaintext with the content key
+    3. unwrap_key / open: the reverse on the receiving side
+
+The login `public_key` payload advertises one public key per supported suite,
+in order of preference, plus the P2P transport version under "p2p". Senders pick the first suite in SUITE_PREFERENCE that
+the recipient also advertises; a plain PEM key is treated as RSA only.
+"""
+
+import base64
+import json
+import os
+
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+
+class RSASuite:
+    """
+    RSA-OAEP(SHA256) wrapped Fernet key, the original protocol. Kept for compatibility.
+    """
+    name = "rsa-oaep-fernet"
+
+    _padding = padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+        algorithm=hashes.SHA256(),
+        label=None
+    )
+
+    def generate_key_pair(self):
+        private_key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+        )
+        return private_key, private_key.public_key()
+
+    def encode_public_key(self, public_key) -> str:
+        # DER instead of PEM keeps the login payload within the server's column size
+        der = public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return base64.b64encode(der).decode('ascii')
+
+    def decode_public_key(self, encoded):
+        if isinstance(encoded, str):
+            encoded = encoded.encode('ascii')
+        if encoded.startswith(b"-----BEGIN"):
+            return serialization.load_pem_public_key(encoded)
+        return serialization.load_der_public_key(base64.b64decode(encoded))
+
+    def generate_content_key(self) -> bytes:
+        return Fernet.generate_key()
+
+    def wrap(self, content_key: bytes, public_key) -> bytes:
+        return public_key.encrypt(content_key, self._padding)
+
+    def wrap_key(self, public_key):
+        content_key = self.generate_content_key()
+        return content_key, self.wrap(content_key, public_key)
+
+    def unwrap_key(self, wrapped_key: bytes, private_key) -> bytes:
+        return private_key.decrypt(wrapped_key, self._padding)
+
+    def seal(self, data: bytes, content_key: bytes) -> bytes:
+        return Fernet(content_key).encrypt(data)
+
+    def open(self, token: bytes, content_key: bytes) -> bytes:
+        return Fernet(content_key).decrypt(token)
+
+
+class X25519Suite:
+    """
+    Ephemeral-static X25519 key agreement, HKDF-SHA256 key derivation and ChaCha20-Poly1305.
+    Wrapped key layout: ephemeral public key (32) || AEAD(content key) (48).
+    Sealed message layout: nonce (12) || AEAD(message).
+    """
+    name = "x25519-chacha20poly1305"
+
+    _wrap_nonce = b"\x00" * 12  # every wrapping key is derived from a fresh ephemeral key
+
+    def generate_key_pair(self):
+        private_key = X25519PrivateKey.generate()
+        return private_key, private_key.public_key()
+
+    def encode_public_key(self, public_key) -> str:
+        raw = public_key.public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        return base64.b64encode(raw).decode('ascii')
+
+    def decode_public_key(self, encoded):
+        return X25519PublicKey.from_public_bytes(base64.b64decode(encoded))
+
+    def _derive_wrapping_key(self, shared_secret: bytes, ephemeral_public: bytes, recipient_public: bytes) -> bytes:
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"p2p-key-wrap" + ephemeral_public + recipient_public,
+        ).derive(shared_secret)
+
+    def _raw(self, public_key) -> bytes:
+        return public_key.public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+
+    def generate_content_key(self) -> bytes:
+        return ChaCha20Poly1305.generate_key()
+
+    def wrap(self, content_key: bytes, public_key) -> bytes:
+        ephemeral = X25519PrivateKey.generate()
+        ephemeral_public = self._raw(ephemeral.public_key())
+        wrapping_key = self._derive_wrapping_key(
+            ephemeral.exchange(public_key), ephemeral_public, self._raw(public_key)
+        )
+        wrapped = ChaCha20Poly1305(wrapping_key).encrypt(self._wrap_nonce, content_key, None)
+        return ephemeral_public + wrapped
+
+    def wrap_key(self, public_key):
+        content_key = self.generate_content_key()
+        return content_key, self.wrap(content_key, public_key)
+
+    def unwrap_key(self, wrapped_key: bytes, private_key) -> bytes:
+        ephemeral_public, wrapped = wrapped_key[:32], wrapped_key[32:]
+        shared_secret = private_key.exchange(X25519PublicKey.from_public_bytes(ephemeral_public))
+        wrapping_key = self._derive_wrapping_key(
+            shared_secret, ephemeral_public, self._raw(private_key.public_key())
+        )
+        return ChaCha20Poly1305(wrapping_key).decrypt(self._wrap_nonce, wrapped, None)
+
+    def seal(self, data: bytes, content_key: bytes) -> bytes:
+        nonce = os.urandom(12)
+        return nonce + ChaCha20Poly1305(content_key).encrypt(nonce, data, None)
+
+    def open(self, token: bytes, content_key: bytes) -> bytes:
+        return ChaCha20Poly1305(content_key).decrypt(token[:12], token[12:], None)
+
+
+# Fastest first
+SUITES = {suite.name: suite for suite in (X25519Suite(), RSASuite())}
+SUITE_PREFERENCE = list(SUITES)
+DEFAULT_SUITE = RSASuite.name
+# P2P transport advertised next to the keys: 2 = persistent streams with ids and acks (peer.py)
+PROTOCOL_VERSION = 2
+
+
+def get_suite(name=None):
+    """
+    Looks up a suite by name, envelopes without a suite field use the original RSA protocol.
+    """
+    try:
+        return SUITES[name or DEFAULT_SUITE]
+    except KeyError:
+        raise ValueError(f"Unsupported crypto suite: {name}")
+
+
+def generate_key_pairs(suites=None):
+    """
+    Generates one key pair per suite.
+    Returns (private_keys, public_key_payload): a {suite: private key} dict and the
+    JSON string advertised to the server as the login public_key.
+    """
+    private_keys = dict()
+    public_keys = dict()
+    for name in suites or SUITE_PREFERENCE:
+        suite = get_suite(name)
+        private_key, public_key = suite.generate_key_pair()
+        private_keys[name] = private_key
+        public_keys[name] = suite.encode_public_key(public_key)
+    public_keys["p2p"] = PROTOCOL_VERSION
+    return private_keys, json.dumps(public_keys, separators=(',', ':'))
+
+
+def parse_public_keys(payload) -> dict:
+    """
+    Parses a peer's advertised public_key payload into {suite: public key object}.
+    A bare PEM key (older clients) is treated as the RSA suite.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    if payload.lstrip().startswith("-----BEGIN"):
+        return {RSASuite.name: get_suite(RSASuite.name).decode_public_key(payload)}
+    public_keys = dict()
+    for name, encoded in json.loads(payload).items():
+        if name in SUITES:
+            public_keys[name] = SUITES[name].decode_public_key(encoded)
+    return public_keys
+
+
+def peer_protocol(payload) -> int:
+    """
+    P2P transport version a peer advertises, 1 (one connection per message) when absent.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+    if payload.lstrip().startswith("-----BEGIN"):
+        return 1
+    return json.loads(payload).get("p2p", 1)
+
+
+def negotiate_suite(peer_public_keys: dict, local_suites=None):
+    """
+    Picks the fastest suite supported by both sides.
+    """
+    for name in SUITE_PREFERENCE:
+        if name in peer_public_keys and (local_suites is None or name in local_suites):
+            return SUITES[name]
+    raise ValueError("No common crypto suite with peer")
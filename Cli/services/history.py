@@ -0,0 +1,163 @@
+# history.py
+"""
+Encrypted-at-rest chat history.
+
+Message contents are stored encrypted with a storage key derived from the user's
+password, /history only returns ciphertext and /decipher decrypts the requested
+timestamps on demand. Recently decrypted plaintexts are kept in a bounded LRU so
+scrolling back and forth does not repeat decryptions.
+"""
+
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from models.messages import messages
+
+PLAINTEXT_CACHE_SIZE = 512
+
+
+class PlaintextCache:
+    """
+    Thread-safe LRU of timestamp -> plaintext.
+    """
+    def __init__(self, maxsize=PLAINTEXT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class History:
+    def __init__(self, user_id, storage_key: bytes, cache_size=PLAINTEXT_CACHE_SIZE):
+        self.user_id = user_id
+        self.fernet = Fernet(storage_key)
+        self.cache = PlaintextCache(cache_size)
+        self.lock = threading.Lock()
+        self.last_timestamp = 0
+
+    @classmethod
+    def derive_storage_key(cls, user_id, password) -> bytes:
+        """
+        Derives the at-rest key from the password with a per-user salt kept in the local store.
+        """
+        salt = messages.get_salt(user_id)
+        if salt is None:
+            salt = base64.b64encode(os.urandom(16)).decode('ascii')
+            messages.set_salt(user_id, salt)
+        key = Scrypt(salt=base64.b64decode(salt), length=32, n=2 ** 14, r=8, p=1).derive(password.encode('utf-8'))
+        return base64.urlsafe_b64encode(key)
+
+    def _next_timestamp(self):
+        """
+        Millisecond Unix timestamp, bumped so that local messages never share one.
+        """
+        with self.lock:
+            timestamp = max(int(time.time() * 1000), self.last_timestamp + 1)
+            self.last_timestamp = timestamp
+            return timestamp
+
+    def store(self, sender_id, receiver_id, message: dict) -> int:
+        """
+        Encrypts message['content'] at rest and returns the timestamp identifying it.
+        """
+        timestamp = self._next_timestamp()
+        ciphertext = self.fernet.encrypt(message['content'].encode('utf-8')).decode('ascii')
+        messages.insert_message({
+            'timestamp': timestamp,
+            'sender_id': sender_id,
+            'receiver_id': receiver_id,
+            'message': {
+                'type': message['type'],
+                'content': ciphertext
+            }
+        })
+        # The plaintext is at hand now, the front end usually shows it right away
+        self.cache.put(timestamp, message['content'])
+        return timestamp
+
+    def conversation(self, friend_id):
+        """
+        All messages exchanged with friend_id, contents still encrypted.
+        """
+        return [
+            {
+                'timestamp': record['timestamp'],
+                'sender': record['sender_id'],
+                'receiver': record['receiver_id'],
+                'message': record['message']
+            }
+            for record in messages.get_conversation(self.user_id, friend_id)
+        ]
+
+    def _decrypt(self, record):
+        try:
+            return self.fernet.decrypt(record['message']['content'].encode('ascii')).decode('utf-8')
+        except InvalidToken:
+            return None
+
+    def decipher(self, timestamp):
+        """
+        Plaintext of one stored message, None if it does not exist.
+        """
+        return self.decipher_many([timestamp]).get(timestamp)
+
+    def decipher_many(self, timestamps):
+        """
+        Plaintexts for a page of timestamps. Cached entries are served from the LRU,
+        the rest are fetched with a single query and decrypted once.
+        """
+        result = dict()
+        missing = list()
+        for timestamp in timestamps:
+            plain_text = self.cache.get(timestamp)
+            if plain_text is None:
+                missing.append(timestamp)
+            else:
+                result[timestamp] = plain_text
+        if missing:
+            for record in messages.get_messages_by_timestamps(missing):
+                if self.user_id not in (record['sender_id'], record['receiver_id']):
+                    continue
+                plain_text = self._decrypt(record)
+                if plain_text is not None:
+                    self.cache.put(record['timestamp'], plain_text)
+                    result[record['timestamp']] = plain_text
+        return result
+
+
+# --- Singleton Pattern Implementation ---
+
+_history = None
+
+
+def init_history(user_id, password):
+    global _history
+    _history = History(user_id, History.derive_storage_key(user_id, password))
+    return _history
+
+
+def get_history():
+    return _history
@@ -0,0 +1,81 @@
+# inbox.py
+"""
+Incoming messages waiting for the front end.
+
+Every delivered message gets the next sequence number of the inbox. Readers keep a
+cursor "<epoch>:<seq>" of the last message they saw and ask for everything after it,
+so a reconnecting stream resumes without gaps or duplicates. The inbox keeps the most
+recent INBOX_SIZE messages; a reader that falls further behind (or holds a cursor from
+an earlier run, whose epoch differs) gets reset=True and reloads the conversation from
+/history, where every message is stored anyway. Receiving therefore never waits on a
+slow front end, and each reader holds at most one batch.
+"""
+
+import threading
+import time
+from collections import deque
+
+# Messages kept for readers that are behind
+INBOX_SIZE = 10000
+# Largest batch returned by one read
+INBOX_BATCH_MAX = 500
+# After the first message arrives, wait this long for more before returning the batch
+INBOX_BATCH_LINGER = 0.05
+
+
+class Inbox:
+    def __init__(self, size=INBOX_SIZE):
+        # Nanosecond start time, cursors from a previous run never match
+        self.epoch = time.time_ns()
+        self.seq = 0
+        self.entries = deque(maxlen=size)
+        self.cond = threading.Condition()
+
+    def cursor(self, seq=None):
+        return f"{self.epoch}:{self.seq if seq is None else seq}"
+
+    def parse_cursor(self, cursor):
+        """
+        Sequence number a cursor points at, None when it belongs to another epoch.
+        Raises ValueError for a malformed cursor.
+        """
+        epoch, seq = cursor.split(":")
+        if int(epoch) != self.epoch:
+            return None
+        return int(seq)
+
+    def put(self, message):
+        with self.cond:
+            self.seq += 1
+            self.entries.append((self.seq, message))
+            self.cond.notify_all()
+
+    def read(self, cursor=None, limit=INBOX_BATCH_MAX, timeout=0, linger=INBOX_BATCH_LINGER):
+        """
+        Messages after `cursor`, waiting up to `timeout` seconds for the first one and `linger`
+        more for a fuller batch. Without a cursor only messages arriving from now on are returned.
+        Returns (messages, next cursor, reset).
+        """
+        with self.cond:
+            seq = self.seq if cursor is None else self.parse_cursor(cursor)
+            reset = seq is None or seq > self.seq or seq < self.first_seq() - 1
+            if reset:
+                seq = self.first_seq() - 1
+            if timeout and self.seq <= seq:
+                self.cond.wait_for(lambda: self.seq > seq, timeout)
+                if linger and self.seq > seq:
+                    deadline = time.monotonic() + linger
+                    while self.seq - seq < limit and self.cond.wait(deadline - time.monotonic()):
+                        pass
+            messages = self.after(seq, limit)
+            if messages:
+                seq = messages[-1][0]
+            return [message for _, message in messages], self.cursor(seq), reset
+
+    def first_seq(self):
+        return self.entries[0][0] if self.entries else self.seq + 1
+
+    def after(self, seq, limit):
+        # Entries are consecutive, the offset of seq + 1 is known without scanning
+        start = seq + 1 - self.first_seq()
+        return [self.entries[i] for i in range(max(0, start), min(len(self.entries), start + limit))]
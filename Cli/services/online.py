@@ -1,8 +1,39 @@
-from services.serverAPI import serverAPI
+import hashlib
+import hmac
+import socket
+import time
+
+from config import SERVER_CONFIG
+from services.serverAPI import get_server_api
 from apscheduler.schedulers.background import BackgroundScheduler
 
+HEARTBEAT_INTERVAL = 5
+
 class Heartbeat:
-    def __init__(self):
+    """
+    登录后每 HEARTBEAT_INTERVAL 秒上报一次在线状态。
+    服务端下发了 UDP 心跳会话时发送签名的 UDP 报文，否则（或发送失败时）回退到 HTTP /heartbeat。
+    """
+    def beat(self):
+        if self.session is not None:
+            try:
+                self.send_datagram()
+                return
+            except OSError:
+                pass
+        get_server_api().heartbeat()
+
+    def send_datagram(self):
+        message = f"{self.session['session_id']}|{int(time.time())}"
+        mac = hmac.new(self.key, message.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+        self.socket.sendto(f"{message}|{mac}".encode('utf-8'), self.address)
+
+    def __init__(self, session=None):
+        self.session = session
+        if session is not None:
+            self.key = bytes.fromhex(session['key'])
+            self.address = (SERVER_CONFIG['host'].split(':')[0], session['port'])
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.scheduler = BackgroundScheduler()
-        self.scheduler.add_job(serverAPI.heartbeat(), 'interval', seconds=5)
-        self.scheduler.start()
\ No newline at end of file
+        self.scheduler.add_job(self.beat, 'interval', seconds=HEARTBEAT_INTERVAL)
+        self.scheduler.start()
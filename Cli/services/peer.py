@@ -0,0 +1,426 @@
+# peer.py
+"""
+Reliable P2P streams on top of persistent TCP connections.
+
+A sender opens one connection per peer and writes newline-delimited JSON frames.
+Each frame carries the stream `epoch` (fixed for the lifetime of the stream) and an
+`id` that increases by one per message. The receiver answers with cumulative acks
+{"ack": <highest id finished without gaps>, "epoch": ...} once frames have been decrypted
+and put in the inbox, coalescing acks that are ready at the same time. A frame that cannot be
+decrypted is answered with {"nack": <id>, "epoch": ..., "error": ...} before the ack covering it,
+and the sender fails that message instead of reporting it sent.
+Frames stay buffered until acked; after a broken connection they are resent on a new one,
+and the receiver's sliding dedup window drops the copies it has already seen.
+
+Peers that do not advertise protocol 2 keep getting the original one-shot connection.
+"""
+
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from common.log import get_logger
+from common.tracing import span
+
+logger = get_logger(__name__)
+
+# Ids accepted out of order ahead of the contiguous prefix before the window slides forward
+DEDUP_WINDOW = 1024
+# Streams whose dedup window is remembered, least recently used dropped first
+DEDUP_MAX_STREAMS = 1024
+# Frames written but not yet acked per stream, send blocks beyond it
+MAX_UNACKED = 1024
+# Reconnect attempts (with doubling backoff) before unacked frames are failed
+RECONNECT_ATTEMPTS = 3
+RECONNECT_BACKOFF = 0.2
+CONNECT_TIMEOUT = 5
+# Open streams kept per client, least recently used closed first
+MAX_PEER_STREAMS = 64
+
+
+class DeliveryError(Exception):
+    """
+    The peer received a frame but could not decrypt or deliver it.
+    """
+
+
+class IdWindow:
+    """
+    Set of ids as a contiguous prefix `upto` plus the ids seen ahead of it.
+    """
+    def __init__(self):
+        self.upto = 0
+        self.ahead = set()
+
+    def add(self, message_id):
+        """
+        Records an id, returns False when it was already recorded.
+        """
+        if message_id <= self.upto or message_id in self.ahead:
+            return False
+        self.ahead.add(message_id)
+        self._advance()
+        return True
+
+    def skip_to(self, upto):
+        """
+        Moves the prefix forward to `upto`, returns the ids below it that were never recorded.
+        """
+        lost = [i for i in range(self.upto + 1, upto + 1) if i not in self.ahead]
+        self.upto = upto
+        self.ahead = {i for i in self.ahead if i > upto}
+        self._advance()
+        return lost
+
+    def _advance(self):
+        while self.upto + 1 in self.ahead:
+            self.upto += 1
+            self.ahead.remove(self.upto)
+
+
+class DedupWindow:
+    """
+    State of one incoming stream: the ids received (for dedup) and the ids delivered (for acks).
+    A frame is acked only once it has been decrypted and handed to the inbox, so a sender never
+    drops a message the receiver could still lose. Memory is bounded by DEDUP_WINDOW; a gap older
+    than the window is given up on and counted as delivered.
+    """
+    def __init__(self):
+        self.received = IdWindow()
+        self.delivered = IdWindow()
+        # Writer of the connection the stream was last seen on, acks go there
+        self.acks = None
+        # id -> error of recent frames that could not be delivered, nacked again when resent
+        self.failed = dict()
+
+    def accept(self, message_id):
+        """
+        Records an id, returns False when it was already received.
+        """
+        if not self.received.add(message_id):
+            return False
+        if message_id - DEDUP_WINDOW > self.received.upto:
+            for lost in self.received.skip_to(message_id - DEDUP_WINDOW):
+                self.delivered.add(lost)
+        return True
+
+
+class DedupTable:
+    """
+    Dedup windows keyed by (sender, epoch), bounded LRU.
+    """
+    def __init__(self, maxsize=DEDUP_MAX_STREAMS):
+        self.maxsize = maxsize
+        self.windows = OrderedDict()
+        self.lock = threading.Lock()
+
+    def accept(self, stream, message_id, acks):
+        """
+        Records a frame received on the connection whose AckWriter is `acks`.
+        Returns (is_new, cumulative ack of the finished frames, error if this frame could not be delivered).
+        """
+        with self.lock:
+            window = self.windows.get(stream)
+            if window is None:
+                window = self.windows[stream] = DedupWindow()
+                while len(self.windows) > self.maxsize:
+                    self.windows.popitem(last=False)
+            else:
+                self.windows.move_to_end(stream)
+            window.acks = acks
+            return window.accept(message_id), window.delivered.upto, window.failed.get(message_id)
+
+    def delivered(self, stream, message_id, error=None):
+        """
+        Records a finished frame and queues the new cumulative ack on the stream's latest connection.
+        A frame that could not be delivered is nacked first, so the sender fails it before the
+        cumulative ack moves past it.
+        """
+        with self.lock:
+            window = self.windows.get(stream)
+            if window is None:
+                return
+            acks = window.acks
+            if error is not None:
+                window.failed[message_id] = str(error)
+                if acks is not None:
+                    acks.nack(stream, message_id, error)
+            window.delivered.add(message_id)
+            ack = window.delivered.upto
+            if window.failed:
+                window.failed = {i: e for i, e in window.failed.items() if i > ack - DEDUP_WINDOW}
+        if acks is not None:
+            acks.update(stream, ack)
+
+
+class AckWriter:
+    """
+    Sends the cumulative acks of one incoming connection from its own thread, coalescing updates,
+    so neither the reader nor the delivery path ever blocks on the socket.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = dict()
+        self.nacks = list()
+        self.cond = threading.Condition()
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def update(self, stream, ack):
+        with self.cond:
+            if self.closed or ack <= 0:
+                return
+            self.pending[stream] = max(ack, self.pending.get(stream, 0))
+            self.cond.notify()
+
+    def nack(self, stream, message_id, error):
+        """
+        Queues a {"nack", "epoch", "error"} frame, written before any ack queued after it.
+        """
+        with self.cond:
+            if self.closed:
+                return
+            self.nacks.append({"nack": message_id, "epoch": stream[1], "error": str(error)})
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.nacks or self.closed)
+                if not self.pending and not self.nacks:
+                    return
+                pending, self.pending = self.pending, dict()
+                nacks, self.nacks = self.nacks, list()
+            frames = nacks + [{"ack": ack, "epoch": epoch} for (_, epoch), ack in pending.items()]
+            try:
+                self.conn.sendall(b"".join((json.dumps(frame) + "\n").encode('utf-8') for frame in frames))
+            except OSError:
+                # The sender resends on a new connection, acks follow the stream there
+                with self.cond:
+                    self.closed = True
+                return
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+
+class PeerStream:
+    """
+    Sending side of one stream to a peer. send() assigns the next id, writes the frame and returns
+    a Future resolved when the peer acks it, so many messages can be in flight on one connection.
+    Connecting, backoff and resending run on a connector thread without holding the lock;
+    send() only ever writes to an already open socket.
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        # Nanosecond start time, a new stream to the same peer never reuses an epoch
+        self.epoch = time.time_ns()
+        self.next_id = 1
+        self.unacked = OrderedDict()
+        # Guards ids, unacked frames and the socket; writes to the socket use write_lock
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.space = threading.Condition(self.lock)
+        self.sock = None
+        self.connecting = False
+        self.closed = False
+
+    def send(self, frame: dict, timeout=None) -> Future:
+        future = Future()
+        with self.lock:
+            if not self.space.wait_for(lambda: len(self.unacked) < MAX_UNACKED or self.closed, timeout):
+                future.set_exception(TimeoutError("Too many unacknowledged messages"))
+                return future
+            if self.closed:
+                future.set_exception(ConnectionError("Stream closed"))
+                return future
+            frame = dict(frame, id=self.next_id, epoch=self.epoch)
+            line = (json.dumps(frame) + "\n").encode('utf-8')
+            self.unacked[self.next_id] = (line, future)
+            self.next_id += 1
+            sock = self.sock
+            if sock is None:
+                # The connector writes it together with the rest of the unacked frames
+                self._start_connect()
+                return future
+        try:
+            with self.write_lock:
+                sock.sendall(line)
+        except OSError as e:
+            self._connection_lost(sock, e)
+        return future
+
+    def _start_connect(self):
+        """
+        Starts the connector thread unless one is running. Caller holds the lock.
+        """
+        if not self.connecting and not self.closed:
+            self.connecting = True
+            threading.Thread(target=self._connect, daemon=True).start()
+
+    def _connect(self):
+        """
+        Connector thread: opens a connection with doubling backoff, resends the unacked frames and
+        hands the socket to send(). Fails the unacked frames once attempts run out.
+        """
+        delay = RECONNECT_BACKOFF
+        error = None
+        for attempt in range(RECONNECT_ATTEMPTS):
+            if attempt:
+                time.sleep(delay)
+                delay *= 2
+            with self.lock:
+                if self.closed or not self.unacked:
+                    self.connecting = False
+                    return
+            sock = None
+            try:
+                with span("p2p_connect", host=self.host, port=self.port):
+                    sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+                sock.settimeout(None)
+                resent = self._resend(sock)
+            except OSError as e:
+                error = e
+                if sock is not None:
+                    sock.close()
+                continue
+            if resent is None:
+                return
+            threading.Thread(target=self._read_acks, args=(sock,), daemon=True).start()
+            if attempt:
+                logger.info("p2p_reconnected", host=self.host, port=self.port, resent=resent)
+            return
+        with self.lock:
+            self.connecting = False
+            logger.warning("p2p_send_failed", host=self.host, port=self.port, error=str(error), dropped=len(self.unacked))
+            self._fail_unacked(error)
+
+    def _resend(self, sock):
+        """
+        Writes every unacked frame on a new connection, then makes it the stream's socket.
+        Frames sent meanwhile are picked up by the next round. Returns the number of frames written,
+        None when the stream was closed.
+        """
+        written = 0
+        last = 0
+        while True:
+            with self.lock:
+                if self.closed:
+                    self.connecting = False
+                    sock.close()
+                    return None
+                lines = [line for message_id, (line, _) in self.unacked.items() if message_id > last]
+                if not lines:
+                    self.sock = sock
+                    self.connecting = False
+                    return written
+                last = next(reversed(self.unacked))
+            sock.sendall(b"".join(lines))
+            written += len(lines)
+
+    def _connection_lost(self, sock, error):
+        with self.lock:
+            # Only the current connection recovers, a replaced one just exits
+            if self.sock is not sock:
+                return
+            self._drop_socket()
+            if self.unacked and not self.closed:
+                logger.info("p2p_connection_lost", host=self.host, port=self.port, error=str(error))
+                self._start_connect()
+
+    def _fail_unacked(self, error):
+        for _, future in self.unacked.values():
+            if not future.done():
+                future.set_exception(ConnectionError(str(error)))
+        self.unacked.clear()
+        self.space.notify_all()
+
+    def _drop_socket(self):
+        if self.sock is not None:
+            try:
+                # Wakes the ack reader blocked in recv
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = None
+
+    def _read_acks(self, sock):
+        buffer = b""
+        error = None
+        try:
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if line.strip():
+                        self._on_ack(json.loads(line))
+        except (OSError, ValueError) as e:
+            error = e
+        self._connection_lost(sock, error or ConnectionError("Connection closed by peer"))
+
+    def _on_ack(self, ack):
+        if ack.get("epoch") != self.epoch:
+            return
+        with self.lock:
+            if "nack" in ack:
+                # The peer received the frame but could not decrypt or deliver it, resending would not help
+                entry = self.unacked.pop(ack["nack"], None)
+                if entry is not None and not entry[1].done():
+                    entry[1].set_exception(DeliveryError(ack.get("error") or "Rejected by peer"))
+                self.space.notify_all()
+                return
+            while self.unacked:
+                message_id = next(iter(self.unacked))
+                if message_id > ack["ack"]:
+                    break
+                _, future = self.unacked.pop(message_id)
+                if not future.done():
+                    future.set_result(message_id)
+            self.space.notify_all()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self._drop_socket()
+            self._fail_unacked(ConnectionError("Stream closed"))
+
+
+class PeerStreams:
+    """
+    Open streams of one client keyed by (host, port), bounded LRU.
+    """
+    def __init__(self, maxsize=MAX_PEER_STREAMS):
+        self.maxsize = maxsize
+        self.streams = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, host, port) -> PeerStream:
+        evicted = list()
+        with self.lock:
+            stream = self.streams.get((host, port))
+            if stream is None:
+                stream = self.streams[(host, port)] = PeerStream(host, port)
+                while len(self.streams) > self.maxsize:
+                    evicted.append(self.streams.popitem(last=False)[1])
+            else:
+                self.streams.move_to_end((host, port))
+        for old in evicted:
+            old.close()
+        return stream
+
+    def close(self):
+        with self.lock:
+            streams = list(self.streams.values())
+            self.streams.clear()
+        for stream in streams:
+            stream.close()
@@ -0,0 +1,120 @@
+# pipeline.py
+"""
+Parallel decryption stage for incoming P2P payloads.
+
+The listener thread only parses the envelope and hands it to a worker pool.
+Results are released per sender strictly in arrival order, so a backlog of
+thousands of messages is decrypted on every core while each conversation stays ordered.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+
+from common import tracing
+from common.log import get_logger
+
+logger = get_logger(__name__)
+
+# Private keys of the owning client, loaded once per worker process
+_worker_private_keys = None
+
+
+def _init_worker(serialized_private_keys):
+    global _worker_private_keys
+    # The exporter thread does not survive the fork, workers do not trace
+    tracing.configure(None, None)
+    _worker_private_keys = {
+        name: serialization.load_der_private_key(der, password=None)
+        for name, der in serialized_private_keys.items()
+    }
+
+
+def _decipher_in_worker(message_data):
+    from services.clientAPI import ClientAPI
+    return ClientAPI.decipher_payload(message_data, _worker_private_keys)
+
+
+def _serialize_private_keys(private_keys):
+    return {
+        name: key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        for name, key in private_keys.items()
+    }
+
+
+class DecryptionPipeline:
+    def __init__(self, private_keys, deliver, workers=None, max_in_flight=None, use_processes=True):
+        """
+        :param private_keys: {suite: private key} of the receiving client
+        :param deliver: deliver(sender, plain_text), called in per-sender order
+        :param workers: pool size, defaults to the number of cores
+        :param max_in_flight: payloads submitted but not yet released, submit blocks beyond it
+        :param use_processes: process pool (RSA holds the GIL) or thread pool
+        """
+        self.deliver = deliver
+        self.workers = workers or os.cpu_count() or 1
+        self.private_keys = private_keys
+        if use_processes:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(_serialize_private_keys(private_keys),)
+            )
+            self.decipher = _decipher_in_worker
+        else:
+            from services.clientAPI import ClientAPI
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            self.decipher = lambda message_data: ClientAPI.decipher_payload(message_data, self.private_keys)
+        self.slots = threading.BoundedSemaphore(max_in_flight or self.workers * 4)
+        # sender -> futures in arrival order
+        self.pending = dict()
+        self.lock = threading.Lock()
+
+    def submit(self, sender, message_data, on_delivered=None):
+        """
+        Queues a parsed payload for decryption. Blocks while max_in_flight payloads are pending,
+        which pushes back on the listener instead of buffering an unbounded backlog.
+        on_delivered(error) is called once the payload has been delivered (error is None)
+        or could not be decrypted or delivered.
+        """
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self.decipher, message_data)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.pending.setdefault(sender, deque()).append((future, on_delivered))
+        future.add_done_callback(lambda _: self._release(sender))
+        return future
+
+    def _release(self, sender):
+        """
+        Pushes every finished result at the head of the sender's queue, stopping at the first
+        one still running so later messages never overtake it.
+        """
+        with self.lock:
+            futures = self.pending.get(sender)
+            while futures and futures[0][0].done():
+                future, on_delivered = futures.popleft()
+                self.slots.release()
+                error = None
+                try:
+                    self.deliver(sender, future.result())
+                except Exception as e:
+                    error = e
+                    logger.warning("decipher_failed", sender=sender, error=str(e))
+                if on_delivered is not None:
+                    on_delivered(error)
+            if futures is not None and not futures:
+                del self.pending[sender]
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait)
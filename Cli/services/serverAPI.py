@@ -1,6 +1,17 @@
+import logging
+import time
+from urllib.parse import urlencode
+
 import requests
 from config import SERVER_CONFIG
 from models.friends import friends
+from common.log import get_logger
+from common.tracing import span, propagation_headers
+
+logger = get_logger(__name__)
+
+# 分页获取通讯录时每页的条数
+CONTACTS_PAGE_SIZE = 500
 
 
 class ServerAPI:
@@ -16,6 +27,8 @@ class ServerAPI:
         self.timeout = SERVER_CONFIG['timeout']
         self.user_id = None
         self.token = None  # 存储登录后的token
+        # 好友在线状态增量同步的游标，登录后从头同步
+        self.presence_cursor = "0"
         # SERVER_CONFIG的配置在config.py
 
     def _post(self, path, data, use_token=True):
@@ -30,8 +43,11 @@ class ServerAPI:
         headers = {}
         if use_token and self.token:
             headers['Authorization'] = f'Bearer {self.token}'
-        response = requests.post(url, json={"data": data}, headers=headers, timeout=self.timeout)
-        print(response)
+        start = time.perf_counter()
+        with span("server_api", method="POST", path=path):
+            headers.update(propagation_headers())
+            response = requests.post(url, json={"data": data}, headers=headers, timeout=self.timeout)
+        self._log("POST", path, response, start)
         return response.json()
 
     def _get(self, path, use_token=True):
@@ -45,7 +61,11 @@ class ServerAPI:
         headers = {}
         if use_token and self.token:
             headers['Authorization'] = f'Bearer {self.token}'
-        response = requests.get(url, headers=headers, timeout=self.timeout)
+        start = time.perf_counter()
+        with span("server_api", method="GET", path=path):
+            headers.update(propagation_headers())
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+        self._log("GET", path, response, start)
         return response.json()
 
     def _delete(self, path, data, use_token=True):
@@ -60,9 +80,22 @@ class ServerAPI:
         headers = {}
         if use_token and self.token:
             headers['Authorization'] = f'Bearer {self.token}'
-        response = requests.delete(url, json={"data": data}, headers=headers, timeout=self.timeout)
+        start = time.perf_counter()
+        with span("server_api", method="DELETE", path=path):
+            headers.update(propagation_headers())
+            response = requests.delete(url, json={"data": data}, headers=headers, timeout=self.timeout)
+        self._log("DELETE", path, response, start)
         return response.json()
 
+    @staticmethod
+    def _log(method, path, response, start):
+        # 成功的请求只在 DEBUG 级别记录，失败的请求总是记录
+        level = logging.DEBUG if response.status_code < 400 else logging.INFO
+        logger.log(
+            level, "server_api", method=method, path=path, status=response.status_code,
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1)
+        )
+
     # ================== 业务接口 ==================
 
     def register(self, user_id, password, email):
@@ -74,7 +107,7 @@ class ServerAPI:
         response = self._post("/register", data, use_token=False)
         return response
 
-    def login(self, user_id, password, public_key, ip, port):
+    def login(self, user_id, password, public_key, ip, port, snapshot=False):
         data = {
             "user_id": user_id,
             "password": password,
@@ -82,24 +115,70 @@ class ServerAPI:
             "ip": ip,
             "port": port
         }
+        if snapshot:
+            # 登录响应附带通讯录与在线好友的公钥、地址，省去之后逐个查询
+            data["snapshot"] = True
         response = self._post("/login", data, use_token=False)
-        print(response)
         if response.get('status') == 200:
             self.user_id = data['user_id']
             self.token = response.get('data', {}).get('token')
+            self.presence_cursor = "0"
+        return response
+
+    def logout(self):
+        response = self._get("/logout")
+        if response.get('status') == 200:
+            self.token = None
         return response
 
     def get_contacts(self):
         response = self._get("/contacts")
-        print(response)
         return response
 
+    def get_contacts_page(self, after=None, limit=None, flag=None):
+        """
+        分页获取通讯录，按 user_id 升序；flag 为 1 只取好友，为 0 只取好友申请。
+        响应 data.next 为下一页的 after，没有下一页时为 None
+        """
+        params = {
+            key: value for key, value in (("after", after), ("limit", limit), ("flag", flag))
+            if value is not None
+        }
+        # 至少带一个参数，服务端才会分页
+        params.setdefault("limit", CONTACTS_PAGE_SIZE)
+        response = self._get(f"/contacts?{urlencode(params)}")
+        return response
+
+    def iter_contacts(self, flag=None, page_size=CONTACTS_PAGE_SIZE):
+        """
+        逐页遍历通讯录，每次只持有一页；请求失败时抛出 RuntimeError
+        """
+        after = None
+        while True:
+            response = self.get_contacts_page(after=after, limit=page_size, flag=flag)
+            if response.get('status') != 200:
+                raise RuntimeError(f"get contacts failed: {response.get('status')} {response.get('message')}")
+            yield from response['data']['contacts']
+            after = response['data'].get('next')
+            if after is None:
+                return
+
     def add_friend(self, friend_id):
         data = {
             "friend_id": friend_id
         }
         response = self._post("/contacts", data)
-        print(response)
+        return response
+
+    def bulk_contacts(self, friend_ids, action="request"):
+        """
+        批量发出（request）或同意（accept）好友申请，data.results 为逐项结果
+        """
+        data = {
+            "friend_ids": list(friend_ids),
+            "action": action
+        }
+        response = self._post("/contacts/bulk", data)
         return response
 
     def delete_friend(self, friend_id):
@@ -107,7 +186,6 @@ class ServerAPI:
             "friend_id": friend_id
         }
         response = self._delete("/contacts", data)
-        print(response)
         return response
 
     def get_online_status(self, friend_id):
@@ -115,7 +193,6 @@ class ServerAPI:
             "friend_id": friend_id
         }
         response = self._post("/online", data)
-        print(response)
         return response
 
     def get_public_key(self, friend_id):
@@ -123,18 +200,67 @@ class ServerAPI:
             "friend_id": friend_id
         }
         response = self._post("/public_key", data)
-        friends.create_friend(
-            friend_id=response['data']['friend_id'],
-            public_key=response['data']['public_key'],
-            ip=response['data']['ip'],
-            port=response['data']['port']
-        )
-        print(response)
+        if response.get('status') == 200:
+            friends.create_friend(
+                friend_id=friend_id,
+                public_key=response['data']['public_key'],
+                ip=response['data']['ip'],
+                port=response['data']['port']
+            )
+        return response
+
+    def get_presence_changes(self, since=0):
+        """
+        增量同步好友在线状态：在线好友写入本地好友表，离线好友删除；reset 时整体替换。
+        返回的 data.cursor 作为下一次的 since
+        """
+        response = self._get(f"/presence/changes?since={since}")
+        if response.get('status') == 200:
+            data = response['data']
+            if data['reset']:
+                friends.replace_friends([
+                    {
+                        'friend_id': change['user_id'],
+                        'public_key': change['public_key'],
+                        'ip': change['ip'],
+                        'port': change['port']
+                    }
+                    for change in data['changes'] if change['online']
+                ])
+            else:
+                for change in data['changes']:
+                    if change['online']:
+                        friends.create_friend(
+                            friend_id=change['user_id'],
+                            public_key=change['public_key'],
+                            ip=change['ip'],
+                            port=change['port']
+                        )
+                    else:
+                        friends.delete_friend(change['user_id'])
+        return response
+
+    def sync_presence(self):
+        """
+        用上次的游标同步好友在线状态，使本地好友表中的公钥与地址跟上好友的重新登录
+        """
+        response = self.get_presence_changes(self.presence_cursor)
+        if response.get('status') == 200:
+            self.presence_cursor = response['data']['cursor']
         return response
 
     def heartbeat(self):
         response = self._get("/heartbeat")
-        print(response)
         return response
 
-serverAPI = ServerAPI()
\ No newline at end of file
+_server_api = None
+
+
+def get_server_api():
+    """
+    进程内共用的 ServerAPI，首次使用时按当时的 SERVER_CONFIG 创建
+    """
+    global _server_api
+    if _server_api is None:
+        _server_api = ServerAPI()
+    return _server_api
\ No newline at end of file
@@ -1,8 +1,8 @@
 from schemas.utils import BaseResponse
-from services.serverAPI import serverAPI
+from services.serverAPI import get_server_api
 
 def online_service(friend_id):
-    response = serverAPI.get_online_status(friend_id)
+    response = get_server_api().get_online_status(friend_id)
     if response['status'] == 200:
         pass
     return BaseResponse(**response).model_dump(), response['status']
\ No newline at end of file
@@ -1,44 +1,66 @@
+import os
+import sys
+
+# Cli 与 Server 共用的 common 包（日志、追踪、剖析）位于仓库根目录
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
 from flask import Flask
-from flask_jwt_extended import JWTManager
 
-from config import init_config
+from config import init_config, LOG_LEVEL, LOG_SAMPLE_RATES
+from common.log import init_logging
+from common.profiling import init_profiling
 from routes.auth import init_auth
 from routes.contacts import init_contacts
 from routes.utils import init_utils
-from services.online import CheckUser
+from services.limiter import init_limiter
+from services.online import CheckUser, UdpHeartbeat
+from services.token import CachedJWTManager
+from common.tracing import init_tracing, trace_sql
 
 
 def create_app():
     from models.database import db
+    from models.users import user_index
+    init_logging(LOG_LEVEL, LOG_SAMPLE_RATES)
     app = Flask(__name__)
     init_config(app)
+    if init_tracing(app, 'server', app.config['TRACE_FILE']):
+        trace_sql()
     db.init_app(app)
     with app.app_context():
         db.create_all()
-    jwt = JWTManager(app)
+        user_index.rebuild()
+    user_index.schedule_rebuild(app)
+    jwt = CachedJWTManager(app)
+    init_limiter(app)
     init_auth(app)
     init_contacts(app)
     init_utils(app)
+    init_profiling(app, app.config['PROFILE_ADMIN_TOKEN'], app.config['PROFILE_DIR'])
     check_user = CheckUser(app)
+    udp_heartbeat = UdpHeartbeat(app)
     return app
 
-def create_app_debug():
+def create_app_debug(database_uri="sqlite:///:memory:"):
     from models.database import db
+    from models.users import user_index
     app = Flask(__name__)
     app.config.update({
-        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SQLALCHEMY_DATABASE_URI": database_uri,
         "SQLALCHEMY_TRACK_MODIFICATIONS": False,
     })
     db.init_app(app)
     with app.app_context():
         db.create_all()
-    jwt = JWTManager(app)
+        user_index.rebuild()
+    jwt = CachedJWTManager(app)
+    init_limiter(app)
     init_auth(app)
     init_contacts(app)
     init_utils(app)
     return app
 
-app = create_app()
-
 if __name__ == "__main__":
+    # 导入本模块不创建应用；gunicorn 通过 wsgi.py 加载
+    app = create_app()
     app.run(host="0.0.0.0",debug=False)
\ No newline at end of file
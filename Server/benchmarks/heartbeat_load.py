@@ -0,0 +1,106 @@
+"""
+心跳负载测试：分别测量 HTTP /heartbeat 与 UDP 心跳在服务端单核上每次心跳的处理耗时，
+并换算成单核可维持在线的客户端数量（客户端每 5 秒一次心跳）。
+
+运行：
+    python benchmarks/heartbeat_load.py [--clients 500] [--rounds 2]
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app_debug
+from models.database import db
+from models.online import Online
+from models.users import User
+from services.online import create_heartbeat_session, session_user, sign_heartbeat, verify_heartbeat
+
+CLIENT_HEARTBEAT_INTERVAL = 5
+
+
+def seed(app, clients):
+    tokens = list()
+    sessions = list()
+    with app.app_context():
+        for i in range(clients):
+            user_id = f"hb_user_{i}"
+            session = create_heartbeat_session(app.config['JWT_SECRET_KEY'], user_id)
+            db.session.add(User(user_id=user_id, password="x", email=f"{user_id}@example.com"))
+            db.session.add(Online(user_id=user_id, public_key="key", ip="127.0.0.1", port=6000,
+                                  heartbeat_session=session["session_id"]))
+            tokens.append(create_access_token(identity=user_id, expires_delta=False))
+            sessions.append(session)
+        db.session.commit()
+    return tokens, sessions
+
+
+def bench_http(app, tokens, rounds):
+    client = app.test_client()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for token in tokens:
+            response = client.get("/heartbeat", headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 200
+    return (time.perf_counter() - start) / (rounds * len(tokens))
+
+
+def bench_udp(app, sessions, rounds):
+    secret = app.config['JWT_SECRET_KEY']
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(("127.0.0.1", 0))
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = receiver.getsockname()
+    elapsed = 0
+    received = 0
+    for _ in range(rounds):
+        now = int(time.time())
+        for session in sessions:
+            sender.sendto(sign_heartbeat(session["session_id"], bytes.fromhex(session["key"]), now), address)
+        # 只计服务端的工作：收包、校验与一次批量刷新
+        start = time.perf_counter()
+        pending = dict()
+        receiver.settimeout(0.2)
+        try:
+            while len(pending) < len(sessions):
+                datagram, _ = receiver.recvfrom(512)
+                received += 1
+                session_id = verify_heartbeat(secret, datagram)
+                if session_id is not None:
+                    pending[session_user(session_id)] = session_id
+        except socket.timeout:
+            pass
+        with app.app_context():
+            Online.update_last_seen_sessions(pending)
+        elapsed += time.perf_counter() - start
+    sender.close()
+    receiver.close()
+    return elapsed / max(received, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args()
+
+    app = create_app_debug()
+    app.config.update({"JWT_SECRET_KEY": "test"})
+    tokens, sessions = seed(app, args.clients)
+
+    print(f"{'transport':<10}{'us/heartbeat':>14}{'clients/core':>14}")
+    for name, cost in (
+        ("http", bench_http(app, tokens, args.rounds)),
+        ("udp", bench_udp(app, sessions, args.rounds)),
+    ):
+        print(f"{name:<10}{cost * 1e6:>14.1f}{int(CLIENT_HEARTBEAT_INTERVAL / cost):>14}")
+
+
+if __name__ == "__main__":
+    main()
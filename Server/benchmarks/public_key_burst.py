@@ -0,0 +1,80 @@
+"""
+打开通讯录时的突发请求模拟：一个用户对所有好友依次请求 POST /public_key，重复多次，
+对比关闭与开启在线状态缓存时的平均延迟，并报告缓存命中率。
+
+运行：
+    python benchmarks/public_key_burst.py [--friends 200] [--opens 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app_debug
+from config import ONLINE_CACHE_SIZE
+from models.cache import clear_caches
+from models.contacts import Contacts
+from models.database import db
+from models.online import Online, endpoint_cache
+from models.users import User
+
+
+def seed(app, friends):
+    with app.app_context():
+        db.session.add(User(user_id="burst_user", password="x", email="burst@example.com"))
+        db.session.add(Online(user_id="burst_user", public_key="key", ip="127.0.0.1", port=6000))
+        friend_ids = list()
+        for i in range(friends):
+            friend_id = f"burst_friend_{i}"
+            friend_ids.append(friend_id)
+            db.session.add(User(user_id=friend_id, password="x", email=f"{friend_id}@example.com"))
+            db.session.add(Contacts(user_A="burst_user", user_B=friend_id))
+            db.session.add(Contacts(user_A=friend_id, user_B="burst_user"))
+            # 一半好友在线
+            if i % 2 == 0:
+                db.session.add(Online(user_id=friend_id, public_key="key" * 100, ip="127.0.0.1", port=7000 + i))
+        db.session.commit()
+        token = create_access_token(identity="burst_user", expires_delta=False)
+    return token, friend_ids
+
+
+def burst(client, token, friend_ids, opens):
+    headers = {"Authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    for _ in range(opens):
+        for friend_id in friend_ids:
+            response = client.post("/public_key", json={"data": {"friend_id": friend_id}}, headers=headers)
+            assert response.status_code in (200, 199)
+    return (time.perf_counter() - start) / (opens * len(friend_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--friends", type=int, default=200)
+    parser.add_argument("--opens", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app_debug()
+    app.config.update({"JWT_SECRET_KEY": "test"})
+    token, friend_ids = seed(app, args.friends)
+    client = app.test_client()
+
+    endpoint_cache.maxsize = 0
+    clear_caches()
+    uncached = burst(client, token, friend_ids, args.opens)
+
+    endpoint_cache.maxsize = ONLINE_CACHE_SIZE
+    clear_caches()
+    cached = burst(client, token, friend_ids, args.opens)
+
+    print(f"uncached: {uncached * 1e6:.1f} us/request")
+    print(f"cached:   {cached * 1e6:.1f} us/request ({1 - cached / uncached:.1%} lower)")
+    print(f"hit rate: {endpoint_cache.hit_rate():.1%}")
+
+
+if __name__ == "__main__":
+    main()
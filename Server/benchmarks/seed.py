@@ -0,0 +1,97 @@
+"""
+基准测试数据：批量写入用户、好友关系与在线记录。
+
+- 用户 u0 为被测用户，与 u1..u{hub} 互为好友，另有 hub/10 个用户向其发出好友申请
+- 其余关系为 u1 之后用户之间随机的双向好友，总边数（有向）约为 edges
+- u0 与每 100 个用户中的前 online_ratio 比例在线，编号最大的 reserve 个用户保证离线且不是 u0 的好友，
+  供登录、添加好友等会修改数据的用例使用
+"""
+import random
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+
+from models.cache import clear_caches
+from models.contacts import Contacts
+from models.database import db
+from models.online import Online
+from models.users import User, user_index
+from services.auth import bcrypt
+
+PASSWORD = "password"
+CHUNK = 10000
+
+
+def user_id(i):
+    return f"u{i}"
+
+
+def bulk_insert(model, rows):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(insert(model), rows[i:i + CHUNK])
+    db.session.commit()
+
+
+def random_edges(users, edges, first, rng):
+    """
+    在 [first, users) 的用户之间生成 edges 条互为好友的有向边
+    """
+    pairs = set()
+    span = users - first
+    if span < 2:
+        return pairs
+    # 完全图的边数是上限
+    edges = min(edges, span * (span - 1))
+    while len(pairs) < edges:
+        a = first + rng.randrange(span)
+        b = first + rng.randrange(span)
+        if a != b:
+            pairs.add((a, b))
+            pairs.add((b, a))
+    return pairs
+
+
+def seed(app, users=10000, edges=100000, hub=1000, online_ratio=0.5, reserve=1000, seed_value=0):
+    """
+    写入测试数据，返回 u0 的 token 与各用例使用的用户编号
+    """
+    requests = max(1, hub // 10)
+    if users <= hub + requests + reserve + 1:
+        raise ValueError("users must exceed hub + hub/10 + reserve")
+    rng = random.Random(seed_value)
+    password = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+
+    with app.app_context():
+        bulk_insert(User, [
+            {"user_id": user_id(i), "password": password, "email": f"{user_id(i)}@example.com"}
+            for i in range(users)
+        ])
+
+        hub_edges = set()
+        for i in range(1, hub + 1):
+            hub_edges.add((0, i))
+            hub_edges.add((i, 0))
+        for i in range(hub + 1, hub + 1 + requests):
+            hub_edges.add((i, 0))
+        # 保留用户不参与随机关系，避免与用例冲突
+        rest = random_edges(users - reserve, max(0, edges - len(hub_edges)), 1, rng)
+        bulk_insert(Contacts, [
+            {"user_A": user_id(a), "user_B": user_id(b)} for a, b in hub_edges | rest
+        ])
+
+        online = [0] + [i for i in range(1, users - reserve) if i % 100 < online_ratio * 100]
+        bulk_insert(Online, [
+            {"user_id": user_id(i), "public_key": "k" * 480, "ip": "127.0.0.1", "port": 10000 + i % 50000, "jti": ""}
+            for i in online
+        ])
+
+        clear_caches()
+        user_index.rebuild()
+        token = create_access_token(identity=user_id(0), expires_delta=False)
+
+    return {
+        "token": token,
+        "friends": [user_id(i) for i in range(1, hub + 1)],
+        "reserved": [user_id(i) for i in range(users - reserve, users)],
+        "edges": len(hub_edges) + len(rest),
+    }
@@ -0,0 +1,74 @@
+"""
+响应序列化微基准：对每个接口的典型响应比较
+旧路径（BaseResponse(**result).model_dump() + Flask jsonify）与新路径（缓存的 TypeAdapter 一次校验并直接输出 JSON 字节）。
+
+运行：
+    python benchmarks/serialization.py [--contacts 2000] [--rounds 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from flask import Flask, jsonify
+
+from schemas import auth, contacts, utils
+from schemas.response import dump_response
+
+
+def payloads(contact_count):
+    return {
+        "register": (auth.BaseResponse, {"status": 200, "message": "Registration successful", "data": None}),
+        "login": (auth.BaseResponse, {
+            "status": 200, "message": "Login successful",
+            "data": {"token": "x" * 300},
+        }),
+        "contacts": (contacts.BaseResponse, {
+            "status": 200, "message": "Get contacts successfully",
+            "data": {
+                "friends": [{"user_id": f"user_{i}", "flag": 1} for i in range(contact_count)],
+                "friend_requests": [{"user_id": f"req_{i}", "flag": 0} for i in range(contact_count // 10)],
+            },
+        }),
+        "online": (utils.BaseResponse, {"status": 200, "message": "User is online", "data": None}),
+        "public_key": (utils.BaseResponse, {
+            "status": 200, "message": "Get public key successfully",
+            "data": {"public_key": "k" * 480, "ip": "127.0.0.1", "port": 6000},
+        }),
+    }
+
+
+def timeit(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    print(f"{'endpoint':<12}{'old us':>12}{'new us':>12}{'speedup':>10}")
+    with app.app_context():
+        for name, (model, result) in payloads(args.contacts).items():
+            rounds = max(1, args.rounds // 20) if name == "contacts" else args.rounds
+
+            def old():
+                return jsonify(model(**result).model_dump()).get_data()
+
+            def new():
+                return dump_response(model, result).get_data()
+
+            old_cost = timeit(old, rounds)
+            new_cost = timeit(new, rounds)
+            print(f"{name:<12}{old_cost:>12.1f}{new_cost:>12.1f}{old_cost / new_cost:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+token 撤销检查缓存基准：在 create_app_debug 的测试应用上测量需要认证的接口每次请求的耗时，
+比较每次都从数据库核对会话 jti（清空缓存）与命中撤销检查缓存两种情况。
+
+运行：
+    python benchmarks/token_cache.py [--rounds 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from app import create_app_debug
+
+ENDPOINTS = ("/heartbeat", "/contacts")
+
+
+def login(client):
+    user = {"user_id": "token_user", "password": "password", "email": "token@example.com"}
+    client.post("/register", json={"data": user})
+    response = client.post("/login", json={"data": {
+        "user_id": "token_user", "password": "password",
+        "public_key": "key", "ip": "127.0.0.1", "port": 6000,
+    }})
+    return response.json["data"]["token"]
+
+
+def bench(client, path, headers, rounds, cache=None):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if cache is not None:
+            cache.clear()
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app_debug()
+    app.config.update({"JWT_SECRET_KEY": "test"})
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {login(client)}"}
+    token_cache = app.extensions['flask-jwt-extended'].token_cache
+
+    print(f"{'endpoint':<12}{'uncached us':>14}{'cached us':>12}{'saved us':>12}")
+    for path in ENDPOINTS:
+        uncached = bench(client, path, headers, args.rounds, cache=token_cache)
+        cached = bench(client, path, headers, args.rounds)
+        print(f"{path:<12}{uncached:>14.1f}{cached:>12.1f}{uncached - cached:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+多 worker 吞吐测试：依次以不同 worker 数启动 gunicorn（gunicorn.conf.py），
+用多个压测进程持续请求 GET /contacts，统计每秒请求数。
+
+运行（数据库默认使用 config.py 中的配置，可通过 --database-url 指定）：
+    python benchmarks/workers_rps.py [--workers 1 2 4] [--seconds 10] [--concurrency 8]
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import requests
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/contacts", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def create_user(base_url):
+    user_id = f"bench_{uuid.uuid4().hex[:12]}"
+    requests.post(f"{base_url}/register", json={"data": {
+        "user_id": user_id, "password": "password", "email": f"{user_id}@example.com"
+    }})
+    response = requests.post(f"{base_url}/login", json={"data": {
+        "user_id": user_id, "password": "password", "public_key": "key", "ip": "127.0.0.1", "port": 6000
+    }})
+    return response.json()["data"]["token"]
+
+
+def hammer(args):
+    base_url, token, seconds = args
+    session = requests.Session()
+    headers = {"Authorization": f"Bearer {token}"}
+    count = 0
+    errors = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if session.get(f"{base_url}/contacts", headers=headers).status_code == 200:
+            count += 1
+        else:
+            errors += 1
+    return count, errors
+
+
+def run(workers, seconds, concurrency, port, database_url):
+    # 压测的是吞吐上限，关闭限流
+    env = dict(os.environ, SERVER_WORKERS=str(workers), SERVER_BIND=f"127.0.0.1:{port}", RATE_LIMIT="0")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url)
+        token = create_user(base_url)
+        with multiprocessing.Pool(concurrency) as pool:
+            results = pool.map(hammer, [(base_url, token, seconds)] * concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+    count = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    return count / seconds, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'req/s':>10}{'errors':>8}")
+    for workers in args.workers:
+        rps, errors = run(workers, args.seconds, args.concurrency, args.port, args.database_url)
+        print(f"{workers:>8}{rps:>10.1f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
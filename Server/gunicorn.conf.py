@@ -0,0 +1,10 @@
+# 生产部署：gunicorn -c gunicorn.conf.py
+# 每个 worker 独立执行 create_app，CheckUser 通过 LeaderLease 选出唯一执行清理任务的进程，
+# 因此不能开启 preload_app（调度线程与锁文件不能跨 fork 共享）。
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("SERVER_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("SERVER_WORKERS", multiprocessing.cpu_count()))
+preload_app = False
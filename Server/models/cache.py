@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+
+# 所有进程内缓存，测试与跨 worker 失效时统一清空
+_caches = list()
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，可选 TTL（秒）；get 可用 max_age 只接受写入不超过该秒数的条目。
+    """
+    _missing = object()
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        register_cache(self)
+
+    def get(self, key, default=None, max_age=None):
+        with self.lock:
+            item = self.items.get(key, self._missing)
+            if item is not self._missing:
+                value, expires, stored = item
+                now = time.monotonic()
+                if expires is None or expires > now:
+                    if max_age is None or now - stored <= max_age:
+                        self.items.move_to_end(key)
+                        self.hits += 1
+                        return value
+                else:
+                    del self.items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        now = time.monotonic()
+        expires = None if self.ttl is None else now + self.ttl
+        with self.lock:
+            self.items[key] = (value, expires, now)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            item = self.items.pop(key, None)
+        return None if item is None else item[0]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def register_cache(cache):
+    """
+    登记一个带 clear() 的缓存，clear_caches 时一并清空
+    """
+    _caches.append(cache)
+    return cache
+
+
+def clear_caches():
+    for cache in _caches:
+        cache.clear()
@@ -1,41 +1,184 @@
+import threading
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+
+from config import CONTACTS_CACHE_SIZE, CONTACTS_CACHE_TTL, CONTACTS_AUTH_TTL
+from models.cache import LRUCache
 from models.database import db
 
+
+class ContactGraph:
+    """
+    好友关系邻接缓存：按用户懒加载出边（user_A -> user_B）与入边集合，LRU 淘汰。
+    缓存只在本进程内有效：本进程的写操作经 Contacts.add_contact / delete_contact 同步更新，
+    其他 worker 的写入最多在 CONTACTS_CACHE_TTL 秒后可见；鉴权（check_relationship）只使用
+    CONTACTS_AUTH_TTL 秒内加载的集合，删除好友在其他 worker 上的生效时间以此为上限。
+    写操作本身以数据库为准（见 Contacts），缓存过期只影响读取，不会导致重复插入或删除不存在的行。
+    """
+    def __init__(self, maxsize, ttl):
+        self.outbound = LRUCache(maxsize, ttl)
+        self.inbound = LRUCache(maxsize, ttl)
+        self.lock = threading.Lock()
+        # 每次写操作递增，避免并发加载把写之前的快照放进缓存
+        self.version = 0
+
+    def _load(self, cache, user_id, query, max_age=None):
+        edges = cache.get(user_id, max_age=max_age)
+        if edges is None:
+            with self.lock:
+                version = self.version
+            edges = frozenset(row[0] for row in query)
+            with self.lock:
+                if version == self.version:
+                    cache.put(user_id, edges)
+        return edges
+
+    def outbound_of(self, user_id, max_age=None):
+        query = db.session.query(Contacts.user_B).filter(Contacts.user_A == user_id)
+        return self._load(self.outbound, user_id, query, max_age)
+
+    def inbound_of(self, user_id, max_age=None):
+        query = db.session.query(Contacts.user_A).filter(Contacts.user_B == user_id)
+        return self._load(self.inbound, user_id, query, max_age)
+
+    def has_edge(self, user_A, user_B):
+        return user_B in self.outbound_of(user_A)
+
+    def _update(self, user_A, user_B, added):
+        with self.lock:
+            self.version += 1
+            for cache, key, value in ((self.outbound, user_A, user_B), (self.inbound, user_B, user_A)):
+                edges = cache.pop(key)
+                if edges is not None:
+                    cache.put(key, edges | {value} if added else edges - {value})
+
+    def add_edge(self, user_A, user_B):
+        self._update(user_A, user_B, True)
+
+    def remove_edge(self, user_A, user_B):
+        self._update(user_A, user_B, False)
+
+    def invalidate(self, user_ids):
+        """
+        丢弃这些用户的邻接集合，下次访问时重新加载
+        """
+        with self.lock:
+            self.version += 1
+            for user_id in user_ids:
+                self.outbound.pop(user_id)
+                self.inbound.pop(user_id)
+
+
+contact_graph = ContactGraph(CONTACTS_CACHE_SIZE, CONTACTS_CACHE_TTL)
+
+
 class Contacts(db.Model):
     __tablename__ = 'contacts'
-    __table_args__ = {"extend_existing": True}
+    # 入边按 (user_B, user_A) 有序扫描，用于分页查询通讯录与加载入边集合
+    __table_args__ = (
+        db.Index('ix_contacts_user_B_user_A', 'user_B', 'user_A'),
+        {"extend_existing": True},
+    )
 
     user_A = db.Column(db.String(64), db.ForeignKey('users.user_id'), primary_key=True)
     user_B = db.Column(db.String(64), db.ForeignKey('users.user_id'), primary_key=True)
 
     @classmethod
-    def add_contact(cls, user_A, user_B):
-        contact = cls(
-            user_A=user_A,
-            user_B=user_B
-        )
-        db.session.add(contact)
+    def insert_ignore(cls, rows):
+        """
+        多行 INSERT，已存在的关系被忽略，返回实际插入的行数
+        """
+        if db.session.get_bind().dialect.name == 'mysql':
+            statement = mysql_insert(cls).values(rows).prefix_with('IGNORE')
+        else:
+            statement = sqlite_insert(cls).values(rows).on_conflict_do_nothing()
+        count = db.session.execute(statement).rowcount
         db.session.commit()
-        return contact
+        return count
+
+    @classmethod
+    def add_contact(cls, user_A, user_B):
+        """
+        添加关系，关系已存在（可能由其他 worker 写入）时返回 False
+        """
+        added = cls.insert_ignore([{"user_A": user_A, "user_B": user_B}]) == 1
+        contact_graph.add_edge(user_A, user_B)
+        return added
+
+    @classmethod
+    def add_contacts(cls, user_A, user_Bs):
+        """
+        批量添加 user_A 指向 user_Bs 的关系：一条多行 INSERT，已存在的关系被忽略，只提交一次，返回插入的行数
+        """
+        if not user_Bs:
+            return 0
+        count = cls.insert_ignore([{"user_A": user_A, "user_B": user_B} for user_B in user_Bs])
+        for user_B in user_Bs:
+            contact_graph.add_edge(user_A, user_B)
+        return count
+
+    @classmethod
+    def edges_between(cls, user_id, friend_ids):
+        """
+        从数据库读取 user_id 与 friend_ids 之间的关系，返回 (user_id 指向的集合, 指向 user_id 的集合)，一次查询
+        """
+        if not friend_ids:
+            return set(), set()
+        rows = db.session.query(cls.user_A, cls.user_B).filter(db.or_(
+            db.and_(cls.user_A == user_id, cls.user_B.in_(friend_ids)),
+            db.and_(cls.user_B == user_id, cls.user_A.in_(friend_ids))
+        )).all()
+        outbound = {user_B for user_A, user_B in rows if user_A == user_id}
+        inbound = {user_A for user_A, user_B in rows if user_B == user_id}
+        return outbound, inbound
 
     @classmethod
     def check_contact(cls, user_A, user_B):
-        contact = cls.query.filter_by(user_A=user_A, user_B=user_B).first()
-        return contact
+        return contact_graph.has_edge(user_A, user_B)
 
     @classmethod
     def check_relationship(cls, user_A, user_B):
-        return cls.check_contact(user_A, user_B) and cls.check_contact(user_B, user_A)
+        """
+        互为好友时返回 True，用于鉴权，邻接集合最多落后其他 worker 的写入 CONTACTS_AUTH_TTL 秒
+        """
+        return (user_B in contact_graph.outbound_of(user_A, CONTACTS_AUTH_TTL)
+                and user_B in contact_graph.inbound_of(user_A, CONTACTS_AUTH_TTL))
 
     @classmethod
     def delete_contact(cls, user_A, user_B):
-        contact = cls.query.filter_by(user_A=user_A, user_B=user_B).first()
-        db.session.delete(contact)
+        """
+        删除关系，关系不存在（可能已被其他 worker 删除）时返回 False
+        """
+        count = cls.query.filter_by(user_A=user_A, user_B=user_B).delete(synchronize_session=False)
         db.session.commit()
-        return contact
+        contact_graph.remove_edge(user_A, user_B)
+        return count == 1
 
     @classmethod
     def get_all_contacts(cls, user_id):
         contact = cls.query.filter(
             (cls.user_A == user_id) | (cls.user_B == user_id)
         ).all()
-        return contact
\ No newline at end of file
+        return contact
+
+
+    @classmethod
+    def get_contacts_page(cls, user_id, after=None, limit=100, flag=None):
+        """
+        按对方 user_id 升序返回指向 user_id 的联系人 [(对方, flag)]，flag 为 1 表示互为好友、0 表示好友申请。
+        沿 (user_B, user_A) 索引从 after 之后开始扫描，每行用主键反查出边，只读取 limit 行
+        """
+        outbound = aliased(cls)
+        query = db.session.query(cls.user_A, outbound.user_B).outerjoin(
+            outbound, (outbound.user_A == user_id) & (outbound.user_B == cls.user_A)
+        ).filter(cls.user_B == user_id)
+        if after is not None:
+            query = query.filter(cls.user_A > after)
+        if flag == 1:
+            query = query.filter(outbound.user_B.isnot(None))
+        elif flag == 0:
+            query = query.filter(outbound.user_B.is_(None))
+        rows = query.order_by(cls.user_A).limit(limit).all()
+        return [(user, 0 if back is None else 1) for user, back in rows]
@@ -1,7 +1,15 @@
 from datetime import datetime
 
+from config import ONLINE_CACHE_SIZE, ONLINE_CACHE_TTL
+from models.cache import LRUCache
 from models.database import db
 
+# user_id -> (public_key, ip, port, jti)，离线用户缓存为 OFFLINE
+endpoint_cache = LRUCache(ONLINE_CACHE_SIZE, ONLINE_CACHE_TTL)
+OFFLINE = ()
+# 批量查询时 IN 列表的最大长度
+QUERY_CHUNK = 1000
+
 class Online(db.Model):
     __tablename__ = 'online'
     __table_args__ = {"extend_existing": True}
@@ -11,31 +19,62 @@ class Online(db.Model):
     ip = db.Column(db.String(64), nullable=False)
     port = db.Column(db.Integer, nullable=False)
     last_seen_time = db.Column(db.DateTime, nullable=False, default=datetime.now())
+    # 本次会话签发的 token，为空时不校验 token 与会话的对应关系
+    jti = db.Column(db.String(36), nullable=False, default='')
+    # 本次会话的 UDP 心跳 session_id，只接受与之一致的心跳报文
+    heartbeat_session = db.Column(db.String(96), nullable=False, default='')
 
     @classmethod
-    def user_login(cls, user_id, public_key, ip, port):
+    def user_login(cls, user_id, public_key, ip, port, jti='', heartbeat_session=''):
         user = cls(
             user_id=user_id,
             public_key=public_key,
             ip=ip,
-            port=port
+            port=port,
+            jti=jti,
+            heartbeat_session=heartbeat_session
         )
         db.session.add(user)
+        PresenceChange.record(user_id, True)
         db.session.commit()
+        endpoint_cache.pop(user_id)
         return user
 
     @classmethod
     def update_last_seen(cls, user_id):
         user = cls.query.filter_by(user_id=user_id).first()
+        if user is None:
+            return None
         user.last_seen_time = datetime.now()
         db.session.commit()
         return user
 
+    @classmethod
+    def update_last_seen_many(cls, user_ids):
+        count = cls.query.filter(
+            cls.user_id.in_(user_ids)
+        ).update({cls.last_seen_time: datetime.now()}, synchronize_session=False)
+        db.session.commit()
+        return count
+
+    @classmethod
+    def update_last_seen_sessions(cls, sessions):
+        """
+        sessions 为 {user_id: 心跳 session_id}，只刷新 session 仍是当前会话的用户，返回刷新的行数
+        """
+        count = cls.query.filter(
+            db.tuple_(cls.user_id, cls.heartbeat_session).in_(list(sessions.items()))
+        ).update({cls.last_seen_time: datetime.now()}, synchronize_session=False)
+        db.session.commit()
+        return count
+
     @classmethod
     def user_logout(cls, user_id):
         user = cls.query.filter_by(user_id=user_id).first()
         db.session.delete(user)
+        PresenceChange.record(user_id, False)
         db.session.commit()
+        endpoint_cache.pop(user_id)
         return user
 
     @classmethod
@@ -43,6 +82,61 @@ class Online(db.Model):
         user = cls.query.filter_by(user_id=user_id).first()
         return user
 
+    @classmethod
+    def get_cached(cls, user_id):
+        entry = endpoint_cache.get(user_id)
+        if entry is None:
+            row = db.session.query(cls.public_key, cls.ip, cls.port, cls.jti).filter_by(user_id=user_id).first()
+            entry = OFFLINE if row is None else tuple(row)
+            endpoint_cache.put(user_id, entry)
+        return entry
+
+    @classmethod
+    def get_endpoint(cls, user_id):
+        """
+        在线返回 (public_key, ip, port)，离线返回 None；一次查询，结果按 TTL 缓存
+        """
+        entry = cls.get_cached(user_id)
+        return entry[:3] if entry else None
+
+    @classmethod
+    def get_endpoints(cls, user_ids, fresh=False):
+        """
+        批量版 get_endpoint：返回在线用户的 {user_id: (public_key, ip, port)}。
+        缓存未命中的用户按 QUERY_CHUNK 分块各用一次 IN 查询，查询结果（含离线）写回缓存；
+        fresh 为 True 时不读缓存，用于已知状态刚发生变化的用户
+        """
+        endpoints = dict()
+        missing = list()
+        for user_id in user_ids:
+            entry = None if fresh else endpoint_cache.get(user_id)
+            if entry is None:
+                missing.append(user_id)
+            elif entry:
+                endpoints[user_id] = entry[:3]
+        for i in range(0, len(missing), QUERY_CHUNK):
+            chunk = missing[i:i + QUERY_CHUNK]
+            rows = db.session.query(cls.user_id, cls.public_key, cls.ip, cls.port, cls.jti).filter(
+                cls.user_id.in_(chunk)
+            ).all()
+            found = {row[0]: tuple(row[1:]) for row in rows}
+            for user_id in chunk:
+                entry = found.get(user_id, OFFLINE)
+                endpoint_cache.put(user_id, entry)
+                if entry:
+                    endpoints[user_id] = entry[:3]
+        return endpoints
+
+    @classmethod
+    def get_session(cls, user_id, fresh=False):
+        """
+        在线返回本次会话 token 的 jti，离线返回 None；与 get_endpoint 共用缓存，fresh 为 True 时重新查询
+        """
+        if fresh:
+            endpoint_cache.pop(user_id)
+        entry = cls.get_cached(user_id)
+        return entry[3] if entry else None
+
     @classmethod
     def get_state(cls, user_id):
         user = cls.query.filter_by(user_id=user_id).first()
@@ -57,5 +151,70 @@ class Online(db.Model):
         ).all()
         for user in users:
             db.session.delete(user)
+            PresenceChange.record(user.user_id, False)
+        db.session.commit()
+        for user in users:
+            endpoint_cache.pop(user.user_id)
+        return users
+
+
+class PresenceChange(db.Model):
+    """
+    在线状态变更日志：登录（含更换地址与公钥）、登出、过期各记一行，seq 单调递增，作为增量同步的游标。
+    与 Online 的修改在同一事务中写入；超过保留时间的记录由 compact 定期删除，始终保留最新一行以延续 seq
+    """
+    __tablename__ = 'presence_changes'
+    __table_args__ = {"extend_existing": True}
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(64), db.ForeignKey('users.user_id'), nullable=False)
+    online = db.Column(db.Boolean, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+    @classmethod
+    def record(cls, user_id, online):
+        """
+        只加入当前会话，由调用方与 Online 的修改一起提交
+        """
+        db.session.add(cls(user_id=user_id, online=online))
+
+    @classmethod
+    def bounds(cls, settled_before=None):
+        """
+        返回日志中 (最小 seq, 最大 seq, changed_at 不晚于 settled_before 的最大 seq)，日志为空时均为 None。
+        并发事务可能先提交较大的 seq，较小的 seq 稍后才可见，游标只推进到已稳定的 seq
+        """
+        settled_before = datetime.now() if settled_before is None else settled_before
+        settled = db.func.max(db.case((cls.changed_at <= settled_before, cls.seq)))
+        return tuple(db.session.query(db.func.min(cls.seq), db.func.max(cls.seq), settled).one())
+
+    @classmethod
+    def changed_users(cls, user_ids, since, until):
+        """
+        user_ids 中在 (since, until] 之间发生过变更的用户，按 QUERY_CHUNK 分块查询
+        """
+        user_ids = list(user_ids)
+        changed = set()
+        for i in range(0, len(user_ids), QUERY_CHUNK):
+            rows = db.session.query(cls.user_id).filter(
+                cls.seq > since,
+                cls.seq <= until,
+                cls.user_id.in_(user_ids[i:i + QUERY_CHUNK])
+            ).distinct().all()
+            changed.update(row[0] for row in rows)
+        return changed
+
+    @classmethod
+    def compact(cls, before):
+        """
+        删除 before 之前的记录（保留最新一行），返回删除的行数
+        """
+        newest = db.session.query(db.func.max(cls.seq)).scalar()
+        if newest is None:
+            return 0
+        count = cls.query.filter(
+            cls.changed_at < before,
+            cls.seq < newest
+        ).delete(synchronize_session=False)
         db.session.commit()
-        return users
\ No newline at end of file
+        return count
@@ -1,5 +1,156 @@
+import hashlib
+import math
+import threading
+import time
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy.exc import IntegrityError
+
+from config import USER_CACHE_SIZE, USER_INDEX_CAPACITY, USER_INDEX_ERROR_RATE, USER_INDEX_TTL
+from models.cache import LRUCache, register_cache
 from models.database import db
 
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class UserIndex:
+    """
+    用户存在性索引：Bloom filter 判断 user_id 是否可能存在，小容量 LRU 记录已确认存在的 user_id。
+    索引在启动时构建，之后由后台任务每 USER_INDEX_TTL 秒全量重建，create_user 同步写入本进程的索引。
+    每个 worker 各有一份索引，其他 worker 新建的用户在下次重建前不在本进程的 filter 中，
+    因此 Bloom filter 的否定结果默认查询主键确认，确认存在后补入本进程的 filter；
+    只有能容忍 USER_INDEX_TTL 内误判为不存在的调用才传 confirm=False 直接拒绝。
+    """
+    def __init__(self):
+        self.bloom = None
+        self.count = 0
+        self.capacity = 0
+        self.built_at = 0
+        self.known = LRUCache(USER_CACHE_SIZE)
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+        # 重建期间新增的用户，重建完成后补入新的 filter
+        self.added_while_rebuilding = None
+        self.scheduler = None
+        register_cache(self)
+
+    def rebuild(self):
+        with self.lock:
+            self.added_while_rebuilding = list()
+        user_ids = [row[0] for row in db.session.query(User.user_id)]
+        capacity = max(USER_INDEX_CAPACITY, 2 * len(user_ids))
+        bloom = BloomFilter(capacity, USER_INDEX_ERROR_RATE)
+        for user_id in user_ids:
+            bloom.add(user_id)
+        with self.lock:
+            for user_id in self.added_while_rebuilding:
+                bloom.add(user_id)
+            self.count = len(user_ids) + len(self.added_while_rebuilding)
+            self.added_while_rebuilding = None
+            self.bloom = bloom
+            self.capacity = capacity
+            self.built_at = time.monotonic()
+
+    def _stale(self):
+        return self.bloom is None
+
+    def _ensure_built(self):
+        # 正常情况下启动时已构建，这里只处理 clear 之后的首次访问
+        if self._stale():
+            with self.rebuild_lock:
+                if self._stale():
+                    self.rebuild()
+
+    def schedule_rebuild(self, app, interval=USER_INDEX_TTL):
+        """
+        在后台线程中定期全量重建，请求线程不再承担重建的全表扫描
+        """
+        if interval is None or self.scheduler is not None:
+            return
+        def job():
+            with app.app_context(), self.rebuild_lock:
+                self.rebuild()
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.add_job(job, 'interval', seconds=interval)
+        self.scheduler.start()
+
+    def add(self, user_id):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(user_id)
+                self.count += 1
+            if self.added_while_rebuilding is not None:
+                self.added_while_rebuilding.append(user_id)
+        self.known.put(user_id, True)
+
+    def exists(self, user_id, confirm=True):
+        """
+        confirm=False 时直接信任 Bloom filter 的否定结果，不查询数据库
+        """
+        self._ensure_built()
+        if user_id not in self.bloom and not confirm:
+            return False
+        if self.known.get(user_id):
+            return True
+        # Bloom filter 可能误判，只查询主键确认，不加载整行
+        found = db.session.query(User.user_id).filter_by(user_id=user_id).first() is not None
+        if found:
+            if user_id not in self.bloom:
+                self.add(user_id)
+            else:
+                self.known.put(user_id, True)
+        return found
+
+    def exists_many(self, user_ids, confirm=True):
+        """
+        批量版 exists：返回 user_ids 中存在的用户集合，LRU 无法确认的用户（含 Bloom filter 的否定结果）
+        合并为一次 IN 查询
+        """
+        self._ensure_built()
+        found = set()
+        unknown = list()
+        for user_id in set(user_ids):
+            if user_id not in self.bloom and not confirm:
+                continue
+            if self.known.get(user_id):
+                found.add(user_id)
+            else:
+                unknown.append(user_id)
+        if unknown:
+            rows = db.session.query(User.user_id).filter(User.user_id.in_(unknown)).all()
+            for row in rows:
+                if row[0] not in self.bloom:
+                    self.add(row[0])
+                else:
+                    self.known.put(row[0], True)
+                found.add(row[0])
+        return found
+
+    def clear(self):
+        with self.lock:
+            self.bloom = None
+            self.count = 0
+        self.known.clear()
+
+
 class User(db.Model):
     __tablename__ = 'users'
     __table_args__ = {"extend_existing": True}
@@ -10,9 +161,18 @@ class User(db.Model):
 
     @classmethod
     def create_user(cls, user_id, password, email):
+        """
+        创建用户，user_id 已存在（例如被其他 worker 并发创建）时返回 None
+        """
         user = cls(user_id=user_id, password=password, email=email)
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            user_index.add(user_id)
+            return None
+        user_index.add(user_id)
         return user
 
     @classmethod
@@ -20,6 +180,14 @@ class User(db.Model):
         user = cls.query.filter_by(user_id=user_id).first()
         return user
 
+    @classmethod
+    def exists(cls, user_id, confirm=True):
+        return user_index.exists(user_id, confirm)
+
+    @classmethod
+    def exists_many(cls, user_ids, confirm=True):
+        return user_index.exists_many(user_ids, confirm)
+
     @classmethod
     def get_password(cls, user_id):
         user = cls.query.filter_by(user_id=user_id).first()
@@ -28,4 +196,7 @@ class User(db.Model):
     @classmethod
     def get_email(cls, user_id):
         user = cls.query.filter_by(user_id=user_id).first()
-        return user.email
\ No newline at end of file
+        return user.email
+
+
+user_index = UserIndex()
@@ -1,17 +1,20 @@
 from flask import Flask, jsonify, make_response
 from flask import request
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from pydantic import ValidationError
 
 from schemas.auth import UserRegisterRequest, UserLoginRequest
-from services.auth import register_service, login_service
+from services.auth import register_service, login_service, logout_service
+from common.log import get_logger
+
+logger = get_logger(__name__)
 
 def init_auth(app: Flask):
 
     @app.route("/register", methods=["POST"])
     def register():
-        request_data = request.get_json()
         try:
-            register_data = UserRegisterRequest(**request_data)
+            register_data = UserRegisterRequest.model_validate_json(request.data)
         except ValidationError as e:
             return {"error": str(e)}, 400
 
@@ -24,9 +27,8 @@ def init_auth(app: Flask):
 
     @app.route("/login", methods=["POST"])
     def login():
-        request_data = request.get_json()
         try:
-            login_data = UserLoginRequest(**request_data)
+            login_data = UserLoginRequest.model_validate_json(request.data)
         except ValidationError as e:
             return {"error": str(e)}, 400
 
@@ -35,8 +37,19 @@ def init_auth(app: Flask):
             password=login_data.data.password,
             public_key=login_data.data.public_key,
             ip=login_data.data.ip,
-            port=login_data.data.port
+            port=login_data.data.port,
+            snapshot=login_data.data.snapshot
+        )
+        logger.info("login", user_id=login_data.data.user_id, status=code)
+        return result, code
+
+    @app.route("/logout", methods=["GET"])
+    @jwt_required()
+    def logout():
+        user_id = get_jwt_identity()
+
+        result, code = logout_service(
+            user_id=user_id,
+            jti=get_jwt()['jti']
         )
-        print(type(result))
-        print(result)
-        return result, code
\ No newline at end of file
+        return result, code
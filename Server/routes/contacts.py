@@ -3,8 +3,10 @@ from flask import request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from pydantic import ValidationError
 
-from schemas.contacts import AddFriendRequest, DeleteFriendRequest
-from services.contacts import get_contacts_service, add_friend_service, delete_friend_service
+from config import CONTACTS_PAGE_SIZE, CONTACTS_PAGE_MAX
+from schemas.contacts import AddFriendRequest, DeleteFriendRequest, BulkContactsRequest
+from services.contacts import get_contacts_service, get_contacts_page_service, add_friend_service, delete_friend_service, \
+    bulk_contacts_service
 
 
 def init_contacts(app: Flask):
@@ -13,8 +15,22 @@ def init_contacts(app: Flask):
     @jwt_required()
     def get_contacts():
         user_id = get_jwt_identity()
-        result, code = get_contacts_service(
-            user_id=user_id
+        # 带 after / limit / flag 任一参数时分页返回
+        if not {'after', 'limit', 'flag'} & request.args.keys():
+            result, code = get_contacts_service(
+                user_id=user_id
+            )
+            return result, code
+
+        limit = request.args.get('limit', CONTACTS_PAGE_SIZE, type=int)
+        flag = request.args.get('flag', type=int)
+        if not 0 < limit <= CONTACTS_PAGE_MAX or flag not in (None, 0, 1):
+            return {"error": f"limit must be in 1..{CONTACTS_PAGE_MAX} and flag 0 or 1"}, 400
+        result, code = get_contacts_page_service(
+            user_id=user_id,
+            after=request.args.get('after'),
+            limit=limit,
+            flag=flag
         )
         return result, code
 
@@ -22,9 +38,8 @@ def init_contacts(app: Flask):
     @jwt_required()
     def add_friend():
         user_id = get_jwt_identity()
-        request_data = request.get_json()
         try:
-            add_friend_data = AddFriendRequest(**request_data)
+            add_friend_data = AddFriendRequest.model_validate_json(request.data)
         except ValidationError as e:
             return {"error": str(e)}, 400
 
@@ -34,13 +49,28 @@ def init_contacts(app: Flask):
         )
         return result, code
 
+    @app.route("/contacts/bulk", methods=["POST"])
+    @jwt_required()
+    def bulk_contacts():
+        user_id = get_jwt_identity()
+        try:
+            bulk_data = BulkContactsRequest.model_validate_json(request.data)
+        except ValidationError as e:
+            return {"error": str(e)}, 400
+
+        result, code = bulk_contacts_service(
+            user_id=user_id,
+            friend_ids=bulk_data.data.friend_ids,
+            action=bulk_data.data.action
+        )
+        return result, code
+
     @app.route("/contacts", methods=["DELETE"])
     @jwt_required()
     def remove_friend():
         user_id = get_jwt_identity()
-        request_data = request.get_json()
         try:
-            delete_friend_data = DeleteFriendRequest(**request_data)
+            delete_friend_data = DeleteFriendRequest.model_validate_json(request.data)
         except ValidationError as e:
             return {"error": str(e)}, 400
 
@@ -3,7 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from pydantic import ValidationError
 
 from schemas.utils import GetStateRequest, GetPublicKeyRequest
-from services.utils import online_service, public_key_service, heartbeat_service
+from services.utils import online_service, public_key_service, heartbeat_service, presence_changes_service
 
 def init_utils(app: Flask):
 
@@ -11,9 +11,8 @@ def init_utils(app: Flask):
     @jwt_required()
     def online():
         user_id = get_jwt_identity()
-        request_data = request.get_json()
         try:
-            online_data = GetStateRequest(**request_data)
+            online_data = GetStateRequest.model_validate_json(request.data)
         except ValidationError as e:
             return {"error": str(e)}, 400
 
@@ -27,9 +26,8 @@ def init_utils(app: Flask):
     @jwt_required()
     def public_key():
         user_id = get_jwt_identity()
-        request_data = request.get_json()
         try:
-            public_key_data = GetPublicKeyRequest(**request_data)
+            public_key_data = GetPublicKeyRequest.model_validate_json(request.data)
         except ValidationError as e:
             return {"error": str(e)}, 400
 
@@ -47,4 +45,16 @@ def init_utils(app: Flask):
         result, code = heartbeat_service(
             user_id=user_id
         )
-        return result, code
\ No newline at end of file
+        return result, code
+
+    @app.route("/presence/changes", methods=["GET"])
+    @jwt_required()
+    def presence_changes():
+        user_id = get_jwt_identity()
+        since = request.args.get("since", "0")
+
+        result, code = presence_changes_service(
+            user_id=user_id,
+            since=since
+        )
+        return result, code
@@ -1,4 +1,4 @@
-from typing import Optional, Any
+from typing import Optional, Any, List
 
 from pydantic import BaseModel, Field, ValidationError, model_validator
 import re
@@ -27,12 +27,29 @@ class UserLogin(BaseModel):
     public_key: str
     ip: str
     port: int
+    # 为 True 时登录响应附带通讯录与好友在线快照
+    snapshot: bool = False
 
 class UserLoginRequest(BaseModel):
     data: UserLogin
 
+class HeartbeatSession(BaseModel):
+    session_id: str
+    key: str
+    port: int
+
+class SnapshotContact(BaseModel):
+    user_id: str
+    flag: int
+    online: bool
+    public_key: Optional[str] = None
+    ip: Optional[str] = None
+    port: Optional[int] = None
+
 class Token(BaseModel):
     token: str
+    heartbeat: Optional[HeartbeatSession] = None
+    contacts: Optional[List[SnapshotContact]] = None
 
 class BaseResponse(BaseModel):
     status: int
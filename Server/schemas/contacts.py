@@ -1,5 +1,7 @@
-from typing import List, Optional, Dict
-from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+from config import BULK_CONTACTS_MAX
 
 class AddFriend(BaseModel):
     friend_id: str
@@ -13,11 +15,42 @@ class DeleteFriend(BaseModel):
 class DeleteFriendRequest(BaseModel):
     data: DeleteFriend
 
+class BulkContacts(BaseModel):
+    friend_ids: List[str] = Field(..., min_length=1, max_length=BULK_CONTACTS_MAX)
+    # request：向这些用户发出好友申请；accept：同意这些用户发来的申请
+    action: Literal['request', 'accept'] = 'request'
+
+class BulkContactsRequest(BaseModel):
+    data: BulkContacts
+
 class Contact(BaseModel):
     user_id: str
     flag: int
 
+class ContactsPage(BaseModel):
+    contacts: List[Contact]
+    # 下一页的 after 参数，没有下一页时为 None
+    next: Optional[str]
+
 class BaseResponse(BaseModel):
     status: int
     message: str
-    data: Optional[Dict[str,List[Contact]]] = None
\ No newline at end of file
+    data: Optional[Dict[str,List[Contact]]] = None
+
+class ContactsPageResponse(BaseModel):
+    status: int
+    message: str
+    data: Optional[ContactsPage] = None
+
+class BulkResult(BaseModel):
+    friend_id: str
+    status: int
+    message: str
+
+class BulkResults(BaseModel):
+    results: List[BulkResult]
+
+class BulkResponse(BaseModel):
+    status: int
+    message: str
+    data: Optional[BulkResults] = None
@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+from flask import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def get_adapter(model):
+    return TypeAdapter(model)
+
+
+def dump_response(model, result):
+    """
+    按响应模型校验一次并直接序列化为 JSON 字节，跳过 model_dump 与 Flask 的二次编码
+    """
+    adapter = get_adapter(model)
+    body = adapter.dump_json(adapter.validate_python(result))
+    return Response(body, status=result['status'], mimetype='application/json')
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -16,8 +16,29 @@ class GetPublicKeyRequest(BaseModel):
 
 class PublicKey(BaseModel):
     public_key: str
+    ip: str
+    port: int
 
 class BaseResponse(BaseModel):
     status: int
     message: str
-    data: Optional[PublicKey] = None
\ No newline at end of file
+    data: Optional[PublicKey] = None
+
+class PresenceChange(BaseModel):
+    user_id: str
+    online: bool
+    public_key: Optional[str] = None
+    ip: Optional[str] = None
+    port: Optional[int] = None
+
+class PresenceChanges(BaseModel):
+    # <seq>.<好友集合指纹>，客户端原样带回
+    cursor: str
+    # 为 True 时 changes 是全部好友的当前状态，客户端应整体替换本地状态
+    reset: bool
+    changes: List[PresenceChange]
+
+class PresenceResponse(BaseModel):
+    status: int
+    message: str
+    data: Optional[PresenceChanges] = None
@@ -1,37 +1,62 @@
 import flask_bcrypt
-from flask_jwt_extended import create_access_token
+from flask import current_app
+from flask_jwt_extended import create_access_token, get_jti
 from schemas.auth import BaseResponse
+from schemas.response import dump_response
 from models.users import User
 from models.online import Online
+from services.online import create_heartbeat_session
+from services.contacts import contacts_snapshot
+from services.token import revoke_token
+from common.tracing import traced, span
 
 bcrypt = flask_bcrypt.Bcrypt()
 
+@traced()
 def register_service(user_id, password, email):
     result = dict()
-    if User.get_user(user_id) is None:
-        result['status'] = 200
-        result['message'] = 'success'
-        password = bcrypt.generate_password_hash(password).decode('utf-8')
-        User.create_user(user_id, password, email)
+    if not User.exists(user_id):
+        with span("bcrypt_hash"):
+            password = bcrypt.generate_password_hash(password).decode('utf-8')
+        # 并发注册同一 user_id 时以数据库主键为准
+        if User.create_user(user_id, password, email) is not None:
+            result['status'] = 200
+            result['message'] = 'success'
+        else:
+            result['status'] = 409
+            result['message'] = 'user already exists'
     else:
         result['status'] = 409
         result['message'] = 'user already exists'
-    return BaseResponse(**result).model_dump(), result['status']
+    return dump_response(BaseResponse, result), result['status']
 
-def login_service(user_id, password, public_key, ip, port):
+@traced()
+def login_service(user_id, password, public_key, ip, port, snapshot=False):
     result = dict()
-    if User.get_user(user_id) is not None:
+    if User.exists(user_id):
         if Online.get_user(user_id) is None:
-            if bcrypt.check_password_hash(User.get_password(user_id), password):
+            with span("bcrypt_check"):
+                password_matches = bcrypt.check_password_hash(User.get_password(user_id), password)
+            if password_matches:
                 result['status'] = 200
                 result['message'] = 'success'
                 token = create_access_token(identity=user_id, expires_delta=False)
                 result["data"] = {"token": token}
+                heartbeat_port = current_app.config.get('HEARTBEAT_UDP_PORT')
+                heartbeat = None
+                if heartbeat_port:
+                    heartbeat = create_heartbeat_session(current_app.config['JWT_SECRET_KEY'], user_id)
+                    heartbeat['port'] = heartbeat_port
+                    result["data"]["heartbeat"] = heartbeat
+                if snapshot:
+                    result["data"]["contacts"] = contacts_snapshot(user_id)
                 Online.user_login(
                     user_id=user_id,
                     public_key=public_key,
                     ip=ip,
-                    port=port
+                    port=port,
+                    jti=get_jti(token),
+                    heartbeat_session=heartbeat['session_id'] if heartbeat else ''
                 )
             else:
                 result['status'] = 401
@@ -42,4 +67,17 @@ def login_service(user_id, password, public_key, ip, port):
     else:
         result['status'] = 404
         result['message'] = 'user does not exist'
-    return BaseResponse(**result).model_dump(), result['status']
+    return dump_response(BaseResponse, result), result['status']
+
+@traced()
+def logout_service(user_id, jti):
+    result = dict()
+    if Online.get_user(user_id) is not None:
+        Online.user_logout(user_id)
+        result['status'] = 200
+        result['message'] = 'success'
+    else:
+        result['status'] = 404
+        result['message'] = 'user not login'
+    revoke_token(jti)
+    return dump_response(BaseResponse, result), result['status']
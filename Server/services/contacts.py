@@ -1,27 +1,66 @@
-from schemas.contacts import BaseResponse
-from models.contacts import Contacts
+from schemas.contacts import BaseResponse, BulkResponse, ContactsPageResponse
+from schemas.response import dump_response
+from models.contacts import Contacts, contact_graph
 from models.users import User
+from models.online import Online
+from common.log import get_logger
+from common.tracing import traced
 
+logger = get_logger(__name__)
+
+def split_contacts(user_id):
+    """
+    返回 (好友集合, 好友申请集合)：双向都存在为好友，只有对方指向自己的为好友申请
+    """
+    outbound = contact_graph.outbound_of(user_id)
+    inbound = contact_graph.inbound_of(user_id)
+    return outbound & inbound, inbound - outbound
+
+@traced()
+def contacts_snapshot(user_id):
+    """
+    登录时随 token 返回的通讯录快照：好友附带在线状态，在线好友附带公钥、ip 与端口。
+    邻接集合来自 contact_graph，在线信息由 Online.get_endpoints 批量查询，查询次数与好友数无关
+    """
+    friends, friend_requests = split_contacts(user_id)
+    endpoints = Online.get_endpoints(friends)
+    contacts = list()
+    for user in friends:
+        contact = {'user_id': user, 'flag': 1, 'online': user in endpoints}
+        if contact['online']:
+            contact['public_key'], contact['ip'], contact['port'] = endpoints[user]
+        contacts.append(contact)
+    for user in friend_requests:
+        contacts.append({'user_id': user, 'flag': 0, 'online': False})
+    return contacts
+
+@traced()
+def get_contacts_page_service(user_id, after, limit, flag):
+    """
+    分页获取通讯录：直接沿索引读取一页，不加载完整的邻接集合
+    """
+    result = dict()
+    if User.exists(user_id):
+        rows = Contacts.get_contacts_page(user_id, after, limit + 1, flag)
+        contacts = [{'user_id': user, 'flag': contact_flag} for user, contact_flag in rows[:limit]]
+        result['status'] = 200
+        result['message'] = 'success'
+        result['data'] = {
+            "contacts": contacts,
+            "next": contacts[-1]['user_id'] if len(rows) > limit else None
+        }
+        logger.info("get_contacts", user_id=user_id, page=len(contacts), flag=flag)
+    else:
+        result['status'] = 404
+        result['message'] = 'User does not exist'
+    return dump_response(ContactsPageResponse, result), result['status']
+
+@traced()
 def get_contacts_service(user_id):
     result = dict()
     datas = list()
-    friends = set()
-    friend_requests = set()
-    if User.get_user(user_id) is not None:
-        contacts = Contacts.get_all_contacts(user_id)
-        for contact in contacts:
-            if contact.user_A == user_id:
-                other_user_id = contact.user_B
-                if Contacts.check_contact(other_user_id, user_id):
-                    friends.add(other_user_id)
-                else:
-                    continue
-            else:
-                other_user_id = contact.user_A
-                if Contacts.check_contact(user_id, other_user_id):
-                    friends.add(other_user_id)
-                else:
-                    friend_requests.add(other_user_id)
+    if User.exists(user_id):
+        friends, friend_requests = split_contacts(user_id)
         for user in friends:
             data = {
                 'user_id': user,
@@ -37,17 +76,18 @@ def get_contacts_service(user_id):
         result['status'] = 200
         result['message'] = 'success'
         result['data'] = {"contacts": datas}
-        print(datas)
+        logger.info("get_contacts", user_id=user_id, friends=len(friends), friend_requests=len(friend_requests))
     else:
         result['status'] = 404
         result['message'] = 'User does not exist'
-    return BaseResponse(**result).model_dump(), result['status']
+    return dump_response(BaseResponse, result), result['status']
 
+@traced()
 def add_friend_service(user_id, friend_id):
     result = dict()
-    if User.get_user(friend_id) is not None:
-        if not Contacts.check_contact(user_id, friend_id):
-            Contacts.add_contact(user_id, friend_id)
+    if User.exists(friend_id):
+        # 直接以数据库为准，缓存可能落后于其他 worker 的写入
+        if Contacts.add_contact(user_id, friend_id):
             result['status'] = 200
             result['message'] = 'success'
         else:
@@ -57,13 +97,56 @@ def add_friend_service(user_id, friend_id):
         result['status'] = 404
         result['message'] = 'User does not exist'
 
-    return BaseResponse(**result).model_dump(), result['status']
+    return dump_response(BaseResponse, result), result['status']
+
+@traced()
+def bulk_contacts_service(user_id, friend_ids, action):
+    """
+    批量发出或同意好友申请：一次 IN 查询确认用户存在，一次查询读取已有关系，
+    可添加的关系一条多行 INSERT 写入并提交一次，逐项返回结果
+    """
+    result = dict()
+    if not User.exists(user_id):
+        result['status'] = 404
+        result['message'] = 'User does not exist'
+        return dump_response(BulkResponse, result), result['status']
+    friend_ids = list(dict.fromkeys(friend_ids))
+    existing = User.exists_many(friend_ids)
+    # 关系以数据库为准，contact_graph 可能落后于其他 worker 的写入
+    outbound, inbound = Contacts.edges_between(user_id, [friend_id for friend_id in existing if friend_id != user_id])
+    results = list()
+    accepted = list()
+    for friend_id in friend_ids:
+        if friend_id == user_id:
+            status, message = 400, 'Cannot add yourself'
+        elif friend_id not in existing:
+            status, message = 404, 'User does not exist'
+        elif friend_id in outbound:
+            status, message = 409, 'Contact already exists'
+        elif action == 'accept' and friend_id not in inbound:
+            status, message = 404, 'Friend request does not exist'
+        else:
+            status, message = 200, 'success'
+            accepted.append(friend_id)
+        results.append({'friend_id': friend_id, 'status': status, 'message': message})
+    added = Contacts.add_contacts(user_id, accepted)
+    if added != len(accepted):
+        # 读取与写入之间有并发请求写入了部分关系，无法区分是哪些，按已存在返回
+        for item in results:
+            if item['status'] == 200:
+                item['status'], item['message'] = 409, 'Contact already exists'
+        logger.warning("bulk_contacts_conflict", user_id=user_id, expected=len(accepted), added=added)
+    result['status'] = 200
+    result['message'] = 'success'
+    result['data'] = {'results': results}
+    logger.info("bulk_contacts", user_id=user_id, action=action, requested=len(friend_ids), added=added)
+    return dump_response(BulkResponse, result), result['status']
 
+@traced()
 def delete_friend_service(user_id, friend_id):
     result = dict()
-    if User.get_user(user_id) is not None:
-        if Contacts.check_contact(user_id, friend_id):
-            Contacts.delete_contact(user_id, friend_id)
+    if User.exists(user_id):
+        if Contacts.delete_contact(user_id, friend_id):
             result['status'] = 200
             result['message'] = 'success'
         else:
@@ -73,4 +156,4 @@ def delete_friend_service(user_id, friend_id):
         result['status'] = 404
         result['message'] = 'User does not exist'
 
-    return BaseResponse(**result).model_dump(), result['status']
\ No newline at end of file
+    return dump_response(BaseResponse, result), result['status']
\ No newline at end of file
@@ -0,0 +1,94 @@
+import fcntl
+import os
+import tempfile
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.database import db
+
+
+class LeaderLease:
+    """
+    多 worker 部署时保证只有一个进程执行定时任务。
+
+    - file：对锁文件加 flock，只适用于同一台主机上的 worker
+    - mysql：MySQL GET_LOCK 咨询锁，持有锁的连接在进程存活期间保持打开
+
+    两种锁都随持有进程退出由操作系统/数据库释放，其余 worker 在下一次 acquire 时接管。
+    锁文件必须在 fork 之后打开，因此只在第一次 acquire 时创建。
+    """
+    def __init__(self, app: Flask, name):
+        self.app = app
+        self.name = name
+        self.backend = app.config.get('LEADER_LOCK', 'file')
+        self.lock_file = None
+        self.connection = None
+        self.is_leader = False
+
+    def acquire(self):
+        """
+        非阻塞地获取或确认租约，返回当前进程是否为 leader
+        """
+        was_leader = self.is_leader
+        if self.backend == 'mysql':
+            self.is_leader = self._acquire_mysql()
+        else:
+            self.is_leader = self._acquire_file()
+        if self.is_leader and not was_leader:
+            self.app.logger.warning(f"process {os.getpid()} became leader of {self.name}")
+        return self.is_leader
+
+    def _acquire_file(self):
+        if self.is_leader:
+            return True
+        if self.lock_file is None:
+            path = self.app.config.get('LEADER_LOCK_FILE') or os.path.join(
+                tempfile.gettempdir(), f"server-{self.name}.lock"
+            )
+            self.lock_file = open(path, 'a+')
+        try:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self.lock_file.seek(0)
+        self.lock_file.truncate()
+        self.lock_file.write(str(os.getpid()))
+        self.lock_file.flush()
+        return True
+
+    def _acquire_mysql(self):
+        try:
+            with self.app.app_context():
+                if self.connection is None:
+                    self.connection = db.engine.connect()
+                if self.is_leader:
+                    # 连接断开时锁已被释放，需要重新竞争
+                    owner = self.connection.execute(
+                        text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {"name": self.name}
+                    ).scalar()
+                    if owner:
+                        return True
+                acquired = self.connection.execute(
+                    text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}
+                ).scalar()
+                return acquired == 1
+        except SQLAlchemyError:
+            if self.connection is not None:
+                self.connection.invalidate()
+                self.connection = None
+            return False
+
+    def release(self):
+        if self.backend == 'mysql':
+            if self.connection is not None:
+                if self.is_leader:
+                    self.connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+                self.connection.close()
+                self.connection = None
+        elif self.lock_file is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+            self.lock_file.close()
+            self.lock_file = None
+        self.is_leader = False
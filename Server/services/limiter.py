@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Flask, request, g, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from config import (
+    RATE_LIMITS, DEFAULT_RATE_LIMIT, RATE_LIMIT_BUCKETS, RATE_LIMIT_PREAUTH_ROUTES,
+    MAX_CONCURRENT_REQUESTS, LOW_PRIORITY_ROUTES, LOW_PRIORITY_SHED_RATIO
+)
+
+
+class MemoryBuckets:
+    """
+    进程内令牌桶：key -> (剩余令牌, 上次更新时间)，按最近更新的顺序排列。
+    读改写在锁内完成；桶数量超过上限时淘汰最久未更新的桶。
+    """
+    def __init__(self, maxsize=RATE_LIMIT_BUCKETS):
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, now=None):
+        """
+        取一个令牌，成功返回 0，否则返回需要等待的秒数
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, stamp = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self.buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self.prune()
+        return wait
+
+    def prune(self):
+        # 调用方持有锁；最久未更新的桶最可能已回满，被淘汰的 key 下次从满桶开始
+        while len(self.buckets) > self.maxsize:
+            self.buckets.popitem(last=False)
+
+
+class RedisBuckets:
+    """
+    多 worker 共享的令牌桶，在 Redis 中用 Lua 脚本原子地完成一次取令牌
+    """
+    SCRIPT = """
+    local tokens = tonumber(redis.call('HGET', KEYS[1], 't') or ARGV[2])
+    local stamp = tonumber(redis.call('HGET', KEYS[1], 's') or ARGV[3])
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    tokens = math.min(burst, tokens + math.max(0, now - stamp) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 't', tostring(tokens), 's', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        return float(self.script(keys=[f"rate:{key}"], args=[rate, burst, now]))
+
+
+class Limiter:
+    """
+    请求准入：按路由的令牌桶限流（按 IP 与按用户分别计数），超出返回 429；
+    并发请求数达到上限返回 503，低优先级路由（心跳）在达到 LOW_PRIORITY_SHED_RATIO 时先被拒绝。
+    """
+    def __init__(self, app: Flask):
+        self.app = app
+        if app.config.get('RATE_LIMIT_BACKEND') == 'redis':
+            self.buckets = RedisBuckets(app.config['RATE_LIMIT_REDIS_URL'])
+        else:
+            self.buckets = MemoryBuckets()
+        self.max_concurrent = app.config.get('MAX_CONCURRENT_REQUESTS', MAX_CONCURRENT_REQUESTS)
+        self.low_priority_limit = int(self.max_concurrent * LOW_PRIORITY_SHED_RATIO)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+    @staticmethod
+    def request_user(route):
+        """
+        用户桶的 key：登录、注册尚未认证，取 (IP, 请求体中的 user_id)，只能限制同一来源对某个账号的尝试；
+        其余路由取校验通过的 token 身份。无法确定用户时返回 None，只按 IP 计数，
+        随意构造的 Authorization 头不会得到新的桶
+        """
+        if route in RATE_LIMIT_PREAUTH_ROUTES:
+            body = request.get_json(silent=True)
+            data = body.get('data') if isinstance(body, dict) else None
+            user_id = data.get('user_id') if isinstance(data, dict) else None
+            return f"{request.remote_addr}/{user_id}" if isinstance(user_id, str) else None
+        if 'flask-jwt-extended' not in current_app.extensions or not request.headers.get('Authorization'):
+            return None
+        try:
+            verify_jwt_in_request(optional=True)
+        except (JWTExtendedException, PyJWTError):
+            # 无效 token 由路由自身返回 401/422
+            return None
+        return get_jwt_identity()
+
+    def check_rate(self, route):
+        limits = RATE_LIMITS.get(route, DEFAULT_RATE_LIMIT)
+        keys = [("ip", request.remote_addr)]
+        user_id = self.request_user(route)
+        if user_id is not None:
+            keys.append(("user", user_id))
+        for kind, key in keys:
+            rate, burst = limits[kind]
+            wait = self.buckets.take(f"{route}:{kind}:{key}", rate, burst)
+            if wait:
+                return wait
+        return 0
+
+    def admit(self):
+        route = request.endpoint
+        wait = self.check_rate(route)
+        if wait:
+            return self.reject(429, 'too many requests', wait)
+        limit = self.low_priority_limit if route in LOW_PRIORITY_ROUTES else self.max_concurrent
+        with self.lock:
+            if self.in_flight >= limit:
+                return self.reject(503, 'server busy', 1)
+            self.in_flight += 1
+        g.admitted = True
+
+    def release(self, exception=None):
+        if g.pop('admitted', False):
+            with self.lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    def reject(status, message, retry_after):
+        return {"status": status, "message": message}, status, {"Retry-After": str(max(1, round(retry_after)))}
+
+
+def init_limiter(app: Flask):
+    """
+    RATE_LIMIT 开启时注册准入钩子，关闭时不增加任何每请求开销
+    """
+    if not app.config.get('RATE_LIMIT'):
+        return None
+    return Limiter(app)
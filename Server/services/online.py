@@ -1,21 +1,151 @@
+import hashlib
+import hmac
+import secrets
+import socket
+import threading
+import time
 from datetime import datetime, timedelta
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from flask import Flask
 
-from config import TIME_TO_LIVE
-from models.online import Online
+from config import (
+    TIME_TO_LIVE, HEARTBEAT_FLUSH_INTERVAL, HEARTBEAT_MAX_SKEW, PRESENCE_LOG_RETENTION, PRESENCE_COMPACT_INTERVAL,
+    LEADER_LEASE_INTERVAL
+)
+from models.online import Online, PresenceChange
+from services.leader import LeaderLease
+from services.token import revoke_token
 
 class CheckUser:
     def check_inactive_user(self):
+        # 多 worker 部署时只有持有租约的进程执行清理
+        if not self.lease.acquire():
+            return
         with self.app.app_context():
             time_to_live = datetime.now() - TIME_TO_LIVE
             users = Online.delete_inactive_user(time_to_live)
+        for user in users:
+            revoke_token(user.jti)
         if len(users) > 0:
             self.app.logger.warning(f"{len(users)} inactive users deleted:{[user.user_id for user in users]}")
 
+    def compact_presence_log(self):
+        if not self.lease.acquire():
+            return
+        with self.app.app_context():
+            PresenceChange.compact(datetime.now() - PRESENCE_LOG_RETENTION)
+
     def __init__(self, app: Flask):
         self.app = app
+        self.lease = LeaderLease(app, 'check_user')
+        self.lease.acquire()
         self.scheduler = BackgroundScheduler()
+        # 租约单独定期获取与续约，前任 leader 退出后尽快接管，不必等到下一次任务执行
+        self.scheduler.add_job(self.lease.acquire, 'interval', seconds=LEADER_LEASE_INTERVAL)
         self.scheduler.add_job(self.check_inactive_user, 'interval', seconds=100000)
-        self.scheduler.start()
\ No newline at end of file
+        self.scheduler.add_job(self.compact_presence_log, 'interval', seconds=PRESENCE_COMPACT_INTERVAL)
+        self.scheduler.start()
+
+
+def heartbeat_key(secret, session_id):
+    """
+    UDP 心跳的会话密钥，由服务端密钥派生，无需存储
+    """
+    return hmac.new(secret.encode('utf-8'), f"heartbeat:{session_id}".encode('utf-8'), hashlib.sha256).digest()
+
+
+def create_heartbeat_session(secret, user_id):
+    """
+    登录时生成 UDP 心跳会话，session_id 形如 <user_id>.<nonce>
+    """
+    session_id = f"{user_id}.{secrets.token_urlsafe(8)}"
+    return {
+        "session_id": session_id,
+        "key": heartbeat_key(secret, session_id).hex()
+    }
+
+
+def sign_heartbeat(session_id, key: bytes, timestamp: int) -> bytes:
+    """
+    心跳报文：<session_id>|<unix 时间戳>|<HMAC 前 16 字节的 hex>
+    """
+    message = f"{session_id}|{timestamp}"
+    mac = hmac.new(key, message.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+    return f"{message}|{mac}".encode('utf-8')
+
+
+def session_user(session_id):
+    return session_id.rsplit('.', 1)[0]
+
+
+def verify_heartbeat(secret, datagram: bytes, now=None):
+    """
+    校验心跳报文的签名与时间戳，成功返回 session_id，否则返回 None；
+    session 是否仍是用户的当前会话由 flush 对照 Online.heartbeat_session 判断
+    """
+    try:
+        session_id, timestamp, mac = datagram.decode('utf-8').split('|')
+        timestamp = int(timestamp)
+    except ValueError:
+        return None
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > HEARTBEAT_MAX_SKEW:
+        return None
+    expected = sign_heartbeat(session_id, heartbeat_key(secret, session_id), timestamp)
+    if not hmac.compare_digest(expected, datagram):
+        return None
+    return session_id
+
+
+class UdpHeartbeat:
+    """
+    轻量 UDP 心跳通道：接收线程只做 HMAC 校验并记录 user_id 与 session_id，
+    由调度器按 HEARTBEAT_FLUSH_INTERVAL 批量刷新 session 仍有效的用户的 last_seen_time；
+    登出或重新登录后旧 session 的心跳不再生效。
+    HTTP /heartbeat 路由保留作为回退。
+    """
+    def receive(self):
+        while True:
+            try:
+                datagram, addr = self.socket.recvfrom(512)
+            except OSError:
+                break
+            session_id = verify_heartbeat(self.secret, datagram)
+            if session_id is not None:
+                with self.lock:
+                    self.pending[session_user(session_id)] = session_id
+
+    def flush(self):
+        """
+        返回收到心跳的 user_id 集合（含 session 已失效、未被刷新的用户）
+        """
+        with self.lock:
+            sessions, self.pending = self.pending, dict()
+        if sessions:
+            with self.app.app_context():
+                Online.update_last_seen_sessions(sessions)
+        return set(sessions)
+
+    def __init__(self, app: Flask, host="0.0.0.0", port=None, flush_interval=HEARTBEAT_FLUSH_INTERVAL):
+        self.app = app
+        self.secret = app.config['JWT_SECRET_KEY']
+        self.pending = dict()
+        self.lock = threading.Lock()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # 多 worker 部署时各 worker 共享端口，由内核分发报文
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.socket.bind((host, app.config['HEARTBEAT_UDP_PORT'] if port is None else port))
+        self.port = self.socket.getsockname()[1]
+        # 端口配置为 0 时由系统分配，登录响应中下发实际端口
+        app.config['HEARTBEAT_UDP_PORT'] = self.port
+        self.receiver = threading.Thread(target=self.receive, daemon=True)
+        self.receiver.start()
+        self.scheduler = BackgroundScheduler()
+        self.scheduler.add_job(self.flush, 'interval', seconds=flush_interval)
+        self.scheduler.start()
+
+    def close(self):
+        self.scheduler.shutdown(wait=False)
+        self.socket.close()
@@ -0,0 +1,47 @@
+from flask_jwt_extended import JWTManager
+
+from config import TOKEN_CACHE_SIZE, REVOKED_TOKENS_SIZE, TOKEN_RECHECK_TTL
+from common.log import get_logger
+from models.cache import LRUCache
+from models.online import Online
+
+logger = get_logger(__name__)
+
+# 本进程已撤销的 jti（登出、会话过期）；其余 worker 在 TOKEN_RECHECK_TTL 内通过数据库中的会话 jti 感知
+revoked_tokens = LRUCache(REVOKED_TOKENS_SIZE)
+
+
+def revoke_token(jti):
+    if jti:
+        revoked_tokens.put(jti, True)
+
+
+class CachedJWTManager(JWTManager):
+    """
+    通过 token_in_blocklist_loader 缓存 token 的撤销检查结果：同一 jti 在 TOKEN_RECHECK_TTL 内
+    只核对一次数据库中的会话 jti，心跳等高频请求不再额外查询。
+    本进程的撤销经 revoked_tokens 立即生效，其他 worker 上的登出或重新登录在 TOKEN_RECHECK_TTL 内生效。
+    """
+    def __init__(self, app=None, cache_size=TOKEN_CACHE_SIZE, recheck_ttl=TOKEN_RECHECK_TTL):
+        # jti -> 核对通过；只缓存有效的结果，过期后重新核对
+        self.token_cache = LRUCache(cache_size, recheck_ttl)
+        super().__init__(app)
+        self.token_in_blocklist_loader(self.is_token_revoked)
+
+    def is_token_revoked(self, jwt_header, jwt_payload):
+        """
+        token 已被撤销，或用户已离线，或用户已用新 token 重新登录时拒绝
+        """
+        jti = jwt_payload.get('jti')
+        if revoked_tokens.get(jti):
+            return True
+        if jti is not None and self.token_cache.get(jti):
+            return False
+        user_id = jwt_payload['sub']
+        session = Online.get_session(user_id, fresh=True)
+        if session is None or (session != '' and session != jti):
+            logger.info("token_rejected", user_id=user_id, online=session is not None)
+            return True
+        if jti is not None:
+            self.token_cache.put(jti, True)
+        return False
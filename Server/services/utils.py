@@ -1,13 +1,21 @@
-from schemas.utils import BaseResponse
+import hashlib
+from datetime import datetime, timedelta
+
+from config import PRESENCE_COMMIT_GRACE
+from schemas.utils import BaseResponse, PresenceResponse
+from schemas.response import dump_response
 from models.users import User
-from models.online import Online
+from models.online import Online, PresenceChange
 from models.contacts import Contacts
+from services.contacts import split_contacts
+from common.tracing import traced
 
+@traced()
 def online_service(user_id, friend_id):
     result = dict()
-    if User.get_user(friend_id):
+    if User.exists(friend_id):
         if Contacts.check_relationship(user_id, friend_id):
-            if Online.get_state(friend_id):
+            if Online.get_endpoint(friend_id) is not None:
                 result['status'] = 200
                 result['message'] = 'success'
             else:
@@ -19,18 +27,17 @@ def online_service(user_id, friend_id):
     else:
         result['status'] = 404
         result['message'] = 'User does not exist'
-    return BaseResponse(**result).model_dump(), result['status']
+    return dump_response(BaseResponse, result), result['status']
 
+@traced()
 def public_key_service(user_id, friend_id):
     result = dict()
-    if User.get_user(friend_id):
+    if User.exists(friend_id):
         if Contacts.check_relationship(user_id, friend_id):
-            if Online.get_state(friend_id):
-                user = Online.get_user(friend_id)
+            endpoint = Online.get_endpoint(friend_id)
+            if endpoint is not None:
                 data = dict()
-                data['public_key'] = user.public_key
-                data['ip'] = user.ip
-                data['port'] = user.port
+                data['public_key'], data['ip'], data['port'] = endpoint
                 result['status'] = 200
                 result['message'] = 'success'
                 result['data'] = data
@@ -43,11 +50,72 @@ def public_key_service(user_id, friend_id):
     else:
         result['status'] = 404
         result['message'] = 'User does not exist'
-    return BaseResponse(**result).model_dump(), result['status']
+    return dump_response(BaseResponse, result), result['status']
 
+@traced()
 def heartbeat_service(user_id):
     result = dict()
-    Online.update_last_seen(user_id)
-    result['status'] = 200
-    result['message'] = 'success'
-    return BaseResponse(**result).model_dump(), result['status']
\ No newline at end of file
+    # 会话已被其他 worker 删除时，撤销检查缓存可能尚未过期
+    if Online.update_last_seen(user_id) is None:
+        result['status'] = 401
+        result['message'] = 'User not online'
+    else:
+        result['status'] = 200
+        result['message'] = 'success'
+    return dump_response(BaseResponse, result), result['status']
+
+def friends_fingerprint(friends):
+    return hashlib.blake2b("\n".join(sorted(friends)).encode('utf-8'), digest_size=8).hexdigest()
+
+def parse_presence_cursor(cursor):
+    """
+    游标形如 <seq>.<好友集合指纹>，返回 (seq, 指纹)；无法解析时为 (0, None)
+    """
+    seq, _, fingerprint = cursor.partition('.')
+    try:
+        return int(seq), fingerprint or None
+    except ValueError:
+        return 0, None
+
+@traced()
+def presence_changes_service(user_id, since):
+    """
+    返回 since 之后状态发生变化的好友及新游标。since 为空、早于已压缩的日志、大于最新 seq
+    或好友集合已变化时返回全部好友的状态并置 reset；变化好友的状态绕过缓存直接查询 Online。
+    游标只推进到 PRESENCE_COMMIT_GRACE 秒之前的记录，之后的变化在下次请求中可能重复返回
+    """
+    result = dict()
+    if User.exists(user_id):
+        friends, _ = split_contacts(user_id)
+        fingerprint = friends_fingerprint(friends)
+        since, since_fingerprint = parse_presence_cursor(since)
+        oldest, newest, settled = PresenceChange.bounds(datetime.now() - timedelta(seconds=PRESENCE_COMMIT_GRACE))
+        newest = newest or 0
+        if settled is None:
+            settled = oldest - 1 if oldest is not None else 0
+        reset = (
+            since <= 0 or since > newest
+            or (oldest is not None and since < oldest - 1)
+            or since_fingerprint != fingerprint
+        )
+        if reset:
+            changed = friends
+            endpoints = Online.get_endpoints(changed)
+            cursor = settled
+        else:
+            changed = PresenceChange.changed_users(friends, since, newest) if since < newest else set()
+            endpoints = Online.get_endpoints(changed, fresh=True)
+            cursor = max(since, settled)
+        changes = list()
+        for user in changed:
+            change = {'user_id': user, 'online': user in endpoints}
+            if change['online']:
+                change['public_key'], change['ip'], change['port'] = endpoints[user]
+            changes.append(change)
+        result['status'] = 200
+        result['message'] = 'success'
+        result['data'] = {'cursor': f"{cursor}.{fingerprint}", 'reset': reset, 'changes': changes}
+    else:
+        result['status'] = 404
+        result['message'] = 'User does not exist'
+    return dump_response(PresenceResponse, result), result['status']
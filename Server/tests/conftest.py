@@ -3,6 +3,7 @@ sys.path.append((os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))
 
 import pytest
 from app import create_app_debug
+from models.cache import clear_caches
 from models.database import db
 
 
@@ -14,6 +15,7 @@ def app():
         "TESTING": True,
         "JWT_SECRET_KEY": "test"
     })
+    clear_caches()
 
     yield app
 
@@ -29,4 +31,5 @@ def db_setup(app):
     with app.app_context():
         db.create_all()
         yield db
-        db.drop_all()
\ No newline at end of file
+        db.drop_all()
+        clear_caches()
\ No newline at end of file
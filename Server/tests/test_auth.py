@@ -201,4 +201,150 @@ def test_login_existing_user(client):
         online_user = Online.get_user("existing_user")
         assert online_user.public_key == "pub_key_1"  # 确保数据未被新登录覆盖
         assert online_user.ip == "192.168.1.1"
-        assert online_user.port == 8080
\ No newline at end of file
+        assert online_user.port == 8080
+from sqlalchemy import event
+from models.database import db
+from models.users import User, BloomFilter
+
+def test_bloom_filter_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [f"user_{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other_{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_user_existence_index(client):
+    """测试用户存在性索引：已知与未知用户都不需要查询数据库"""
+    client.post(
+        '/register',
+        json={
+            "data": {
+                "user_id": "index_user",
+                "password": "password",
+                "email": "index@example.com"
+            }
+        }
+    )
+    with client.application.app_context():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            assert User.exists("index_user")
+            assert not User.exists("unknown_index_user", confirm=False)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        assert statements == []
+
+def test_user_created_by_other_worker(client):
+    """测试其他 worker 创建、不在本进程 Bloom filter 中的用户：注册返回 409，登录成功"""
+    import flask_bcrypt
+    with client.application.app_context():
+        # 先建好本进程的索引，之后插入的用户模拟由其他 worker 创建
+        User.exists("other_worker_probe", confirm=False)
+        password = flask_bcrypt.Bcrypt().generate_password_hash("password").decode('utf-8')
+        db.session.add(User(user_id="other_worker_user", password=password, email="other@example.com"))
+        db.session.commit()
+        assert not User.exists("other_worker_user", confirm=False)
+        # 并发创建同一用户时不抛出 IntegrityError
+        assert User.create_user("other_worker_user", password, "other@example.com") is None
+
+    user = {"user_id": "other_worker_user", "password": "password", "email": "other@example.com"}
+    assert client.post('/register', json={"data": user}).status_code == 409
+    login_data = {"user_id": "other_worker_user", "password": "password", "public_key": "key", "ip": "127.0.0.1", "port": 9000}
+    response = client.post('/login', json={"data": login_data})
+    assert response.status_code == 200
+
+    # 好友相关接口同样确认 Bloom filter 的否定结果
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+    with client.application.app_context():
+        for user_id in ("other_worker_friend", "other_worker_bulk"):
+            db.session.add(User(user_id=user_id, password=password, email="other@example.com"))
+        db.session.commit()
+        assert not User.exists_many(["other_worker_bulk"], confirm=False)
+    assert client.post('/contacts', json={"data": {"friend_id": "other_worker_friend"}}, headers=headers).status_code == 200
+    response = client.post('/contacts/bulk', json={"data": {"friend_ids": ["other_worker_bulk"]}}, headers=headers)
+    assert response.json["data"]["results"][0]["status"] == 200
+
+def test_logout_revokes_token(client):
+    """测试登出后 token 立即失效，重新登录后旧 token 仍被拒绝"""
+    user = {"user_id": "logout_user", "password": "password", "email": "logout@example.com"}
+    client.post('/register', json={"data": user})
+    login_data = {"user_id": "logout_user", "password": "password", "public_key": "key", "ip": "127.0.0.1", "port": 9000}
+
+    token = client.post('/login', json={"data": login_data}).json["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get('/heartbeat', headers=headers).status_code == 200
+    # 第二次请求命中撤销检查缓存
+    manager = client.application.extensions['flask-jwt-extended']
+    hits = manager.token_cache.hits
+    assert client.get('/heartbeat', headers=headers).status_code == 200
+    assert manager.token_cache.hits == hits + 1
+
+    assert client.get('/logout', headers=headers).status_code == 200
+    assert client.get('/heartbeat', headers=headers).status_code == 401
+
+    new_token = client.post('/login', json={"data": login_data}).json["data"]["token"]
+    assert client.get('/heartbeat', headers={"Authorization": f"Bearer {new_token}"}).status_code == 200
+    assert client.get('/heartbeat', headers=headers).status_code == 401
+
+def test_logout_on_other_worker(client):
+    """测试其他 worker 登出后，撤销检查缓存过期时 token 被拒绝"""
+    from models.online import Online
+    user = {"user_id": "worker_logout_user", "password": "password", "email": "worker@example.com"}
+    client.post('/register', json={"data": user})
+    login_data = {"user_id": "worker_logout_user", "password": "password", "public_key": "key", "ip": "127.0.0.1", "port": 9000}
+    token = client.post('/login', json={"data": login_data}).json["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get('/heartbeat', headers=headers).status_code == 200
+
+    manager = client.application.extensions['flask-jwt-extended']
+    with client.application.app_context():
+        # 绕过本进程的缓存失效，模拟另一个 worker 删除会话
+        Online.query.filter_by(user_id="worker_logout_user").delete()
+        db.session.commit()
+    # 缓存未过期前仍按上次核对的结果放行，心跳直接以数据库中的会话为准
+    assert client.get('/contacts', headers=headers).status_code == 200
+    assert client.get('/heartbeat', headers=headers).status_code == 401
+    # 模拟 TOKEN_RECHECK_TTL 到期
+    manager.token_cache.clear()
+    assert client.get('/heartbeat', headers=headers).status_code == 401
+
+def test_login_snapshot(client):
+    """测试登录快照：好友附带在线信息，好友申请只有状态，在线信息一次批量查询"""
+    for user_id in ("snap_user", "snap_online", "snap_offline", "snap_request"):
+        client.post('/register', json={"data": {"user_id": user_id, "password": "password", "email": f"{user_id}@example.com"}})
+    login_data = {"user_id": "snap_online", "password": "password", "public_key": "online_key", "ip": "10.0.0.2", "port": 7000}
+    headers = {"Authorization": f"Bearer {client.post('/login', json={'data': login_data}).json['data']['token']}"}
+    client.post('/contacts', json={"data": {"friend_id": "snap_user"}}, headers=headers)
+    with client.application.app_context():
+        from models.contacts import Contacts
+        Contacts.add_contact("snap_user", "snap_online")
+        Contacts.add_contact("snap_user", "snap_offline")
+        Contacts.add_contact("snap_offline", "snap_user")
+        Contacts.add_contact("snap_request", "snap_user")
+
+    login_data = {"user_id": "snap_user", "password": "password", "public_key": "key", "ip": "127.0.0.1", "port": 9000}
+    with client.application.app_context():
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            response = client.post('/login', json={"data": {**login_data, "snapshot": True}})
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    contacts = {contact["user_id"]: contact for contact in response.json["data"]["contacts"]}
+    assert contacts["snap_online"] == {
+        "user_id": "snap_online", "flag": 1, "online": True, "public_key": "online_key", "ip": "10.0.0.2", "port": 7000
+    }
+    assert contacts["snap_offline"]["flag"] == 1 and not contacts["snap_offline"]["online"]
+    assert contacts["snap_offline"]["public_key"] is None
+    assert contacts["snap_request"]["flag"] == 0
+    assert sum("FROM online" in statement and " IN " in statement for statement in statements) == 1
+
+    client.get('/logout', headers={"Authorization": f"Bearer {response.json['data']['token']}"})
+    response = client.post('/login', json={"data": login_data})
+    assert response.json["data"]["contacts"] is None
@@ -113,4 +113,168 @@ class TestContacts:
             headers={"Authorization": f"Bearer {self.test_user_token}"},
             json={"data": {"friend_id": "friend1"}}
         )
-        assert response.status_code == 409
\ No newline at end of file
+        assert response.status_code == 409
+    def test_relationship_check_is_cached(self):
+        from sqlalchemy import event
+        from models.contacts import Contacts, contact_graph
+        from models.database import db
+
+        self.client.post(
+            "/contacts",
+            headers={"Authorization": f"Bearer {self.test_user_token}"},
+            json={"data": {"friend_id": "friend1"}}
+        )
+        self.client.post(
+            "/contacts",
+            headers={"Authorization": f"Bearer {self.friend1_token}"},
+            json={"data": {"friend_id": "test_user"}}
+        )
+
+        with self.client.application.app_context():
+            assert Contacts.check_relationship("test_user", "friend1")
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, "before_cursor_execute", listener)
+            try:
+                # 热路径只做集合查询，不访问数据库
+                assert Contacts.check_relationship("test_user", "friend1")
+                assert not Contacts.check_relationship("test_user", "friend2")
+            finally:
+                event.remove(db.engine, "before_cursor_execute", listener)
+            assert statements == []
+
+            # 删除好友同步更新缓存
+            Contacts.delete_contact("friend1", "test_user")
+            assert not Contacts.check_relationship("test_user", "friend1")
+
+            # 失效后重新从数据库加载
+            db.session.add(Contacts(user_A="friend1", user_B="test_user"))
+            db.session.commit()
+            assert not Contacts.check_relationship("test_user", "friend1")
+            contact_graph.invalidate(["test_user", "friend1"])
+            assert Contacts.check_relationship("test_user", "friend1")
+
+    def test_relationship_check_bounded_staleness(self, monkeypatch):
+        """其他 worker 删除好友后，鉴权在 CONTACTS_AUTH_TTL 之后以数据库为准，普通读取仍可使用缓存"""
+        import models.contacts
+        from models.contacts import Contacts, contact_graph
+        from models.database import db
+
+        for token, friend_id in ((self.test_user_token, "friend1"), (self.friend1_token, "test_user")):
+            self.client.post(
+                "/contacts",
+                headers={"Authorization": f"Bearer {token}"},
+                json={"data": {"friend_id": friend_id}}
+            )
+
+        with self.client.application.app_context():
+            assert Contacts.check_relationship("test_user", "friend1")
+            # 绕过本进程的缓存更新，模拟另一个 worker 删除好友
+            Contacts.query.filter_by(user_A="friend1", user_B="test_user").delete()
+            db.session.commit()
+            assert Contacts.check_relationship("test_user", "friend1")
+
+            # 模拟 CONTACTS_AUTH_TTL 到期
+            monkeypatch.setattr(models.contacts, "CONTACTS_AUTH_TTL", -1)
+            assert not Contacts.check_relationship("test_user", "friend1")
+            assert "friend1" not in contact_graph.inbound_of("test_user")
+
+    def test_writes_ignore_stale_cache(self):
+        from models.contacts import Contacts, contact_graph
+        from models.database import db
+
+        headers = {"Authorization": f"Bearer {self.test_user_token}"}
+        with self.client.application.app_context():
+            # 缓存中 test_user 没有出边，随后由"其他 worker"写入一条
+            assert not Contacts.check_contact("test_user", "friend1")
+            db.session.add(Contacts(user_A="test_user", user_B="friend1"))
+            db.session.commit()
+        response = self.client.post("/contacts", headers=headers, json={"data": {"friend_id": "friend1"}})
+        assert response.status_code == 409
+
+        with self.client.application.app_context():
+            # 缓存中仍有该关系，但已被"其他 worker"删除
+            assert Contacts.check_contact("test_user", "friend1")
+            Contacts.query.filter_by(user_A="test_user", user_B="friend1").delete()
+            db.session.commit()
+        response = self.client.delete("/contacts", headers=headers, json={"data": {"friend_id": "friend1"}})
+        assert response.status_code == 409
+
+    def test_get_contacts_paginated(self):
+        headers = {"Authorization": f"Bearer {self.test_user_token}"}
+        # p0..p4 向 test_user 发出申请，test_user 同意 p1 与 p3
+        for i in range(5):
+            self.register_user(f"p{i}", "password", f"p{i}@example.com")
+            token = self.login_user(f"p{i}", "password").json["data"]["token"]
+            self.client.post("/contacts", headers={"Authorization": f"Bearer {token}"}, json={"data": {"friend_id": "test_user"}})
+        for friend_id in ("p1", "p3"):
+            self.client.post("/contacts", headers=headers, json={"data": {"friend_id": friend_id}})
+
+        def page(query):
+            response = self.client.get(f"/contacts?{query}", headers=headers)
+            assert response.status_code == 200
+            return response.json["data"]
+
+        first = page("limit=2")
+        assert first == {"contacts": [{"user_id": "p0", "flag": 0}, {"user_id": "p1", "flag": 1}], "next": "p1"}
+        second = page("limit=2&after=p1")
+        assert [c["user_id"] for c in second["contacts"]] == ["p2", "p3"]
+        assert page("limit=2&after=p3") == {"contacts": [{"user_id": "p4", "flag": 0}], "next": None}
+
+        assert page("flag=1") == {"contacts": [{"user_id": "p1", "flag": 1}, {"user_id": "p3", "flag": 1}], "next": None}
+        assert [c["user_id"] for c in page("flag=0&after=p0")["contacts"]] == ["p2", "p4"]
+
+        # 不带分页参数时保持原有的响应格式
+        assert self.client.get("/contacts", headers=headers).json["data"].keys() == {"contacts"}
+
+        assert self.client.get("/contacts?limit=0", headers=headers).status_code == 400
+        assert self.client.get("/contacts?flag=2", headers=headers).status_code == 400
+
+    def test_bulk_contacts(self):
+        from sqlalchemy import event
+        from models.database import db
+
+        headers = {"Authorization": f"Bearer {self.test_user_token}"}
+        self.client.post("/contacts", headers={"Authorization": f"Bearer {self.friend2_token}"},
+                         json={"data": {"friend_id": "test_user"}})
+        self.client.post("/contacts", headers=headers, json={"data": {"friend_id": "friend2"}})
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        with self.client.application.app_context():
+            event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            response = self.client.post("/contacts/bulk", headers=headers, json={"data": {
+                "friend_ids": ["friend1", "nobody", "friend2", "friend1", "test_user"]
+            }})
+        finally:
+            with self.client.application.app_context():
+                event.remove(db.engine, "before_cursor_execute", listener)
+        assert response.status_code == 200
+        assert [(r["friend_id"], r["status"]) for r in response.json["data"]["results"]] == [
+            ("friend1", 200), ("nobody", 404), ("friend2", 409), ("test_user", 400)
+        ]
+        assert sum(statement.startswith("INSERT INTO contacts") for statement in statements) == 1
+
+        # friend1 同意 test_user 的申请，friend2 没有向 friend1 发出申请
+        response = self.client.post("/contacts/bulk", headers={"Authorization": f"Bearer {self.friend1_token}"}, json={"data": {
+            "friend_ids": ["test_user", "friend2"], "action": "accept"
+        }})
+        assert [(r["friend_id"], r["status"]) for r in response.json["data"]["results"]] == [
+            ("test_user", 200), ("friend2", 404)
+        ]
+        with self.client.application.app_context():
+            from models.contacts import Contacts
+            assert Contacts.check_relationship("test_user", "friend1")
+
+        assert self.client.post("/contacts/bulk", headers=headers, json={"data": {"friend_ids": []}}).status_code == 400
+
+        # 其他 worker 写入、本进程缓存中还没有的关系同样返回 409
+        with self.client.application.app_context():
+            from models.contacts import Contacts, contact_graph
+            contact_graph.outbound_of("friend2")
+            db.session.add(Contacts(user_A="friend2", user_B="friend1"))
+            db.session.commit()
+        response = self.client.post("/contacts/bulk", headers={"Authorization": f"Bearer {self.friend2_token}"},
+                                    json={"data": {"friend_ids": ["friend1"]}})
+        assert [(r["friend_id"], r["status"]) for r in response.json["data"]["results"]] == [("friend1", 409)]
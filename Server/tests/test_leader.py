@@ -0,0 +1,50 @@
+import subprocess
+import sys
+
+import pytest
+
+from services.leader import LeaderLease
+
+
+@pytest.fixture
+def lock_file(app, tmp_path):
+    path = str(tmp_path / "leader.lock")
+    app.config.update({"LEADER_LOCK": "file", "LEADER_LOCK_FILE": path})
+    yield path
+    app.config.update({"LEADER_LOCK_FILE": None})
+
+
+def test_single_leader(app, lock_file):
+    lease_a = LeaderLease(app, "test")
+    lease_b = LeaderLease(app, "test")
+
+    assert lease_a.acquire()
+    assert lease_a.acquire()  # 已持有时再次确认
+    assert not lease_b.acquire()
+
+    lease_a.release()
+    assert lease_b.acquire()
+    lease_b.release()
+
+
+def test_failover_when_leader_dies(app, lock_file):
+    # 另一个进程持有锁后被杀死，锁应由操作系统释放
+    holder = subprocess.Popen([
+        sys.executable, "-c",
+        "import fcntl, sys, time\n"
+        f"f = open({lock_file!r}, 'a+')\n"
+        "fcntl.flock(f.fileno(), fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(60)\n"
+    ], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        lease = LeaderLease(app, "test")
+        assert not lease.acquire()
+
+        holder.kill()
+        holder.wait()
+        assert lease.acquire()
+        lease.release()
+    finally:
+        holder.kill()
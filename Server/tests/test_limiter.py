@@ -0,0 +1,91 @@
+import pytest
+from flask import Flask
+
+from services.limiter import MemoryBuckets, init_limiter
+
+
+@pytest.fixture
+def limited_app():
+    """只挂载准入钩子的最小应用，避免影响其他测试共用的 app"""
+    app = Flask(__name__)
+    app.config.update({"RATE_LIMIT": True, "MAX_CONCURRENT_REQUESTS": 4})
+    limiter = init_limiter(app)
+
+    @app.route("/login", methods=["POST"])
+    def login():
+        return {"status": 200}
+
+    @app.route("/heartbeat")
+    def heartbeat():
+        return {"status": 200}
+
+    @app.route("/contacts")
+    def get_contacts():
+        return {"status": 200}
+
+    return app, limiter
+
+
+def test_token_bucket_refill():
+    buckets = MemoryBuckets()
+    assert buckets.take("k", 1, 2, now=0) == 0
+    assert buckets.take("k", 1, 2, now=0) == 0
+    assert buckets.take("k", 1, 2, now=0) == pytest.approx(1)
+    assert buckets.take("k", 1, 2, now=0.5) == pytest.approx(0.5)
+    assert buckets.take("k", 1, 2, now=1.5) == 0
+
+
+def test_disabled_by_default():
+    assert init_limiter(Flask(__name__)) is None
+
+
+def test_rate_limit_returns_429(limited_app):
+    app, _ = limited_app
+    client = app.test_client()
+    codes = [client.post("/login").status_code for _ in range(12)]
+    assert codes[:10] == [200] * 10
+    response = client.post("/login")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # 其他路由使用独立的桶
+    assert client.get("/contacts").status_code == 200
+
+
+def test_overload_sheds_heartbeats_first(limited_app):
+    app, limiter = limited_app
+    client = app.test_client()
+    limiter.in_flight = 3
+    assert client.get("/heartbeat").status_code == 503
+    assert client.get("/contacts").status_code == 200
+    limiter.in_flight = 4
+    assert client.get("/contacts").status_code == 503
+    limiter.in_flight = 0
+    assert client.get("/heartbeat").status_code == 200
+    assert limiter.in_flight == 0
+
+
+def test_prune_evicts_oldest():
+    buckets = MemoryBuckets(maxsize=2)
+    buckets.take("a", 1, 2, now=0)
+    buckets.take("b", 1, 2, now=1)
+    buckets.take("a", 1, 2, now=2)
+    buckets.take("c", 1, 2, now=3)
+    assert list(buckets.buckets) == ["a", "c"]
+
+
+def test_login_limited_per_user(limited_app):
+    """登录按 (IP, user_id) 计数，其他 IP 上的请求不能锁定该用户；伪造的 Authorization 头不产生新的桶"""
+    app, limiter = limited_app
+    client = app.test_client()
+    body = {"data": {"user_id": "victim", "password": "guess"}}
+    codes = [
+        client.post("/login", json=body, environ_base={"REMOTE_ADDR": f"10.0.0.{i}"}).status_code
+        for i in range(11)
+    ]
+    assert codes == [200] * 11
+    assert client.post("/login", json=body, environ_base={"REMOTE_ADDR": "10.0.1.1"}).status_code == 200
+    assert "login:user:10.0.0.1/victim" in limiter.buckets.buckets
+
+    for i in range(3):
+        client.get("/contacts", headers={"Authorization": f"Bearer random{i}"})
+    assert not [key for key in limiter.buckets.buckets if key.startswith("get_contacts:user:")]
@@ -0,0 +1,35 @@
+import json
+import logging
+
+from common.log import JsonFormatter, SamplingFilter, get_logger
+
+
+def make_record(logger, level, event, **fields):
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.logger.addHandler(handler)
+    logger.logger.setLevel(logging.DEBUG)
+    try:
+        logger.log(level, event, **fields)
+    finally:
+        logger.logger.removeHandler(handler)
+    return records[0]
+
+
+def test_json_record_fields():
+    logger = get_logger("test_log")
+    record = make_record(logger, logging.INFO, "login", user_id="a", status=200)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["event"] == "login"
+    assert entry["level"] == "INFO"
+    assert entry["user_id"] == "a"
+    assert entry["status"] == 200
+
+
+def test_sampling_keeps_warnings():
+    logger = get_logger("test_log")
+    sampling = SamplingFilter({"get_contacts": 0.0})
+    assert not sampling.filter(make_record(logger, logging.INFO, "get_contacts"))
+    assert sampling.filter(make_record(logger, logging.WARNING, "get_contacts"))
+    assert sampling.filter(make_record(logger, logging.INFO, "login"))
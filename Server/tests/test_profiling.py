@@ -0,0 +1,66 @@
+import os
+import time
+
+from flask import Flask
+
+from common import profiling
+
+TOKEN = "secret"
+
+
+def make_app(tmp_path):
+    app = Flask(__name__)
+
+    @app.route("/work")
+    def work():
+        return {"status": 200, "total": sum(i * i for i in range(20000))}
+
+    @app.route("/slow")
+    def slow():
+        time.sleep(0.02)
+        return {"status": 200}
+
+    profiler = profiling.init_profiling(app, TOKEN, str(tmp_path))
+    return app, profiler
+
+
+def test_profile_route_on_demand(tmp_path):
+    app, profiler = make_app(tmp_path)
+    client = app.test_client()
+    headers = {profiling.ADMIN_TOKEN_HEADER: TOKEN}
+    original = app.view_functions["work"]
+
+    assert client.get("/admin/profile").status_code == 403
+    response = client.post("/admin/profile", json={"data": {"endpoint": "missing"}}, headers=headers)
+    assert response.status_code == 400
+
+    response = client.post("/admin/profile", json={"data": {"endpoint": "work", "fraction": 1}}, headers=headers)
+    assert response.status_code == 200
+    assert app.view_functions["work"] is not original
+    for _ in range(3):
+        assert client.get("/work").status_code == 200
+    assert client.get("/admin/profile", headers=headers).get_json()["data"]["targets"]["work"]["samples"] == 3
+
+    response = client.delete("/admin/profile", json={"data": {"endpoint": "work"}}, headers=headers)
+    assert response.status_code == 200
+    # 关闭后换回原视图函数，没有额外开销
+    assert app.view_functions["work"] is original
+    collapsed = f"work.cprofile.{os.getpid()}.collapsed"
+    assert os.path.join(str(tmp_path), collapsed) in response.get_json()["data"]["files"]
+    stacks = profiling.read_collapsed(tmp_path / collapsed)
+    assert any(stack.startswith("work (") for stack in stacks)
+    assert profiler.load_control() == {}
+
+
+def test_sampler_stops_at_max_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "SAMPLE_INTERVAL", 0.001)
+    app, profiler = make_app(tmp_path)
+    original = app.view_functions["slow"]
+    profiler.update("slow", {"fraction": 1.0, "mode": "sampler", "max_samples": 2})
+    client = app.test_client()
+    for _ in range(3):
+        client.get("/slow")
+    # 达到 max_samples 后自动关闭并写出结果
+    assert app.view_functions["slow"] is original
+    stacks = profiling.read_collapsed(tmp_path / f"slow.sampler.{os.getpid()}.collapsed")
+    assert sum(stacks.values()) > 0
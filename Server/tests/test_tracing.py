@@ -0,0 +1,40 @@
+import json
+
+from flask import Flask
+
+from common import tracing
+
+
+def test_request_id_propagation(tmp_path):
+    path = str(tmp_path / "spans.jsonl")
+    app = Flask(__name__)
+    tracing.init_tracing(app, "server", path)
+
+    @app.route("/ping")
+    @tracing.traced("ping_service")
+    def ping():
+        return {"status": 200}
+
+    try:
+        response = app.test_client().get("/ping", headers={
+            tracing.REQUEST_ID_HEADER: "trace-1",
+            tracing.PARENT_SPAN_HEADER: "cli-span",
+        })
+        assert response.headers[tracing.REQUEST_ID_HEADER] == "trace-1"
+    finally:
+        tracing.configure(None, None)
+
+    with open(path) as file:
+        spans = {item["name"]: item for item in map(json.loads, file)}
+    route = spans["route ping"]
+    assert route["trace_id"] == "trace-1"
+    assert route["parent_id"] == "cli-span"
+    assert route["status"] == 200
+    assert spans["ping_service"]["parent_id"] == route["span_id"]
+
+
+def test_disabled_span_is_noop():
+    assert not tracing.enabled()
+    with tracing.span("anything"):
+        assert tracing.current() is None
+    assert tracing.propagation_headers() == {}
@@ -128,3 +128,173 @@ def test_get_public_key(client, db_setup):
 
     # For now, we can verify that the friend is online (which implies we could get their public key)
     assert data["status"] == 200
+
+
+import socket
+import time
+from models.online import Online
+from services.online import UdpHeartbeat, create_heartbeat_session, session_user, sign_heartbeat, verify_heartbeat
+
+
+def test_verify_heartbeat():
+    session = create_heartbeat_session("test", TEST_USER1["user_id"])
+    key = bytes.fromhex(session["key"])
+    now = int(time.time())
+
+    assert verify_heartbeat("test", sign_heartbeat(session["session_id"], key, now)) == session["session_id"]
+    assert session_user(session["session_id"]) == TEST_USER1["user_id"]
+    # 服务端密钥不同、时间戳过期或报文畸形均应被拒绝
+    assert verify_heartbeat("other", sign_heartbeat(session["session_id"], key, now)) is None
+    assert verify_heartbeat("test", sign_heartbeat(session["session_id"], key, now - 3600)) is None
+    assert verify_heartbeat("test", b"test_user1.abc|0|00") is None
+    assert verify_heartbeat("test", b"garbage") is None
+
+
+def test_udp_heartbeat(app, client, db_setup):
+    heartbeat = UdpHeartbeat(app, host="127.0.0.1", port=0, flush_interval=3600)
+    try:
+        # 心跳端口为 0 时由系统分配，登录响应中下发实际端口与会话
+        register_user(client, TEST_USER1)
+        session = login_user(client, TEST_USER1).json["data"]["heartbeat"]
+        assert session["port"] == heartbeat.port
+        with app.app_context():
+            before = Online.get_user(TEST_USER1["user_id"]).last_seen_time
+        # 同一用户另一次登录的会话（如已登出的旧会话）不应刷新在线状态
+        stale = create_heartbeat_session(app.config["JWT_SECRET_KEY"], TEST_USER1["user_id"])
+
+        def send(session_id, key):
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.sendto(sign_heartbeat(session_id, bytes.fromhex(key), int(time.time())), ("127.0.0.1", heartbeat.port))
+            for _ in range(100):
+                if heartbeat.pending:
+                    break
+                time.sleep(0.01)
+
+        send(stale["session_id"], stale["key"])
+        assert heartbeat.flush() == {TEST_USER1["user_id"]}
+        with app.app_context():
+            assert Online.get_user(TEST_USER1["user_id"]).last_seen_time == before
+
+        send(session["session_id"], session["key"])
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(b"forged|0|00", ("127.0.0.1", heartbeat.port))
+        assert heartbeat.flush() == {TEST_USER1["user_id"]}
+        with app.app_context():
+            assert Online.get_user(TEST_USER1["user_id"]).last_seen_time > before
+    finally:
+        heartbeat.close()
+        app.config.pop("HEARTBEAT_UDP_PORT", None)
+
+
+from sqlalchemy import event
+from models.database import db
+from models.online import endpoint_cache
+
+
+def test_public_key_cache(client, db_setup):
+    token1 = get_auth_token(client, TEST_USER1)
+    token2 = get_auth_token(client, TEST_USER2)
+    add_friend(client, token1, TEST_USER2["user_id"])
+    add_friend(client, token2, TEST_USER1["user_id"])
+
+    def get_public_key():
+        return client.post('/public_key',
+                           json={"data": {"friend_id": TEST_USER2["user_id"]}},
+                           headers={"Authorization": f"Bearer {token1}"}
+                           )
+
+    response = get_public_key()
+    assert response.status_code == 200
+    assert response.json["data"] == {
+        "public_key": TEST_USER2["public_key"],
+        "ip": TEST_USER2["ip"],
+        "port": TEST_USER2["port"]
+    }
+
+    # 第二次请求全部命中缓存，不访问数据库
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with client.application.app_context():
+        event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        assert get_public_key().status_code == 200
+    finally:
+        with client.application.app_context():
+            event.remove(db.engine, "before_cursor_execute", listener)
+    assert statements == []
+    assert endpoint_cache.hits > 0
+
+    # 登出后缓存失效
+    with client.application.app_context():
+        Online.user_logout(TEST_USER2["user_id"])
+    assert get_public_key().status_code == 199
+
+
+from datetime import datetime, timedelta
+from models.online import PresenceChange
+
+def test_presence_changes(client, db_setup, monkeypatch):
+    monkeypatch.setattr("services.utils.PRESENCE_COMMIT_GRACE", 0)
+    token1 = get_auth_token(client, TEST_USER1)
+    token2 = get_auth_token(client, TEST_USER2)
+    add_friend(client, token1, TEST_USER2["user_id"])
+    add_friend(client, token2, TEST_USER1["user_id"])
+    headers = {"Authorization": f"Bearer {token1}"}
+
+    def changes(since):
+        response = client.get(f'/presence/changes?since={since}', headers=headers)
+        assert response.status_code == 200
+        return response.json["data"]
+
+    # 没有游标时返回全部好友的状态
+    data = changes(0)
+    assert data["reset"] is True
+    assert data["changes"] == [{
+        "user_id": TEST_USER2["user_id"], "online": True,
+        "public_key": TEST_USER2["public_key"], "ip": TEST_USER2["ip"], "port": TEST_USER2["port"]
+    }]
+    cursor = first = data["cursor"]
+
+    # 无变化时为空，游标不变
+    data = changes(cursor)
+    assert data == {"cursor": cursor, "reset": False, "changes": []}
+
+    # 非好友的变化不返回
+    stranger_token = get_auth_token(client, {**TEST_USER1, "user_id": "stranger"})
+    with client.application.app_context():
+        Online.user_logout(TEST_USER2["user_id"])
+    data = changes(cursor)
+    assert data["reset"] is False
+    assert data["changes"] == [{"user_id": TEST_USER2["user_id"], "online": False,
+                                "public_key": None, "ip": None, "port": None}]
+    assert int(data["cursor"].split(".")[0]) == int(cursor.split(".")[0]) + 2
+    cursor = data["cursor"]
+
+    login_user(client, {**TEST_USER2, "port": 6001})
+    assert changes(cursor)["changes"][0]["port"] == 6001
+
+    # 压缩后过旧的游标收到全量状态
+    with client.application.app_context():
+        assert PresenceChange.compact(datetime.now() + timedelta(seconds=1)) > 0
+    data = changes(first)
+    assert data["reset"] is True
+    assert data["changes"][0]["online"] is True
+    # 压缩保留最新一行，最新的游标仍可继续增量同步
+    cursor = data["cursor"]
+    assert changes(cursor)["reset"] is False
+
+    # 好友集合变化后旧游标收到全量状态
+    add_friend(client, token1, "stranger")
+    add_friend(client, stranger_token, TEST_USER1["user_id"])
+    data = changes(cursor)
+    assert data["reset"] is True
+    assert {change["user_id"] for change in data["changes"]} == {TEST_USER2["user_id"], "stranger"}
+    cursor = data["cursor"]
+
+    # 提交宽限期内的变化会返回，但游标不越过它们，下次请求再次返回
+    monkeypatch.setattr("services.utils.PRESENCE_COMMIT_GRACE", 60)
+    with client.application.app_context():
+        Online.user_logout("stranger")
+    data = changes(cursor)
+    assert [change["user_id"] for change in data["changes"]] == ["stranger"]
+    assert changes(data["cursor"])["changes"] == data["changes"]
@@ -0,0 +1,5 @@
+# WSGI 入口：gunicorn -c gunicorn.conf.py 加载 wsgi:app
+# 应用只在这里创建，导入 app 模块（测试、基准测试使用 create_app_debug）不会启动生产应用
+from app import create_app
+
+app = create_app()
@@ -0,0 +1,2 @@
+# Cli 与 Server 共用的日志、追踪与剖析模块。
+# 两个应用的入口（app.py、测试与基准测试）把仓库根目录加入 sys.path，以 common.log 等名称导入。
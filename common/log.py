@@ -0,0 +1,103 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+# 队列满时直接丢弃日志，请求线程永远不会因写日志而阻塞
+LOG_QUEUE_SIZE = 10000
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    每条日志输出为一行 JSON：{"ts", "level", "logger", "event", ...字段}
+    """
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按事件名抽样高频日志，WARNING 及以上级别总是保留
+    """
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.sample_rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # 格式化留给后台线程，这里只保留异常文本，避免 traceback 对象跨线程
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class EventLogger(logging.LoggerAdapter):
+    """
+    logger.info("login", user_id=..., status=...)：关键字参数作为结构化字段
+    """
+    def process(self, msg, kwargs):
+        fields = {
+            key: kwargs.pop(key) for key in list(kwargs)
+            if key not in ('exc_info', 'stack_info', 'stacklevel', 'extra')
+        }
+        kwargs['extra'] = {'fields': fields}
+        return msg, kwargs
+
+
+def get_logger(name):
+    return EventLogger(logging.getLogger(name), {})
+
+
+def init_logging(level='INFO', sample_rates=None, stream=None):
+    """
+    为根 logger 安装队列 handler，由后台 QueueListener 线程格式化并写出；每个进程只初始化一次
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rates or dict()))
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,447 @@
+"""
+按路由的按需性能剖析：运行时为某个 endpoint 开启，按比例抽样请求，用 cProfile（确定性）或栈采样（统计）记录，
+聚合为 collapsed stack 文件，可直接交给 flamegraph.pl 或 speedscope 生成火焰图。
+
+开启时替换 app.view_functions 中该 endpoint 的视图函数，关闭时换回原函数，未开启剖析的路由没有任何额外开销。
+管理接口只在配置了 PROFILE_ADMIN_TOKEN 时注册，请求需带 X-Admin-Token 头：
+    GET    /admin/profile    正在剖析的路由与本进程已采样的请求数
+    POST   /admin/profile    {"data": {"endpoint", "fraction", "mode", "max_samples"}} 开启或修改
+    DELETE /admin/profile    {"data": {"endpoint"}} 关闭并写出结果
+
+开关同时写入 PROFILE_DIR/control.json，多 worker 部署时各进程的后台线程据此同步；
+结果按 <endpoint>.<mode>.<pid>.collapsed 分进程写出（cProfile 另有 .prof），重复开启时累加。
+
+合并各进程的结果：
+    python common/profiling.py <PROFILE_DIR> [--endpoint get_contacts] [--output merged.collapsed] [--top 20]
+"""
+import argparse
+import atexit
+import cProfile
+import functools
+import glob
+import hmac
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+MODES = ('cprofile', 'sampler')
+CONTROL_FILE = 'control.json'
+# 栈采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+# 各进程检查 control.json 的间隔（秒）
+CONTROL_POLL_INTERVAL = 2
+# 每个路由默认最多剖析的请求数，任一进程达到后关闭该路由的剖析
+DEFAULT_MAX_SAMPLES = 1000
+# cProfile 调用图展开为调用栈时的最大深度，以及忽略的最小权重（微秒）
+MAX_STACK_DEPTH = 64
+MIN_WEIGHT_US = 1
+
+# cProfile 在 3.12 起同一时间只能有一个实例在运行，并发的请求不抽样
+_cprofile_lock = threading.Lock()
+
+
+def func_label(func):
+    """
+    pstats 的 (文件, 行号, 函数名) 转为火焰图中的帧名
+    """
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stats(stats):
+    """
+    把 cProfile 的调用图展开为 collapsed stack：从没有调用者的函数向下遍历，
+    函数的自身耗时按各调用者贡献的累计耗时比例分摊到对应的栈上，权重为微秒
+    """
+    raw = stats.stats
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    stacks = Counter()
+
+    def walk(func, funcs, labels, share):
+        weight = round(raw[func][2] * share * 1e6)
+        if weight >= MIN_WEIGHT_US:
+            stacks[';'.join(labels)] += weight
+        if len(labels) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_ct in callees.get(func, ()):
+            total_ct = raw[callee][3]
+            if callee in funcs or not total_ct:
+                continue
+            callee_share = share * edge_ct / total_ct
+            if total_ct * callee_share * 1e6 < MIN_WEIGHT_US:
+                continue
+            walk(callee, funcs | {callee}, labels + [func_label(callee)], callee_share)
+
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            walk(func, {func}, [func_label(func)], 1.0)
+    return stacks
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            stack, _, weight = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(weight)
+    return stacks
+
+
+def write_collapsed(path, stacks):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(''.join(f"{stack} {weight}\n" for stack, weight in stacks.most_common()))
+
+
+class Sampler:
+    """
+    统计采样：后台线程每 SAMPLE_INTERVAL 秒读取被剖析请求所在线程的调用栈，没有被剖析的请求时退出
+    """
+    def __init__(self):
+        # 线程 ID -> Target
+        self.threads = dict()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, ident, target):
+        with self.lock:
+            self.threads[ident] = target
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def remove(self, ident):
+        with self.lock:
+            self.threads.pop(ident, None)
+
+    def run(self):
+        while True:
+            time.sleep(SAMPLE_INTERVAL)
+            with self.lock:
+                if not self.threads:
+                    self.thread = None
+                    return
+                watched = list(self.threads.items())
+            frames = sys._current_frames()
+            for ident, target in watched:
+                frame = frames.get(ident)
+                labels = list()
+                # 只保留视图函数及以下的帧
+                while frame is not None and frame.f_code is not Target.sample.__code__:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                if labels:
+                    target.add_stack(';'.join(reversed(labels)))
+
+
+_sampler = Sampler()
+
+
+class Target:
+    """
+    一个正在剖析的路由：原视图函数、抽样参数与本进程的聚合结果
+    """
+    def __init__(self, endpoint, view, fraction, mode, max_samples, on_full):
+        self.endpoint = endpoint
+        self.view = view
+        self.fraction = fraction
+        self.mode = mode
+        self.max_samples = max_samples
+        self.on_full = on_full
+        self.samples = 0
+        self.stacks = Counter()
+        self.stats = None
+        self.lock = threading.Lock()
+
+    def wrap(self):
+        view = self.view
+        profile = self.sample if self.mode == 'sampler' else self.profile
+
+        @functools.wraps(view)
+        def profiled(*args, **kwargs):
+            if random.random() >= self.fraction or self.samples >= self.max_samples:
+                return view(*args, **kwargs)
+            return profile(view, args, kwargs)
+        return profiled
+
+    def profile(self, view, args, kwargs):
+        if not _cprofile_lock.acquire(blocking=False):
+            return view(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            _cprofile_lock.release()
+            with self.lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profiler)
+                else:
+                    self.stats.add(profiler)
+            self.count()
+
+    def sample(self, view, args, kwargs):
+        ident = threading.get_ident()
+        _sampler.add(ident, self)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _sampler.remove(ident)
+            self.count()
+
+    def add_stack(self, stack):
+        with self.lock:
+            self.stacks[stack] += 1
+
+    def count(self):
+        with self.lock:
+            self.samples += 1
+            full = self.samples == self.max_samples
+        if full:
+            self.on_full(self.endpoint)
+
+    def config(self):
+        return {"fraction": self.fraction, "mode": self.mode, "max_samples": self.max_samples}
+
+    def flush(self, directory):
+        """
+        把聚合结果累加写入文件，返回写出的文件路径
+        """
+        with self.lock:
+            stacks, stats = self.stacks, self.stats
+            self.stacks, self.stats = Counter(), None
+        if stats is not None:
+            stacks = stacks + collapse_stats(stats)
+        if not stacks:
+            return []
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{self.endpoint}.{self.mode}.{os.getpid()}")
+        if os.path.exists(base + '.collapsed'):
+            stacks = stacks + read_collapsed(base + '.collapsed')
+        write_collapsed(base + '.collapsed', stacks)
+        paths = [base + '.collapsed']
+        if stats is not None:
+            if os.path.exists(base + '.prof'):
+                stats.add(base + '.prof')
+            stats.dump_stats(base + '.prof')
+            paths.append(base + '.prof')
+        return paths
+
+
+class Profiler:
+    def __init__(self, app, directory):
+        self.app = app
+        self.directory = directory
+        self.control_path = os.path.join(directory, CONTROL_FILE)
+        self.targets = dict()
+        self.lock = threading.RLock()
+        self.control_mtime = None
+
+    def enable(self, endpoint, fraction, mode='cprofile', max_samples=DEFAULT_MAX_SAMPLES):
+        if endpoint not in self.app.view_functions or endpoint == 'admin_profile':
+            raise ValueError(f"unknown endpoint {endpoint}")
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if not 0 < fraction <= 1:
+            raise ValueError("fraction must be in (0, 1]")
+        if max_samples < 1:
+            raise ValueError("max_samples must be positive")
+        with self.lock:
+            target = self.targets.get(endpoint)
+            if target is not None and target.mode != mode:
+                self.disable(endpoint)
+                target = None
+            if target is None:
+                target = Target(endpoint, self.app.view_functions[endpoint], fraction, mode, max_samples, self.update)
+                self.targets[endpoint] = target
+                self.app.view_functions[endpoint] = target.wrap()
+            else:
+                target.fraction = fraction
+                target.max_samples = max_samples
+        return target
+
+    def disable(self, endpoint):
+        """
+        换回原视图函数并写出结果，返回文件路径；未在剖析时返回 None
+        """
+        with self.lock:
+            target = self.targets.pop(endpoint, None)
+            if target is None:
+                return None
+            self.app.view_functions[endpoint] = target.view
+        return target.flush(self.directory)
+
+    def status(self):
+        with self.lock:
+            return {
+                endpoint: dict(target.config(), samples=target.samples)
+                for endpoint, target in self.targets.items()
+            }
+
+    def apply(self, control):
+        """
+        按 control.json 的内容 {endpoint: {fraction, mode, max_samples}} 同步本进程的剖析状态
+        """
+        with self.lock:
+            for endpoint in set(self.targets) - set(control):
+                self.disable(endpoint)
+            for endpoint, config in control.items():
+                target = self.targets.get(endpoint)
+                if target is None or target.config() != config:
+                    try:
+                        self.enable(endpoint, **config)
+                    except (TypeError, ValueError):
+                        pass
+
+    def save_control(self, control):
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self.control_path}.{os.getpid()}"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(control, file)
+        os.replace(temp_path, self.control_path)
+
+    def load_control(self):
+        try:
+            with open(self.control_path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def update(self, endpoint, config=None):
+        """
+        修改一个路由的开关：先在本进程生效，再写入 control.json 通知其他进程
+        """
+        with self.lock:
+            control = self.load_control()
+            if config is None:
+                control.pop(endpoint, None)
+                paths = self.disable(endpoint)
+            else:
+                self.enable(endpoint, **config)
+                control[endpoint] = config
+                paths = None
+            self.save_control(control)
+            return paths
+
+    def watch(self):
+        while True:
+            try:
+                mtime = os.stat(self.control_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != self.control_mtime:
+                self.control_mtime = mtime
+                self.apply(self.load_control())
+            time.sleep(CONTROL_POLL_INTERVAL)
+
+    def close(self):
+        for endpoint in list(self.targets):
+            self.disable(endpoint)
+
+
+def init_profiling(app, token, directory):
+    """
+    注册管理接口并启动 control.json 的同步线程；token 为空时不开启
+    """
+    if not token:
+        return None
+    from flask import request
+
+    profiler = Profiler(app, directory)
+
+    def respond(status, message, data=None):
+        return {"status": status, "message": message, "data": data}, status
+
+    @app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'], endpoint='admin_profile')
+    def admin_profile():
+        if not hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ''), token):
+            return respond(403, 'forbidden')
+        if request.method == 'GET':
+            return respond(200, 'success', {"targets": profiler.status()})
+
+        data = (request.get_json(silent=True) or {}).get('data') or {}
+        endpoint = data.get('endpoint')
+        if not isinstance(endpoint, str):
+            return respond(400, 'endpoint is required')
+        if request.method == 'DELETE':
+            paths = profiler.update(endpoint)
+            if paths is None:
+                return respond(404, 'endpoint is not being profiled')
+            return respond(200, 'success', {"files": paths})
+
+        try:
+            config = {
+                "fraction": float(data.get('fraction', 1.0)),
+                "mode": data.get('mode', 'cprofile'),
+                "max_samples": int(data.get('max_samples', DEFAULT_MAX_SAMPLES)),
+            }
+            profiler.update(endpoint, config)
+        except (TypeError, ValueError) as e:
+            return respond(400, str(e))
+        return respond(200, 'success', {"targets": profiler.status()})
+
+    threading.Thread(target=profiler.watch, daemon=True).start()
+    atexit.register(profiler.close)
+    return profiler
+
+
+# ================== 报告 ==================
+
+def merge(directory, endpoint=None):
+    """
+    合并各进程的 collapsed 文件：返回 {(endpoint, mode): Counter}
+    """
+    merged = defaultdict(Counter)
+    for path in glob.glob(os.path.join(directory, '*.collapsed')):
+        name, mode, _ = os.path.basename(path)[:-len('.collapsed')].rsplit('.', 2)
+        if endpoint is None or name == endpoint:
+            merged[(name, mode)] += read_collapsed(path)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并按路由剖析的结果")
+    parser.add_argument("directory", help="PROFILE_DIR")
+    parser.add_argument("--endpoint", help="只合并该路由")
+    parser.add_argument("--output", help="合并后的 collapsed 文件，多个路由时以 <endpoint>.<mode>. 为前缀")
+    parser.add_argument("--top", type=int, default=20, help="列出自身耗时最多的帧数")
+    args = parser.parse_args()
+
+    merged = merge(args.directory, args.endpoint)
+    for (endpoint, mode), stacks in sorted(merged.items()):
+        unit = 'us' if mode == 'cprofile' else 'samples'
+        total = sum(stacks.values())
+        print(f"{endpoint} [{mode}] total {total} {unit}")
+        leaves = Counter()
+        for stack, weight in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += weight
+        for frame, weight in leaves.most_common(args.top):
+            print(f"{weight / total * 100:>7.1f}%  {frame}")
+        if args.output:
+            path = args.output if len(merged) == 1 else f"{endpoint}.{mode}.{args.output}"
+            write_collapsed(path, stacks)
+            print(f"written to {path}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
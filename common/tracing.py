@@ -0,0 +1,326 @@
+"""
+轻量请求追踪：请求 ID 通过 X-Request-ID / X-Parent-Span-ID 头在 Cli 与 Server 之间传递，
+span（路由、服务、SQL、加解密）写入本地 JSONL 文件，由本模块的命令行汇总每一跳的耗时。
+
+未配置 TRACE_FILE 时 span() 返回空操作，几乎没有开销。
+
+查看报告：
+    python common/tracing.py spans.jsonl [更多文件...] [--top 5] [--trace <trace_id>]
+"""
+import argparse
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+PARENT_SPAN_HEADER = 'X-Parent-Span-ID'
+
+# 当前 (trace_id, span_id)
+_current = contextvars.ContextVar('trace_span', default=None)
+_exporter = None
+_sql_traced = False
+
+
+def new_id(size=8):
+    return os.urandom(size).hex()
+
+
+class JsonlExporter:
+    """
+    后台线程批量把 span 追加写入 JSONL 文件，记录线程只做一次入队
+    """
+    def __init__(self, path, service):
+        self.path = path
+        self.service = service
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def export(self, record):
+        record['service'] = self.service
+        self.queue.put(record)
+
+    def run(self):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            stop = False
+            while not stop:
+                batch = [self.queue.get()]
+                while not self.queue.empty():
+                    batch.append(self.queue.get())
+                if None in batch:
+                    stop = True
+                    batch = [record for record in batch if record is not None]
+                file.write(''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in batch))
+                file.flush()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=2)
+
+
+def configure(path, service):
+    """
+    开启追踪，span 写入 path；path 为空时关闭
+    """
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = JsonlExporter(path, service) if path else None
+    return _exporter
+
+
+def enabled():
+    return _exporter is not None
+
+
+def current():
+    return _current.get()
+
+
+def record_span(name, start, duration, parent=None, **attrs):
+    """
+    导出一段已经结束的 span，parent 默认为当前 span
+    """
+    if _exporter is None:
+        return
+    parent = parent or _current.get()
+    _exporter.export({
+        "trace_id": parent[0] if parent else new_id(),
+        "span_id": new_id(),
+        "parent_id": parent[1] if parent else None,
+        "name": name,
+        "start": round(start, 6),
+        "duration_ms": round(duration * 1000, 3),
+        **attrs,
+    })
+
+
+class Span:
+    def __init__(self, name, trace_id=None, parent_id=None, **attrs):
+        self.name = name
+        self.attrs = attrs
+        parent = _current.get()
+        if trace_id is None and parent is not None:
+            trace_id, parent_id = parent
+        self.trace_id = trace_id or new_id()
+        self.parent_id = parent_id
+        self.span_id = new_id()
+
+    def __enter__(self):
+        self.token = _current.set((self.trace_id, self.span_id))
+        self.start = time.time()
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type=None, exc=None, tb=None):
+        duration = time.perf_counter() - self.begin
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        if _exporter is not None:
+            _exporter.export({
+                "trace_id": self.trace_id,
+                "span_id": self.span_id,
+                "parent_id": self.parent_id,
+                "name": self.name,
+                "start": round(self.start, 6),
+                "duration_ms": round(duration * 1000, 3),
+                **self.attrs,
+            })
+        return False
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type=None, exc=None, tb=None):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attrs):
+    if _exporter is None:
+        return _NOOP
+    return Span(name, **attrs)
+
+
+def traced(name=None):
+    """
+    装饰器：函数的每次调用记录为一个 span
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return func(*args, **kwargs)
+            with Span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagation_headers():
+    """
+    发往下一跳的请求头，未开启追踪或不在 span 内时为空
+    """
+    parent = _current.get()
+    if _exporter is None or parent is None:
+        return {}
+    return {REQUEST_ID_HEADER: parent[0], PARENT_SPAN_HEADER: parent[1]}
+
+
+def init_tracing(app, service, path):
+    """
+    为 Flask 应用开启追踪：每个请求一个根 span，沿用上游传来的请求 ID，并在响应头中返回
+    """
+    if not path:
+        return None
+    from flask import g, request
+
+    configure(path, service)
+
+    @app.before_request
+    def start_request_span():
+        g.trace_span = Span(
+            f"route {request.endpoint}",
+            trace_id=request.headers.get(REQUEST_ID_HEADER),
+            parent_id=request.headers.get(PARENT_SPAN_HEADER),
+            method=request.method,
+            path=request.path,
+        ).__enter__()
+
+    @app.after_request
+    def add_request_id(response):
+        trace_span = g.get('trace_span')
+        if trace_span is not None:
+            response.headers[REQUEST_ID_HEADER] = trace_span.trace_id
+            trace_span.attrs['status'] = response.status_code
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception=None):
+        trace_span = g.pop('trace_span', None)
+        if trace_span is not None:
+            trace_span.__exit__(type(exception) if exception else None)
+
+    return _exporter
+
+
+def trace_sql(engine=None):
+    """
+    SQL 语句计时；不传 engine 时对所有 Engine 生效
+    """
+    global _sql_traced
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if engine is None:
+        if _sql_traced:
+            return
+        _sql_traced = True
+    target = engine or Engine
+
+    @event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # 只记录请求内的语句，启动建表等不计入
+        if _exporter is not None and _current.get() is not None:
+            conn.info.setdefault('trace_start', []).append((time.time(), time.perf_counter()))
+
+    @event.listens_for(target, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('trace_start')
+        if stack:
+            start, begin = stack.pop()
+            record_span("sql", start, time.perf_counter() - begin, statement=statement.strip()[:120])
+
+
+# ================== 报告 ==================
+
+def load_spans(paths):
+    spans = list()
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            spans.extend(json.loads(line) for line in file if line.strip())
+    return spans
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def hop_name(item):
+    name = item['name']
+    if name == 'sql':
+        words = item.get('statement', '').split(None, 1)
+        return 'sql ' + (words[0].upper() if words else '')
+    if 'path' in item and not name.startswith('route'):
+        return f"{name} {item.get('method', '')} {item['path']}"
+    return name
+
+
+def print_trace(spans):
+    children = defaultdict(list)
+    ids = {item['span_id'] for item in spans}
+    for item in spans:
+        parent = item['parent_id'] if item['parent_id'] in ids else None
+        children[parent].append(item)
+
+    def walk(parent, depth):
+        for item in sorted(children[parent], key=lambda s: s['start']):
+            label = f"{'  ' * depth}[{item['service']}] {hop_name(item)}"
+            print(f"{label:<70}{item['duration_ms']:>10.2f} ms")
+            walk(item['span_id'], depth + 1)
+
+    walk(None, 1)
+
+
+def report(paths, top=5, trace_id=None):
+    spans = load_spans(paths)
+    traces = defaultdict(list)
+    for item in spans:
+        traces[item['trace_id']].append(item)
+
+    def total(items):
+        roots = [s for s in items if s['parent_id'] not in {i['span_id'] for i in items}]
+        return sum(s['duration_ms'] for s in roots)
+
+    selected = [trace_id] if trace_id else sorted(traces, key=lambda t: total(traces[t]), reverse=True)[:top]
+    for tid in selected:
+        print(f"trace {tid}  {total(traces[tid]):.2f} ms")
+        print_trace(traces[tid])
+        print()
+
+    hops = defaultdict(list)
+    for item in spans:
+        hops[(item['service'], hop_name(item))].append(item['duration_ms'])
+    print(f"{'service':<8}{'hop':<48}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'total ms':>12}")
+    for (service, name), durations in sorted(hops.items(), key=lambda h: -sum(h[1])):
+        print(f"{service:<8}{name[:47]:<48}{len(durations):>7}{percentile(durations, 0.5):>10.2f}"
+              f"{percentile(durations, 0.95):>10.2f}{sum(durations):>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="每一跳的耗时汇总")
+    parser.add_argument("files", nargs="+", help="Cli 与 Server 的 span 文件")
+    parser.add_argument("--top", type=int, default=5, help="展示最慢的若干条请求")
+    parser.add_argument("--trace", help="只展示指定的 trace_id")
+    args = parser.parse_args()
+    report(args.files, args.top, args.trace)
+
+
+if __name__ == "__main__":
+    main()